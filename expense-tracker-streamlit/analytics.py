@@ -0,0 +1,129 @@
+"""Multi-period spending analytics over a user's whole history.
+
+analyze() lays rollup cells (day, category, payment mode, total, count) out as
+a category x day NumPy matrix, one column per day from the first expense to
+the reference day, and derives everything from it in vectorized passes:
+
+- rolling 7/30-day averages of daily spending, from one cumulative sum
+- monthly totals per category (np.add.reduceat over month starts)
+- month-over-month and year-over-year changes of the monthly totals
+- each category's share of every month
+
+Results are plain lists and dicts, so they cache and chart like the rest of
+the dashboard data.
+"""
+import numpy as np
+
+from expense_columns import day_string
+
+# Months shown in the trend charts, and days in the rolling-average chart.
+TREND_MONTHS = 12
+ROLLING_DAYS = 90
+ROLLING_WINDOWS = (7, 30)
+
+
+def _months_back(day: int, months: int) -> int:
+    """First day of the month months before the one containing day."""
+    month = np.datetime64(int(day), "D").astype("datetime64[M]") - months
+    return int(month.astype("datetime64[D]").astype(np.int64))
+
+
+def daily_matrix(cells, first_day: int, last_day: int):
+    """(categories, amounts) with amounts[c, d] spent on categories[c] on day first_day + d.
+
+    Categories are ordered by total spend, largest first. Cells outside
+    [first_day, last_day] are ignored.
+    """
+    n_days = last_day - first_day + 1
+    if not cells:
+        return [], np.zeros((0, n_days))
+    days, categories, _, totals, _ = zip(*cells)
+    days = np.fromiter(days, dtype=np.int64, count=len(cells))
+    totals = np.fromiter(totals, dtype=np.float64, count=len(cells))
+    index = {}
+    codes = np.fromiter((index.setdefault(c or "", len(index)) for c in categories), dtype=np.int64, count=len(cells))
+    keep = (days >= first_day) & (days <= last_day)
+    flat = codes[keep] * n_days + (days[keep] - first_day)
+    amounts = np.bincount(flat, weights=totals[keep], minlength=len(index) * n_days).reshape(len(index), n_days)
+    order = np.argsort(-amounts.sum(axis=1), kind="stable")
+    labels = list(index)
+    return [labels[i] for i in order], amounts[order]
+
+
+def rolling_mean(series, window: int):
+    """Trailing mean over window days (fewer at the start, where fewer days exist)."""
+    csum = np.concatenate(([0.0], np.cumsum(series)))
+    ends = np.arange(1, len(series) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (csum[ends] - csum[starts]) / (ends - starts)
+
+
+def _pct_change(current, previous):
+    """(current - previous) / previous, NaN where previous is 0."""
+    safe = np.where(previous != 0, previous, 1)
+    return np.where(previous != 0, (current - previous) / safe, np.nan)
+
+
+def _floats(values):
+    """JSON-friendly list: NaN becomes None."""
+    return [None if v != v else round(v, 4) for v in np.asarray(values, dtype=np.float64).tolist()]
+
+
+def analyze(cells, first_day: int, ref_day: int):
+    """Trends of the spending in cells up to ref_day (history starts at first_day). Returns::
+
+        {
+            "months": ["YYYY-MM", ...],              # last TREND_MONTHS months, ending with ref_day's
+            "monthly_total": [...],
+            "mom_pct": [...], "yoy_pct": [...],       # change vs the month before / a year before (None: no base)
+            "by_category": {category: [...]},         # monthly totals
+            "share": {category: [...]},               # fraction of each month's total
+            "days": ["YYYY-MM-DD", ...],              # last ROLLING_DAYS days
+            "daily": [...], "avg_7": [...], "avg_30": [...],
+            "month_to_date": {"total", "previous", "pct"},   # vs the same days of last month
+            "last_12_months": {"total", "previous", "pct"},  # vs the 12 months before
+        }
+    """
+    # Two full years back at least, so every month shown has a year-ago base.
+    start = min(first_day, _months_back(ref_day, 2 * TREND_MONTHS - 1))
+    categories, amounts = daily_matrix(cells, start, ref_day)
+    daily = amounts.sum(axis=0)
+
+    days = np.arange(start, ref_day + 1, dtype=np.int64)
+    months = days.astype("datetime64[D]").astype("datetime64[M]")
+    month_starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    monthly = np.add.reduceat(amounts, month_starts, axis=1) if len(categories) else np.zeros((0, len(month_starts)))
+    monthly_total = monthly.sum(axis=0)
+    mom = _pct_change(monthly_total[1:], monthly_total[:-1])
+    yoy = _pct_change(monthly_total[12:], monthly_total[:-12])
+    share = monthly / np.where(monthly_total > 0, monthly_total, 1)
+
+    shown = slice(-TREND_MONTHS, None)
+    recent = slice(-ROLLING_DAYS, None)
+    csum = np.concatenate(([0.0], np.cumsum(daily)))
+
+    # Month to date vs the same number of days at the start of last month.
+    this_month = int(month_starts[-1])
+    elapsed = len(days) - this_month
+    last_month = int(month_starts[-2])
+    mtd = csum[len(days)] - csum[this_month]
+    prev_mtd = csum[min(last_month + elapsed, this_month)] - csum[last_month]
+    year = monthly_total[-TREND_MONTHS:].sum()
+    prev_year = monthly_total[-2 * TREND_MONTHS:-TREND_MONTHS].sum()
+    mtd_pct, year_pct = _floats(_pct_change(np.array([mtd, year]), np.array([prev_mtd, prev_year])))
+
+    result = {
+        "months": [str(m) for m in months[month_starts][shown]],
+        "monthly_total": _floats(monthly_total[shown]),
+        "mom_pct": _floats(mom[-TREND_MONTHS:]),
+        "yoy_pct": _floats(yoy[-TREND_MONTHS:]),
+        "by_category": {c: _floats(monthly[i, shown]) for i, c in enumerate(categories)},
+        "share": {c: _floats(share[i, shown]) for i, c in enumerate(categories)},
+        "days": [day_string(d) for d in days[recent]],
+        "daily": _floats(daily[recent]),
+        "month_to_date": {"total": float(mtd), "previous": float(prev_mtd), "pct": mtd_pct},
+        "last_12_months": {"total": float(year), "previous": float(prev_year), "pct": year_pct},
+    }
+    for window in ROLLING_WINDOWS:
+        result[f"avg_{window}"] = _floats(rolling_mean(daily, window)[recent])
+    return result
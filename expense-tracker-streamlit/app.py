@@ -1,29 +1,59 @@
 """Expense Tracker - Streamlit app with Google Sheets backend.
 Matches the React app: auth gate → dashboard with nav → pages + visualizations.
+
+Plotly is imported by the functions that build figures, and the Sheets client
+by sheets_helper when it first talks to the sheet, so the login page of a
+freshly started process renders without either (see startup.py).
 """
-import streamlit as st
-from datetime import datetime, timedelta, timezone
-import bcrypt
-import plotly.express as px
+import io
+import tempfile
 
-# IST = UTC+5:30
-IST = timezone(timedelta(hours=5, minutes=30))
+import streamlit as st
 
-def now_ist():
-    """Current time in IST (works on Streamlit Cloud which runs in UTC)."""
-    return datetime.now(IST).replace(tzinfo=None)
+import startup  # first: its import marks the start of a cold run
+import instrumentation
+from instrumentation import span
 
 from sheets_helper import (
     CATEGORIES,
     PAYMENT_MODES,
+    now_ist,
     find_user_by_email,
-    create_user,
+    create_user_if_absent,
     generate_user_id,
-    get_expenses,
-    get_totals,
+    prefetch_user,
+    cancel_prefetch,
+    get_password_hasher,
+    get_password_stats,
+    get_probe_stats,
+    get_write_queue_stats,
+    can_view_debug_panel,
+    rehash_password,
+    PasswordBusyError,
+    TooManyAttemptsError,
+    get_dashboard_snapshot,
+    get_range_summary,
+    get_expense_years,
+    get_spending_analytics,
+    get_data_version,
+    get_render_cache,
+    get_expense_page,
+    EXPENSE_PAGE_SIZE,
     add_expense,
+    import_statement,
+    StatementFormatError,
+    export_expenses,
+    parquet_available,
+    warm_up,
 )
 
+_run_started = startup.run_started()
+startup.record_first("imports", _run_started)
+
+# Imported by the warmup thread once the first page is up, so the first
+# dashboard after a cold start doesn't wait for them.
+_WARM_UP_MODULES = ("plotly.express", "plotly.graph_objects", "expense_columns", "analytics")
+
 # ── Session helpers ──────────────────────────────────────────────────────────
 
 def init_session():
@@ -40,6 +70,7 @@ def login_user(user_id: str, email: str):
 
 
 def logout_user():
+    cancel_prefetch(st.session_state.user_id)
     st.session_state.user_id = None
     st.session_state.user_email = None
     st.session_state.page = "dashboard"
@@ -113,7 +144,11 @@ def main():
     init_session()
 
     if not is_logged_in():
-        render_auth()
+        try:
+            render_auth()
+        except Exception as e:
+            st.error(str(e))
+        _finish_run("auth")
         return
 
     # Header
@@ -134,15 +169,30 @@ def main():
     # Page routing
     page = st.session_state.page
     try:
-        if page == "add":
-            render_add_expense()
-        elif page == "expenses":
-            render_view_expenses()
-        else:
-            render_dashboard()
+        with span("app.render", page=page):
+            if page == "add":
+                render_add_expense()
+            elif page == "import":
+                render_import_statement()
+            elif page == "expenses":
+                render_view_expenses()
+            else:
+                render_dashboard()
     except Exception as e:
         st.error(str(e))
 
+    if instrumentation.memory_sink() is not None and can_view_debug_panel(st.session_state.user_email):
+        render_debug_panel()
+    _finish_run(page)
+
+
+def _finish_run(page: str):
+    """Note the first paint of page and start loading what later pages need."""
+    startup.record_first(f"first_paint.{page}", _run_started)
+    warm_up(_WARM_UP_MODULES)
+    if startup.enabled() and can_view_debug_panel(st.session_state.user_email):
+        st.caption("Startup: " + " · ".join(f"{name} {ms:.0f} ms" for name, ms in startup.timings().items()))
+
 
 # ── Auth ─────────────────────────────────────────────────────────────────────
 
@@ -165,11 +215,22 @@ def render_auth():
                 user = find_user_by_email(email)
                 if not user:
                     st.error("No account with that email")
-                elif not bcrypt.checkpw(password.encode(), user["passwordHash"].encode()):
-                    st.error("Wrong password")
                 else:
-                    login_user(user["userId"], user["email"])
-                    st.rerun()
+                    try:
+                        ok, needs_rehash = _check_password(email, password, user["passwordHash"])
+                    except (PasswordBusyError, TooManyAttemptsError) as e:
+                        st.error(str(e))
+                        ok = needs_rehash = False
+                    else:
+                        if not ok:
+                            st.error("Wrong password")
+                    if ok:
+                        # Load the dashboard's data while the page reruns.
+                        prefetch_user(user["userId"])
+                        if needs_rehash:
+                            rehash_password(user["userId"], password)
+                        login_user(user["userId"], user["email"])
+                        st.rerun()
     else:
         st.markdown("## Sign up")
         with st.form("signup_form"):
@@ -185,18 +246,43 @@ def render_auth():
                 st.error("An account with that email already exists")
             else:
                 user_id = generate_user_id()
-                pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-                create_user(user_id, email.strip().lower(), pw_hash)
-                login_user(user_id, email.strip().lower())
-                st.rerun()
+                with span("auth.bcrypt_hash"):
+                    pw_hash = get_password_hasher().hash(password)
+                if not create_user_if_absent(user_id, email.strip().lower(), pw_hash):
+                    st.error("An account with that email already exists")
+                else:
+                    login_user(user_id, email.strip().lower())
+                    st.rerun()
 
         st.caption("Already have an account? Switch to **Log in** above.")
 
 
+def _check_password(email: str, password: str, pw_hash: str):
+    with span("auth.bcrypt_check"):
+        return get_password_hasher().verify(email, password, pw_hash)
+
+
 # ── Dashboard ────────────────────────────────────────────────────────────────
 
+def _cached_render(kind: str, build, *key):
+    """build() cached per user, day and data version (see render_cache.py).
+
+    Reruns that only change widgets or pages reuse the aggregates and figures
+    until the user's expenses change.
+    """
+    user_id = st.session_state.user_id
+    cache_key = (kind, user_id, now_ist().date(), *key, get_data_version(user_id))
+    return get_render_cache().get_or_build(cache_key, lambda: build(user_id))
+
+
+def _dashboard_render_data(user_id: str):
+    snapshot = get_dashboard_snapshot(user_id)
+    return snapshot, build_dashboard_figures(snapshot)
+
+
 def render_dashboard():
-    totals = get_totals(st.session_state.user_id)
+    snapshot, figures = _cached_render("dashboard", _dashboard_render_data)
+    totals = snapshot["totals"]
 
     # Totals cards
     st.markdown(f"""
@@ -217,7 +303,7 @@ def render_dashboard():
     """, unsafe_allow_html=True)
 
     # Navigation buttons
-    c1, c2 = st.columns(2)
+    c1, c2, c3 = st.columns(3)
     with c1:
         if st.button("Add expense", type="primary", use_container_width=True):
             go("add")
@@ -226,73 +312,191 @@ def render_dashboard():
         if st.button("View expenses", use_container_width=True):
             go("expenses")
             st.rerun()
+    with c3:
+        if st.button("Import statement", use_container_width=True):
+            go("import")
+            st.rerun()
 
     # ── Charts ──
-    now_dt = now_ist()
-    from_d = now_dt.replace(day=1).strftime("%Y-%m-%d")
-    last = (now_dt.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-    to_d = last.strftime("%Y-%m-%d")
-    month_expenses = get_expenses(st.session_state.user_id, from_d, to_d)
-
-    if month_expenses:
+    if figures:
         st.markdown("---")
 
-        # Category pie chart
-        cat_totals = {}
-        for e in month_expenses:
-            cat_totals[e["category"]] = cat_totals.get(e["category"], 0) + e["amount"]
-
         col_pie, col_bar = st.columns(2)
         with col_pie:
-            fig_cat = px.pie(
-                values=list(cat_totals.values()),
-                names=list(cat_totals.keys()),
-                title="Spending by Category",
-                color_discrete_sequence=px.colors.qualitative.Set2,
-                hole=0.4,
-            )
-            fig_cat.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=300)
-            st.plotly_chart(fig_cat, use_container_width=True)
-
-        # Daily spending bar chart
+            st.plotly_chart(figures["category"], use_container_width=True)
         with col_bar:
-            daily_totals = {}
-            for e in month_expenses:
-                daily_totals[e["date"]] = daily_totals.get(e["date"], 0) + e["amount"]
-            dates = sorted(daily_totals.keys())
-            amounts = [daily_totals[d] for d in dates]
-            # Show only day number for cleaner labels
-            labels = [d.split("-")[-1] for d in dates]
-
-            fig_daily = px.bar(
-                x=labels,
-                y=amounts,
-                title="Daily Spending (This Month)",
-                labels={"x": "Day", "y": "₹"},
-                color_discrete_sequence=["#2563eb"],
-            )
-            fig_daily.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=300)
-            st.plotly_chart(fig_daily, use_container_width=True)
-
-        # Payment mode pie chart
-        mode_totals = {}
-        for e in month_expenses:
-            mode_totals[e["paymentMode"]] = mode_totals.get(e["paymentMode"], 0) + e["amount"]
-
-        if len(mode_totals) > 1:
-            fig_mode = px.pie(
-                values=list(mode_totals.values()),
-                names=list(mode_totals.keys()),
-                title="By Payment Mode",
-                color_discrete_sequence=px.colors.qualitative.Pastel,
-                hole=0.4,
-            )
-            fig_mode.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=280)
-            st.plotly_chart(fig_mode, use_container_width=True)
+            st.plotly_chart(figures["daily"], use_container_width=True)
+
+        if "payment_mode" in figures:
+            st.plotly_chart(figures["payment_mode"], use_container_width=True)
+
+    render_trends()
+
+
+def build_dashboard_figures(snapshot):
+    """Plotly figures for the dashboard charts ({} when nothing was spent this month)."""
+    month = snapshot["periods"]["month"]
+    if not month["count"]:
+        return {}
+    with span("app.build_figures"):
+        return _dashboard_figures(snapshot, month)
+
+
+def _dashboard_figures(snapshot, month):
+    import plotly.express as px
+
+    # Category pie chart
+    cat_totals = month["by_category"]
+    fig_cat = px.pie(
+        values=list(cat_totals.values()),
+        names=list(cat_totals.keys()),
+        title="Spending by Category",
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        hole=0.4,
+    )
+    fig_cat.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=300)
+    figures = {"category": fig_cat}
+
+    # Daily spending bar chart
+    daily_totals = snapshot["by_day"]
+    dates = list(daily_totals.keys())
+    amounts = [daily_totals[d] for d in dates]
+    # Show only day number for cleaner labels
+    labels = [d.split("-")[-1] for d in dates]
+
+    fig_daily = px.bar(
+        x=labels,
+        y=amounts,
+        title="Daily Spending (This Month)",
+        labels={"x": "Day", "y": "₹"},
+        color_discrete_sequence=["#2563eb"],
+    )
+    fig_daily.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=300)
+    figures["daily"] = fig_daily
+
+    # Payment mode pie chart
+    mode_totals = month["by_payment_mode"]
+
+    if len(mode_totals) > 1:
+        fig_mode = px.pie(
+            values=list(mode_totals.values()),
+            names=list(mode_totals.keys()),
+            title="By Payment Mode",
+            color_discrete_sequence=px.colors.qualitative.Pastel,
+            hole=0.4,
+        )
+        fig_mode.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=280)
+        figures["payment_mode"] = fig_mode
+    return figures
+
+
+# ── Trends ───────────────────────────────────────────────────────────────────
+
+def _analytics_render_data(user_id: str):
+    analytics = get_spending_analytics(user_id)
+    return analytics, build_analytics_figures(analytics)
+
+
+def _pct_delta(pct):
+    return None if pct is None else f"{pct:+.0%}"
+
+
+def render_trends():
+    analytics, figures = _cached_render("analytics", _analytics_render_data)
+    if not figures:
+        return
+    st.markdown("---")
+    st.markdown("### Trends")
+    mtd, year = analytics["month_to_date"], analytics["last_12_months"]
+    c1, c2 = st.columns(2)
+    with c1:
+        st.metric("This month so far", f"₹{mtd['total']:,.0f}", _pct_delta(mtd["pct"]),
+                  delta_color="inverse", help="Compared with the same days of last month")
+    with c2:
+        st.metric("Last 12 months", f"₹{year['total']:,.0f}", _pct_delta(year["pct"]),
+                  delta_color="inverse", help="Compared with the 12 months before")
+    st.plotly_chart(figures["monthly"], use_container_width=True)
+    st.plotly_chart(figures["rolling"], use_container_width=True)
+    col_share, col_change = st.columns(2)
+    with col_share:
+        st.plotly_chart(figures["share"], use_container_width=True)
+    with col_change:
+        st.plotly_chart(figures["change"], use_container_width=True)
+
+
+def build_analytics_figures(analytics):
+    """Plotly figures for the trend charts ({} when nothing was spent in the last 12 months)."""
+    if not any(analytics["monthly_total"]):
+        return {}
+    with span("app.build_analytics_figures"):
+        return _analytics_figures(analytics)
+
+
+def _analytics_figures(analytics):
+    import plotly.express as px
+    from plotly.graph_objects import Bar, Figure, Scatter
+
+    # graph_objects rather than px: with several series per chart, px's
+    # DataFrame round trip made these figures several times slower to build.
+    months = analytics["months"]
+    palette = px.colors.qualitative.Set2
+    layout = dict(margin=dict(t=40, b=0, l=0, r=0), height=300, legend_title_text="")
+
+    # Monthly spending, stacked by category
+    fig_monthly = Figure(
+        [Bar(x=months, y=values, name=category, marker_color=palette[i % len(palette)])
+         for i, (category, values) in enumerate(analytics["by_category"].items())]
+    )
+    fig_monthly.update_layout(title="Monthly Spending (Last 12 Months)", barmode="stack", yaxis_title="₹", **layout)
+    figures = {"monthly": fig_monthly}
+
+    # Daily spending with rolling averages
+    days = analytics["days"]
+    fig_rolling = Figure([
+        Bar(x=days, y=analytics["daily"], name="Daily", marker_color="#cbd5e1"),
+        Scatter(x=days, y=analytics["avg_7"], name="7-day average", line_color="#2563eb"),
+        Scatter(x=days, y=analytics["avg_30"], name="30-day average", line_color="#f97316"),
+    ])
+    fig_rolling.update_layout(title="Daily Spending and Rolling Averages", yaxis_title="₹", **layout)
+    figures["rolling"] = fig_rolling
+
+    # Category share of each month
+    fig_share = Figure(
+        [Scatter(x=months, y=values, name=category, stackgroup="share", line_color=palette[i % len(palette)])
+         for i, (category, values) in enumerate(analytics["share"].items())]
+    )
+    fig_share.update_layout(title="Category Share", yaxis_tickformat=".0%", **layout)
+    figures["share"] = fig_share
+
+    # Month-over-month and year-over-year change
+    fig_change = Figure([
+        Bar(x=months, y=analytics["mom_pct"], name="vs previous month", marker_color="#2563eb"),
+        Bar(x=months, y=analytics["yoy_pct"], name="vs a year before", marker_color="#94a3b8"),
+    ])
+    fig_change.update_layout(title="Change in Monthly Spending", barmode="group", yaxis_tickformat=".0%", **layout)
+    figures["change"] = fig_change
+    return figures
 
 
 # ── Add Expense ──────────────────────────────────────────────────────────────
 
+def _time_options():
+    """12-hour time options, every minute ("12:00 AM" ... "11:59 PM")."""
+    options = []
+    for h in range(24):
+        for m in range(60):
+            h12 = h % 12
+            if h12 == 0:
+                h12 = 12
+            ap = "AM" if h < 12 else "PM"
+            options.append(f"{h12}:{m:02d} {ap}")
+    return tuple(options)
+
+
+# Built once per process rather than on every rerun of the add page.
+TIME_OPTIONS = _time_options()
+
+
 def render_add_expense():
     col_back, col_title = st.columns([1, 4])
     with col_back:
@@ -311,17 +515,8 @@ def render_add_expense():
         with col2:
             now_h = now_ist().hour
             now_m = now_ist().minute
-            # Build 12-hour time options (every minute)
-            time_options = []
-            for h in range(24):
-                for m in range(60):
-                    h12 = h % 12
-                    if h12 == 0:
-                        h12 = 12
-                    ap = "AM" if h < 12 else "PM"
-                    time_options.append(f"{h12}:{m:02d} {ap}")
             default_idx = now_h * 60 + now_m
-            selected_time = st.selectbox("Time", time_options, index=default_idx)
+            selected_time = st.selectbox("Time", TIME_OPTIONS, index=default_idx)
             # Parse back to HH:MM (24h) for storage
             parts = selected_time.replace("AM", "").replace("PM", "").strip().split(":")
             sel_h = int(parts[0])
@@ -370,6 +565,43 @@ def render_add_expense():
         st.rerun()
 
 
+# ── Import Statement ─────────────────────────────────────────────────────────
+
+def render_import_statement():
+    col_back, col_title = st.columns([1, 4])
+    with col_back:
+        if st.button("← Back"):
+            go("dashboard")
+            st.rerun()
+    with col_title:
+        st.markdown("## Import statement")
+
+    st.caption(
+        "Upload a bank or UPI statement exported as CSV. Debits are added as expenses; "
+        "credits and rows already in your expenses (same date and amount) are skipped."
+    )
+    uploaded = st.file_uploader("Statement CSV", type=["csv"])
+    if uploaded is None or not st.button("Import", type="primary"):
+        return
+
+    total_bytes = uploaded.size or 1
+    lines = io.TextIOWrapper(uploaded, encoding="utf-8-sig", errors="replace", newline="")
+    bar = st.progress(0.0, text="Importing…")
+    stats = None
+    try:
+        for stats in import_statement(st.session_state.user_id, lines):
+            done = min(uploaded.tell() / total_bytes, 1.0)
+            bar.progress(done, text=f"Imported {stats['imported']:,} of {stats['read']:,} rows read…")
+    except StatementFormatError as e:
+        st.error(str(e))
+        return
+    bar.progress(1.0, text="Done")
+    st.success(
+        f"Imported {stats['imported']:,} expenses. Skipped {stats['duplicates']:,} duplicates, "
+        f"{stats['credits']:,} credits and {stats['invalid']:,} unreadable rows."
+    )
+
+
 # ── View Expenses ────────────────────────────────────────────────────────────
 
 def render_view_expenses():
@@ -381,73 +613,231 @@ def render_view_expenses():
     with col_title:
         st.markdown("## Expenses")
 
-    range_opt = st.radio("", ["Today", "This week", "This month"], horizontal=True, label_visibility="collapsed")
-
-    now = now_ist()
-    if range_opt == "Today":
-        from_d = to_d = now.strftime("%Y-%m-%d")
-    elif range_opt == "This week":
-        start = now - timedelta(days=now.weekday())
-        from_d = start.strftime("%Y-%m-%d")
-        to_d = (start + timedelta(days=6)).strftime("%Y-%m-%d")
+    range_opt = st.radio("", [*_VIEW_PERIODS, "Year", "Custom"], horizontal=True, label_visibility="collapsed")
+    if range_opt in _VIEW_PERIODS:
+        view = (_VIEW_PERIODS[range_opt],)
     else:
-        from_d = now.replace(day=1).strftime("%Y-%m-%d")
-        last = (now.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        to_d = last.strftime("%Y-%m-%d")
+        view = _pick_view_range(range_opt)
+        if view is None:
+            render_export()
+            return
 
-    expenses = get_expenses(st.session_state.user_id, from_d, to_d)
-    total = sum(e["amount"] for e in expenses)
+    period, figures = _cached_render("view", lambda user_id: _view_render_data(user_id, *view), *view)
+    total = period["total"]
 
     st.metric("Total", f"₹{total:,.0f}")
 
-    if not expenses:
+    if not period["count"]:
         st.info("No expenses in this range.")
         if st.button("Add your first expense", type="primary"):
             go("add")
             st.rerun()
     else:
         # Charts for this range
-        cat_totals = {}
-        mode_totals = {}
-        for e in expenses:
-            cat_totals[e["category"]] = cat_totals.get(e["category"], 0) + e["amount"]
-            mode_totals[e["paymentMode"]] = mode_totals.get(e["paymentMode"], 0) + e["amount"]
-
         ch1, ch2 = st.columns(2)
         with ch1:
-            fig = px.pie(
-                values=list(cat_totals.values()),
-                names=list(cat_totals.keys()),
-                title="By Category",
-                color_discrete_sequence=px.colors.qualitative.Set2,
-                hole=0.4,
-            )
-            fig.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=280)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(figures["category"], use_container_width=True)
         with ch2:
-            fig2 = px.pie(
-                values=list(mode_totals.values()),
-                names=list(mode_totals.keys()),
-                title="By Payment Mode",
-                color_discrete_sequence=px.colors.qualitative.Pastel,
-                hole=0.4,
-            )
-            fig2.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=280)
-            st.plotly_chart(fig2, use_container_width=True)
+            st.plotly_chart(figures["payment_mode"], use_container_width=True)
 
         st.markdown("---")
+        render_expense_table(period)
+
+    render_export()
+
 
-        # Expense list
-        for e in expenses:
-            col_info, col_amount = st.columns([3, 1])
-            with col_info:
-                st.markdown(f"**{e['category']}** · {e['paymentMode']}")
-                st.caption(f"{e['date']} {e.get('time') or ''} {'· ' + e['notes'] if e.get('notes') else ''}")
-            with col_amount:
-                st.markdown(f"### ₹{e['amount']:,.0f}")
-            st.divider()
+_VIEW_PERIODS = {"Today": "day", "This week": "week", "This month": "month"}
 
 
+def _pick_view_range(range_opt: str):
+    """("range", from, to) for the Year or Custom option's widgets, or None until a full range is picked."""
+    today = now_ist().date()
+    if range_opt == "Year":
+        years = _cached_render("view_years", get_expense_years)
+        year = st.selectbox("Year", years)
+        return "range", f"{year}-01-01", f"{year}-12-31"
+    picked = st.date_input("Dates", value=(today.replace(day=1), today), format="YYYY-MM-DD")
+    if len(picked) < 2:
+        st.info("Pick an end date.")
+        return None
+    return "range", picked[0].strftime("%Y-%m-%d"), picked[1].strftime("%Y-%m-%d")
+
+
+def _view_render_data(user_id: str, period_key: str, from_date: str = None, to_date: str = None):
+    if period_key == "range":
+        period = get_range_summary(user_id, from_date, to_date)
+    else:
+        period = get_dashboard_snapshot(user_id)["periods"][period_key]
+    return period, (_view_figures(period) if period["count"] else {})
+
+
+_SORT_LABELS = {"Date": "date", "Amount": "amount", "Category": "category"}
+
+
+def render_expense_table(period):
+    """One page of the range's expenses as a single table; sorting and paging run in sheets_helper."""
+    c1, c2, c3 = st.columns([2, 2, 1])
+    with c1:
+        sort = _SORT_LABELS[st.selectbox("Sort by", list(_SORT_LABELS))]
+    with c2:
+        descending = st.radio("Order", ["Descending", "Ascending"], horizontal=True) == "Descending"
+
+    # Clamp before the widget is created; the range may have shrunk since.
+    pages = max(1, -(-period["count"] // EXPENSE_PAGE_SIZE))
+    if st.session_state.get("expense_page", 1) > pages:
+        st.session_state.expense_page = pages
+    with c3:
+        page_no = st.number_input("Page", min_value=1, max_value=pages, step=1, key="expense_page")
+
+    page = _cached_render(
+        "view_page",
+        lambda user_id: get_expense_page(
+            user_id, period["from"], period["to"], sort=sort, descending=descending,
+            offset=(page_no - 1) * EXPENSE_PAGE_SIZE, limit=EXPENSE_PAGE_SIZE,
+        ),
+        period["from"], period["to"], sort, descending, page_no,
+    )
+    st.dataframe(
+        [
+            {
+                "Date": e["date"],
+                "Time": e.get("time") or "",
+                "Category": e["category"],
+                "Payment mode": e["paymentMode"],
+                "Amount": e["amount"],
+                "Notes": e.get("notes") or "",
+            }
+            for e in page["expenses"]
+        ],
+        column_config={"Amount": st.column_config.NumberColumn("Amount", format="₹%.2f")},
+        hide_index=True,
+        use_container_width=True,
+    )
+    first = (page_no - 1) * EXPENSE_PAGE_SIZE
+    st.caption(f"{first + 1:,}–{first + len(page['expenses']):,} of {page['total']:,}")
+
+
+def _view_figures(period):
+    import plotly.express as px
+
+    with span("app.build_figures", page="expenses"):
+        cat_totals = period["by_category"]
+        mode_totals = period["by_payment_mode"]
+        fig = px.pie(
+            values=list(cat_totals.values()),
+            names=list(cat_totals.keys()),
+            title="By Category",
+            color_discrete_sequence=px.colors.qualitative.Set2,
+            hole=0.4,
+        )
+        fig.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=280)
+        fig2 = px.pie(
+            values=list(mode_totals.values()),
+            names=list(mode_totals.keys()),
+            title="By Payment Mode",
+            color_discrete_sequence=px.colors.qualitative.Pastel,
+            hole=0.4,
+        )
+        fig2.update_layout(margin=dict(t=40, b=0, l=0, r=0), height=280)
+    return {"category": fig, "payment_mode": fig2}
+
+
+def render_export():
+    with st.expander("Export"):
+        today = now_ist().date()
+        all_time = st.checkbox("All time", value=True)
+        c1, c2 = st.columns(2)
+        with c1:
+            from_date = st.date_input("From", value=today.replace(day=1), disabled=all_time)
+        with c2:
+            to_date = st.date_input("To", value=today, disabled=all_time)
+        formats = ["CSV", "Parquet"] if parquet_available() else ["CSV"]
+        fmt = st.radio("Format", formats, horizontal=True).lower()
+
+        user_id = st.session_state.user_id
+        start = None if all_time else from_date.strftime("%Y-%m-%d")
+        end = None if all_time else to_date.strftime("%Y-%m-%d")
+
+        def build():
+            # Runs when the button is clicked (a callable data needs Streamlit
+            # 1.52+); spills to disk past a few MB.
+            out = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+            export_expenses(user_id, out, start, end, fmt=fmt)
+            out.seek(0)
+            return out
+
+        st.download_button(
+            "Download",
+            data=build,
+            file_name=f"expenses_{start or 'all'}_{end or today}.{fmt}",
+            mime="text/csv" if fmt == "csv" else "application/vnd.apache.parquet",
+        )
+
+
+
+# ── Debug panel ──────────────────────────────────────────────────────────────
+
+def render_debug_panel():
+    """Sidebar view of instrumentation (INSTRUMENTATION includes "panel", DEBUG_PANEL_EMAILS lists the user)."""
+    summary = instrumentation.summary()
+    with st.sidebar.expander("Performance", expanded=False):
+        st.metric(
+            "Sheets requests (last minute)",
+            f"{summary['requests_last_minute']} / {summary['quota_per_minute']}",
+        )
+        if summary["counters"]:
+            st.markdown("**Counters**")
+            st.dataframe(
+                [{"counter": k, "value": v} for k, v in summary["counters"].items()],
+                hide_index=True, use_container_width=True,
+            )
+        if summary["spans"]:
+            st.markdown("**Spans**")
+            st.dataframe(
+                [{"span": k, **v} for k, v in summary["spans"].items()],
+                hide_index=True, use_container_width=True,
+            )
+        recent = list(instrumentation.memory_sink().events)[-50:]
+        if recent:
+            st.markdown("**Recent spans**")
+            st.dataframe(
+                [{k: v for k, v in e.items() if k != "type"} for e in reversed(recent)],
+                hide_index=True, use_container_width=True,
+            )
+        cache = get_render_cache().stats()
+        st.markdown(f"**Render cache** ({cache['entries']} entries, {cache['bytes'] / 1024 / 1024:.1f} / "
+                    f"{cache['max_bytes'] / 1024 / 1024:.0f} MB, {cache['evictions']} evictions)")
+        if cache["kinds"]:
+            st.dataframe(
+                [{"kind": k, **v} for k, v in cache["kinds"].items()],
+                hide_index=True, use_container_width=True,
+            )
+        probes = get_probe_stats()
+        hit_rate = "–" if probes["hit_rate"] is None else f"{probes['hit_rate']:.0%}"
+        st.markdown(f"**Change probes** ({hit_rate} unchanged)")
+        st.dataframe(
+            [{"outcome": k, "count": v} for k, v in probes.items() if k != "hit_rate"],
+            hide_index=True, use_container_width=True,
+        )
+        st.markdown("**Password hashing**")
+        st.dataframe(
+            [{"metric": k, "value": v} for k, v in get_password_stats().items()],
+            hide_index=True, use_container_width=True,
+        )
+        writes = get_write_queue_stats()
+        if writes:
+            st.markdown(f"**Write queue** ({writes['pending']} pending, {writes['dead_letters']} failed writes)")
+            if writes["dead_letters"]:
+                st.warning(f"{writes['dead_letters']} rows could not be written to the sheet; they are kept in "
+                           f"{writes['dead_letter_path']}. Last error: {writes['last_error']}")
+            st.dataframe(
+                [{"metric": k, "value": v} for k, v in writes.items() if k not in ("last_error", "dead_letter_path")],
+                hide_index=True, use_container_width=True,
+            )
+        if st.button("Reset counters"):
+            instrumentation.reset()
+            st.rerun()
+
 
 # ── Entry point ──────────────────────────────────────────────────────────────
 
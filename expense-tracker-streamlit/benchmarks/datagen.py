@@ -0,0 +1,68 @@
+"""Synthetic Expenses and Users tabs for the benchmarks.
+
+Rows look like what the app and hand edits leave in a real sheet: dates are a
+mix of ISO strings and Sheets serial numbers, times a mix of "HH:MM" and day
+fractions, and users have very different amounts of history.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+from sheets_helper import CATEGORIES, PAYMENT_MODES
+
+EXPENSES_HEADER = ["UserId", "Date", "Time", "Amount", "Category", "Payment Mode", "Notes", "Created"]
+USERS_HEADER = ["UserId", "Email", "PasswordHash", "CreatedAt"]
+
+_SHEETS_EPOCH = date(1899, 12, 30)
+# Shape of a bcrypt hash; the benchmarks never check passwords.
+_FAKE_HASH = "$2b$12$" + "x" * 53
+
+
+def user_ids(n_users: int):
+    return [f"user{i:06d}" for i in range(n_users)]
+
+
+def email_for(user_id: str) -> str:
+    return f"{user_id}@example.com"
+
+
+def generate_users(n_users: int):
+    rows = [USERS_HEADER]
+    for uid in user_ids(n_users):
+        rows.append([uid, email_for(uid), _FAKE_HASH, "2024-01-01T00:00:00.000000Z"])
+    return rows
+
+
+def generate_expenses(n_rows: int, n_users: int, end: date, days: int = 730,
+                      serial_fraction: float = 0.3, seed: int = 0):
+    """Header plus n_rows expense rows over the days up to end.
+
+    Users are picked with a skewed distribution, so a few have most of the rows;
+    serial_fraction of dates (and times) are written as Sheets serial numbers.
+    """
+    rng = random.Random(seed)
+    users = user_ids(n_users)
+    weights = [1.0 / (i + 1) for i in range(n_users)]
+    picked = rng.choices(users, weights=weights, k=n_rows)
+    start = end - timedelta(days=days - 1)
+    created = datetime(2024, 1, 1)
+    rows = [EXPENSES_HEADER]
+    for i, uid in enumerate(picked):
+        d = start + timedelta(days=rng.randrange(days))
+        minute = rng.randrange(24 * 60)
+        if rng.random() < serial_fraction:
+            date_cell = str((d - _SHEETS_EPOCH).days)
+            time_cell = repr(minute / (24 * 60))
+        else:
+            date_cell = d.isoformat()
+            time_cell = f"{minute // 60:02d}:{minute % 60:02d}"
+        rows.append([
+            uid,
+            date_cell,
+            time_cell,
+            str(rng.randrange(10, 500000) / 100),
+            rng.choice(CATEGORIES),
+            rng.choice(PAYMENT_MODES),
+            "" if rng.random() < 0.5 else f"note {i}",
+            (created + timedelta(seconds=i)).isoformat() + "Z",
+        ])
+    return rows
@@ -0,0 +1,125 @@
+"""In-memory stand-ins for gspread's Spreadsheet and Worksheet.
+
+Only the calls sheets_helper makes are implemented. Every call sleeps for
+latency seconds (plus per_row_latency per row sent or returned) to mimic a
+Sheets API round trip, and is counted in FakeWorksheet.calls.
+"""
+import re
+import time
+from collections import Counter
+
+_A1_RE = re.compile(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - ord("A") + 1
+    return n
+
+
+class FakeWorksheet:
+    def __init__(self, title: str, rows, latency: float = 0.0, per_row_latency: float = 0.0):
+        self.title = title
+        self.rows = [[str(v) for v in r] for r in rows]
+        self.latency = latency
+        self.per_row_latency = per_row_latency
+        self.calls = Counter()
+        self.rows_transferred = 0
+
+    def _call(self, name: str, rows: int = 0):
+        self.calls[name] += 1
+        self.rows_transferred += rows
+        delay = self.latency + self.per_row_latency * rows
+        if delay:
+            time.sleep(delay)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    # --- Reads ---
+
+    def get_all_values(self, **kwargs):
+        self._call("get_all_values", len(self.rows))
+        return [list(r) for r in self.rows]
+
+    def _range(self, a1: str):
+        m = _A1_RE.match(a1.split("!")[-1])
+        if not m:
+            raise ValueError(f"Unsupported range: {a1}")
+        first_col = _col_index(m.group(1))
+        last_col = _col_index(m.group(3) or m.group(1))
+        first_row = int(m.group(2) or 1)
+        last_row = int(m.group(4)) if m.group(4) else (first_row if not m.group(3) else len(self.rows))
+        values = []
+        for r in self.rows[first_row - 1:last_row]:
+            cells = r[first_col - 1:last_col]
+            # Like the API, trailing empty cells and rows are dropped.
+            while cells and cells[-1] == "":
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def get(self, a1: str, **kwargs):
+        values = self._range(a1)
+        self._call("get", len(values))
+        return values
+
+    def batch_get(self, ranges, **kwargs):
+        result = [self._range(a1) for a1 in ranges]
+        self._call("batch_get", sum(len(v) for v in result))
+        return result
+
+    def col_values(self, col: int, **kwargs):
+        self._call("col_values", len(self.rows))
+        values = [r[col - 1] if len(r) >= col else "" for r in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    # --- Writes ---
+
+    def _updates(self, first: int, last: int):
+        return {"updates": {"updatedRange": f"{self.title}!A{first}:H{last}"}}
+
+    def append_row(self, row, **kwargs):
+        self._call("append_row", 1)
+        self.rows.append(["" if v is None else str(v) for v in row])
+        return self._updates(len(self.rows), len(self.rows))
+
+    def append_rows(self, rows, **kwargs):
+        self._call("append_rows", len(rows))
+        first = len(self.rows) + 1
+        self.rows.extend(["" if v is None else str(v) for v in r] for r in rows)
+        return self._updates(first, len(self.rows))
+
+
+class FakeSpreadsheet:
+    def __init__(self, tabs):
+        self.tabs = tabs
+
+    def worksheet(self, name: str):
+        return self.tabs[name]
+
+    def worksheets(self):
+        return list(self.tabs.values())
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, **kwargs):
+        model = next(iter(self.tabs.values()), None)
+        self.tabs[title] = FakeWorksheet(title, [], model.latency if model else 0.0,
+                                         model.per_row_latency if model else 0.0)
+        return self.tabs[title]
+
+    def total_calls(self):
+        total = Counter()
+        for ws in self.tabs.values():
+            total.update(ws.calls)
+        return total
+
+    def reset_counters(self):
+        for ws in self.tabs.values():
+            ws.calls.clear()
+            ws.rows_transferred = 0
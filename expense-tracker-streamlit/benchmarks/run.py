@@ -0,0 +1,211 @@
+"""Offline benchmarks for sheets_helper against an in-memory fake sheet.
+
+Run from the expense-tracker-streamlit directory:
+
+    python -m benchmarks.run --rows 10000 100000 --latency 0.05 --out bench.json
+    python -m benchmarks.run --rows 10000 --baseline bench.json   # exit 1 on regressions
+
+Each size is run with the local mirror on ("mirror") and off ("direct"). Results
+are written as JSON: one entry per (rows, mode, scenario) with wall-clock
+timings in milliseconds and the fake sheet's API calls per run.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks import datagen
+from benchmarks.fake_sheets import FakeSpreadsheet, FakeWorksheet
+
+MODES = ("mirror", "direct")
+
+
+def _configure(sheet_id: str, mode: str, workdir: str):
+    # Settings are read on every call, so changing the environment is enough;
+    # a new SHEET_ID also gives the run its own mirror and write journal.
+    os.environ["SHEET_ID"] = sheet_id
+    os.environ["MIRROR_ENABLED"] = "true" if mode == "mirror" else "false"
+    os.environ["MIRROR_DB_PATH"] = os.path.join(workdir, f"{sheet_id}.sqlite3")
+    os.environ["WRITE_JOURNAL_PATH"] = os.path.join(workdir, f"{sheet_id}.jsonl")
+    # The fake sheet has no quota; don't let the rate limiter pace the runs.
+    os.environ["SHEETS_QUOTA_PER_MINUTE"] = "1000000000"
+    os.environ["SHEETS_BURST"] = "1000000"
+
+
+def _scenarios(sh, app, expenses, heavy: str, light: str, today: date):
+    """(name, setup, fn, modes) for every benchmark; setup runs untimed before each repetition."""
+    month_start = today.replace(day=1).isoformat()
+    raw_rows = [list(map(str, r)) for r in expenses[1:]]
+
+    def none():
+        pass
+
+    def dashboard():
+        app.build_dashboard_figures(sh.get_dashboard_snapshot(heavy, today))
+
+    def dashboard_cached():
+        # What a rerun with unchanged data costs: the version probe and a cache hit.
+        key = ("dashboard", heavy, today, sh.get_data_version(heavy))
+        sh.get_render_cache().get_or_build(key, dashboard)
+
+    return [
+        # Parsing doesn't depend on the mode, so it runs once per size.
+        ("parse_rows", none, lambda: sh.parse_expense_rows(raw_rows), ("direct",)),
+        ("parse_to_expenses", none, lambda: sh.parse_expense_rows(raw_rows).to_expenses(), ("direct",)),
+        ("sync_mirror_full", none, lambda: sh.sync_mirror(full=True), ("mirror",)),
+        ("get_expenses_cold_index", sh.reset_row_index, lambda: sh.get_expenses(heavy), ("direct",)),
+        ("get_expenses_all_heavy", none, lambda: sh.get_expenses(heavy), MODES),
+        ("get_expenses_all_light", none, lambda: sh.get_expenses(light), MODES),
+        ("get_expenses_month_heavy", none, lambda: sh.get_expenses(heavy, month_start, today.isoformat()), MODES),
+        ("get_expense_page_heavy", none,
+         lambda: sh.get_expense_page(heavy, sort="amount", offset=1000, limit=sh.EXPENSE_PAGE_SIZE), MODES),
+        ("get_totals_heavy", none, lambda: sh.get_totals(heavy, today), MODES),
+        ("get_range_summary_year_heavy", none,
+         lambda: sh.get_range_summary(heavy, f"{today.year - 1}-01-01", f"{today.year - 1}-12-31"), MODES),
+        ("dashboard_data_path", none, dashboard, MODES),
+        ("analytics_data_path", none,
+         lambda: app.build_analytics_figures(sh.get_spending_analytics(heavy, today)), MODES),
+        ("dashboard_render_cached", none, dashboard_cached, MODES),
+        ("find_user_cold", sh.invalidate_user_cache, lambda: sh.find_user_by_email(datagen.email_for(light)), MODES),
+        ("find_user_hit", none, lambda: sh.find_user_by_email(datagen.email_for(light)), MODES),
+        ("find_user_miss", none, lambda: sh.find_user_by_email("nobody@example.com"), MODES),
+        ("add_expense_queued", none,
+         lambda: sh.add_expense(heavy, today.isoformat(), "12:00", 99.5, "Food", "UPI", "bench"), MODES),
+        ("flush_writes", lambda: sh.add_expense(heavy, today.isoformat(), "12:00", 1, "Food", "UPI", "bench"),
+         sh.flush_writes, MODES),
+        ("get_totals_after_write", lambda: sh.add_expense(heavy, today.isoformat(), "12:00", 1, "Food", "UPI", "b"),
+         lambda: sh.get_totals(heavy, today), MODES),
+    ]
+
+
+def _time_scenario(spreadsheet, setup, fn, repeat: int):
+    timings = []
+    spreadsheet.reset_counters()
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    calls = spreadsheet.total_calls()
+    rows = sum(ws.rows_transferred for ws in spreadsheet.tabs.values())
+    return {
+        "runs": repeat,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "max_ms": round(max(timings), 3),
+        # Setup calls (e.g. the add_expense before flush_writes) are included.
+        "api_calls_per_run": {k: round(v / repeat, 2) for k, v in sorted(calls.items())},
+        "rows_transferred_per_run": round(rows / repeat, 1),
+    }
+
+
+def run(sizes, users, latency, per_row_latency, repeat, seed, only=None):
+    import sheets_helper as sh
+    import app
+
+    today = date.today()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="expense-bench-") as workdir:
+        for n_rows in sizes:
+            n_users = users or max(10, min(5000, n_rows // 100))
+            expenses = datagen.generate_expenses(n_rows, n_users, end=today, seed=seed)
+            user_rows = datagen.generate_users(n_users)
+            ids = datagen.user_ids(n_users)
+            heavy, light = ids[0], ids[-1]
+            for mode in MODES:
+                sheet_id = f"bench-{n_rows}-{mode}"
+                _configure(sheet_id, mode, workdir)
+                if sh._get_sheet_id() != sheet_id:
+                    raise SystemExit("SHEET_ID comes from .streamlit/secrets.toml here; "
+                                     "run the benchmarks without a secrets file so they never touch a real sheet")
+                spreadsheet = FakeSpreadsheet({
+                    sh.EXPENSES_TAB: FakeWorksheet(sh.EXPENSES_TAB, expenses, latency, per_row_latency),
+                    sh.USERS_TAB: FakeWorksheet(sh.USERS_TAB, user_rows, latency, per_row_latency),
+                })
+                sh.use_spreadsheet(spreadsheet, sheet_id)
+                sh.reset_row_index()
+                sh.invalidate_user_cache()
+                for name, setup, fn, modes in _scenarios(sh, app, expenses, heavy, light, today):
+                    if mode not in modes or (only and name not in only):
+                        continue
+                    entry = {"rows": n_rows, "users": n_users, "mode": mode, "scenario": name}
+                    entry.update(_time_scenario(spreadsheet, setup, fn, repeat))
+                    results.append(entry)
+                    print(f"{n_rows:>8} {mode:<6} {name:<26} median {entry['median_ms']:>10.2f} ms", file=sys.stderr)
+                sh.flush_writes()
+                sh.reset_sheet_pool()
+    return results
+
+
+def compare(results, baseline, tolerance: float, min_delta_ms: float = 1.0):
+    """Entries whose median is more than tolerance (a fraction) and min_delta_ms slower than in baseline.
+
+    The absolute floor keeps sub-millisecond scenarios from flagging on noise.
+    """
+    key = lambda e: (e["rows"], e["mode"], e["scenario"])  # noqa: E731
+    before = {key(e): e for e in baseline.get("results", [])}
+    regressions = []
+    for e in results:
+        old = before.get(key(e))
+        if old and e["median_ms"] > max(old["median_ms"] * (1 + tolerance), old["median_ms"] + min_delta_ms):
+            regressions.append({
+                "rows": e["rows"], "mode": e["mode"], "scenario": e["scenario"],
+                "baseline_ms": old["median_ms"], "median_ms": e["median_ms"],
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sheets_helper against an in-memory fake sheet.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="Expenses rows per run")
+    parser.add_argument("--users", type=int, default=0, help="number of users (default: rows/100, 10-5000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--per-row-latency", type=float, default=0.0, help="seconds added per row transferred")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="run only these scenarios")
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.users, args.latency, args.per_row_latency, args.repeat, args.seed, args.only)
+    report = {
+        "meta": {
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "per_row_latency": args.per_row_latency,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if report.get("regressions"):
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['rows']} {r['mode']} {r['scenario']}: "
+                  f"{r['baseline_ms']} ms -> {r['median_ms']} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,465 @@
+"""Columnar parsing of raw Expenses rows.
+
+parse_expense_rows() turns the get_all_values() matrix into NumPy columns in
+one pass: day numbers and epoch-minute timestamps, amounts, and categorical
+codes for userId, category and payment mode. Dates and times are parsed once
+per distinct cell: well-formed ones (ISO dates, sheet serials, HH:MM times)
+vectorially, anything else by the scalar parse_sheet_date/parse_sheet_time
+rules, so rows come out exactly as the old per-row parser and get_expenses
+date filter produced them.
+
+500k generated rows (benchmarks.datagen) parse in about 0.65 s on one slow
+core. Turning them all into records with to_expenses() (and freeing them)
+brings that to about 2.1 s. See the parse_rows and parse_to_expenses
+benchmarks.
+
+Rows come out as Expense records: __slots__ objects carrying the parsed
+epoch-minute timestamp, with their repeated strings interned. They read like
+the dicts they replaced (e["amount"], e.get("notes"), dict(e)).
+"""
+import gc
+import sys
+from collections.abc import Mapping
+from contextlib import contextmanager
+from datetime import datetime
+from operator import itemgetter
+
+import numpy as np
+
+# Days from the sheets epoch (1899-12-30) to 1970-01-01.
+SHEETS_EPOCH_OFFSET = 25569
+# Serials past 9999-12-31 overflow datetime; leave those to the scalar path.
+_MAX_SERIAL = 2958466
+MINUTES_PER_DAY = 24 * 60
+
+# Day/timestamp of a row with an empty date. get_expenses treats those as
+# datetime.min: included only when no from_date is given.
+NO_DATE = int(np.iinfo(np.int64).min)
+
+_KIND_EMPTY, _KIND_TEXT, _KIND_SERIAL, _KIND_OTHER = 0, 1, 2, 3
+
+_ORD_0 = ord("0")
+_ORD_DASH = ord("-")
+_ORD_COLON = ord(":")
+_ORD_DOT = ord(".")
+
+
+def parse_sheet_date(val):
+    if val is None or val == "":
+        return ""
+    try:
+        n = float(val)
+        if n > 1000:
+            from datetime import timedelta
+            base = datetime(1899, 12, 30)
+            d = base + timedelta(days=n)
+            return d.strftime("%Y-%m-%d")
+    except (ValueError, TypeError):
+        pass
+    return str(val).strip() or ""
+
+
+def parse_sheet_time(val):
+    if val is None or val == "":
+        return ""
+    try:
+        n = float(val)
+        if 0 <= n < 1:
+            total_min = int(round(n * 24 * 60))
+            h, m = divmod(total_min, 60)
+            return f"{h:02d}:{m:02d}"
+    except (ValueError, TypeError):
+        pass
+    return str(val).strip() or ""
+
+
+def day_number(date_str: str) -> int:
+    """Days since 1970-01-01 for a YYYY-MM-DD string."""
+    return int(np.datetime64(datetime.strptime(date_str[:10], "%Y-%m-%d").date(), "D").astype(np.int64))
+
+
+def day_string(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+# --- Expense records ---
+
+# Dict key -> Expense attribute, in the order the old expense dicts had them.
+_EXPENSE_KEYS = {
+    "id": "id",
+    "userId": "user_id",
+    "date": "date",
+    "time": "time",
+    "amount": "amount",
+    "category": "category",
+    "paymentMode": "payment_mode",
+    "notes": "notes",
+    "createdAt": "created_at",
+}
+
+
+class Expense(Mapping):
+    """One expense row; a read-only Mapping with the old expense dict's keys.
+
+    ts is epoch minutes (the time of day added when it parses), NO_DATE for an
+    empty date. date and time are the display strings. Strings repeated across
+    rows (user, date, time, category, payment mode) are interned, so a row
+    costs the object plus its amount, id, ts and createdAt.
+    """
+
+    __slots__ = ("id", "user_id", "date", "time", "ts", "amount", "category", "payment_mode", "notes",
+                 "created_at")
+
+    def __init__(self, id, user_id, date, time, ts, amount, category, payment_mode, notes, created_at):
+        self.id = id
+        self.user_id = user_id
+        self.date = date
+        self.time = time
+        self.ts = ts
+        self.amount = amount
+        self.category = category
+        self.payment_mode = payment_mode
+        self.notes = notes
+        self.created_at = created_at
+
+    @property
+    def day(self) -> int:
+        """Days since 1970-01-01 (NO_DATE for an empty date)."""
+        return NO_DATE if self.ts == NO_DATE else self.ts // MINUTES_PER_DAY
+
+    def __getitem__(self, key):
+        return getattr(self, _EXPENSE_KEYS[key])
+
+    def __iter__(self):
+        return iter(_EXPENSE_KEYS)
+
+    def __len__(self):
+        return len(_EXPENSE_KEYS)
+
+    def __repr__(self):
+        return f"Expense({dict(self)!r})"
+
+
+def make_expense(id, user_id, date, time, ts, amount, category, payment_mode, notes, created_at) -> Expense:
+    """Expense with its repeated strings interned (for values not already shared)."""
+    intern = sys.intern
+    return Expense(id, intern(user_id), intern(date), intern(time), ts, amount, intern(category),
+                   intern(payment_mode), notes or "", created_at)
+
+
+def _codes(chars, width=None):
+    """(n, width) int32 array of code points of each string, zero-padded."""
+    if width is None:
+        width = max(chars.dtype.itemsize // 4, 1)
+    return np.ascontiguousarray(chars.astype(f"U{width}")).view(np.int32).reshape(-1, width)
+
+
+def _is_digit(c):
+    return (c >= _ORD_0) & (c <= _ORD_0 + 9)
+
+
+def _numeric_values(stripped, candidates):
+    """(indices, floats) for cells that are plain non-negative decimals ("46061", "0.655")."""
+    sub = np.flatnonzero(candidates)
+    c = _codes(stripped[sub])
+    digit = _is_digit(c)
+    dots = c == _ORD_DOT
+    numeric = (digit | dots | (c == 0)).all(axis=1) & (dots.sum(axis=1) <= 1) & digit.any(axis=1)
+    idx = sub[numeric]
+    values = np.array(stripped[idx].tolist(), dtype=np.float64) if len(idx) else np.zeros(0)
+    return idx, values
+
+
+def _per_row(codes, kind, fallback):
+    """Index -> fallback display for rows whose distinct value (code) has one."""
+    rows = np.flatnonzero(kind[codes] == _KIND_OTHER)
+    return dict(zip(rows.tolist(), map(fallback.__getitem__, codes[rows].tolist())))
+
+
+def _parse_dates(raw):
+    """Return (day, valid, kind, fallback_display) for a list of raw date cells.
+
+    A sheet repeats the same few thousand dates, so each distinct cell is
+    parsed once and the results are spread back over the rows.
+    """
+    codes, labels = _factorize(raw)
+    day, valid, kind, fallback = _parse_distinct_dates(labels)
+    return day[codes], valid[codes], kind[codes], _per_row(codes, kind, fallback)
+
+
+def _parse_distinct_dates(raw):
+    n = len(raw)
+    cells = np.array(raw, dtype=str) if n else np.zeros(0, dtype="U1")
+    stripped = np.char.strip(cells)
+    day = np.full(n, NO_DATE, dtype=np.int64)
+    valid = np.ones(n, dtype=bool)
+    kind = np.full(n, _KIND_OTHER, dtype=np.int8)
+    kind[cells == ""] = _KIND_EMPTY
+
+    # ISO "YYYY-MM-DD..." (only the first 10 chars are parsed, as in get_expenses)
+    c = _codes(stripped, 10)
+    iso = _is_digit(c[:, [0, 1, 2, 3, 5, 6, 8, 9]]).all(axis=1) & (c[:, 4] == _ORD_DASH) & (c[:, 7] == _ORD_DASH)
+    iso &= kind == _KIND_OTHER
+    d = c - _ORD_0
+    year = d[:, 0] * 1000 + d[:, 1] * 100 + d[:, 2] * 10 + d[:, 3]
+    month = d[:, 5] * 10 + d[:, 6]
+    dom = d[:, 8] * 10 + d[:, 9]
+    months = (np.where(iso, year, 1970) - 1970) * 12 + np.clip(np.where(iso, month, 1), 1, 12) - 1
+    first = months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    days_in_month = (months + 1).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) - first
+    iso_ok = iso & (year >= 1) & (month >= 1) & (month <= 12) & (dom >= 1) & (dom <= days_in_month)
+    day[iso_ok] = (first + dom - 1)[iso_ok]
+    valid[iso & ~iso_ok] = False
+    kind[iso] = _KIND_TEXT
+
+    # Sheet serial numbers; small numbers are not dates and stay as (unparseable) text.
+    idx, values = _numeric_values(stripped, kind == _KIND_OTHER)
+    if len(idx):
+        serial = (values > 1000) & (values < _MAX_SERIAL)
+        day[idx[serial]] = np.floor(values[serial]).astype(np.int64) - SHEETS_EPOCH_OFFSET
+        kind[idx[serial]] = _KIND_SERIAL
+        small = values <= 1000
+        valid[idx[small]] = False
+        kind[idx[small]] = _KIND_TEXT
+
+    fallback = {}
+    for i in np.flatnonzero(kind == _KIND_OTHER):
+        val = raw[i]
+        display = parse_sheet_date(val) or val or ""
+        fallback[int(i)] = display
+        if not display:
+            continue
+        try:
+            day[i] = day_number(display)
+        except (ValueError, TypeError):
+            valid[i] = False
+    return day, valid, kind, fallback
+
+
+def _parse_times(raw):
+    """Return (minute, kind, fallback_display); minute is -1 where the time is ignored.
+
+    Parsed once per distinct cell, like dates.
+    """
+    codes, labels = _factorize(raw)
+    minute, kind, fallback = _parse_distinct_times(labels)
+    return minute[codes], kind[codes], _per_row(codes, kind, fallback)
+
+
+def _parse_distinct_times(raw):
+    n = len(raw)
+    cells = np.array(raw, dtype=str) if n else np.zeros(0, dtype="U1")
+    stripped = np.char.strip(cells)
+    minute = np.full(n, -1, dtype=np.int64)
+    kind = np.full(n, _KIND_OTHER, dtype=np.int8)
+    kind[cells == ""] = _KIND_EMPTY
+
+    c = _codes(stripped, 6)
+    end_ok = lambda col: (col == 0) | (col == _ORD_COLON)  # noqa: E731
+    short = _is_digit(c[:, [0, 2, 3]]).all(axis=1) & (c[:, 1] == _ORD_COLON) & end_ok(c[:, 4])
+    long = _is_digit(c[:, [0, 1, 3, 4]]).all(axis=1) & (c[:, 2] == _ORD_COLON) & end_ok(c[:, 5])
+    short &= kind == _KIND_OTHER
+    long &= kind == _KIND_OTHER
+    d = c - _ORD_0
+    hour = np.where(short, d[:, 0], d[:, 0] * 10 + d[:, 1])
+    mins = np.where(short, d[:, 2] * 10 + d[:, 3], d[:, 3] * 10 + d[:, 4])
+    hhmm = short | long
+    ok = hhmm & (hour <= 23) & (mins <= 59)
+    minute[ok] = (hour * 60 + mins)[ok]
+    kind[hhmm] = _KIND_TEXT
+
+    idx, values = _numeric_values(stripped, kind == _KIND_OTHER)
+    if len(idx):
+        serial = values < 1
+        total = np.round(values[serial] * 24 * 60).astype(np.int64)  # same float ops as parse_sheet_time
+        # A serial rounding up to 24:00 is displayed but, like today, not usable.
+        minute[idx[serial]] = np.where(total < MINUTES_PER_DAY, total, -1)
+        kind[idx[serial]] = _KIND_SERIAL
+        kind[idx[~serial]] = _KIND_TEXT
+
+    fallback = {}
+    for i in np.flatnonzero(kind == _KIND_OTHER):
+        val = raw[i]
+        display = parse_sheet_time(val) or val or ""
+        fallback[int(i)] = display
+        try:
+            h, m = map(int, display.split(":")[:2])
+        except (ValueError, IndexError):
+            continue
+        if 0 <= h <= 23 and 0 <= m <= 59:
+            minute[i] = h * 60 + m
+    return minute, kind, fallback
+
+
+def _parse_amounts(raw):
+    try:
+        return np.array(raw, dtype=np.float64)
+    except ValueError:
+        # Empty cells count as 0; anything else float() rejects raises, as before.
+        return np.fromiter((float(a) if a else 0.0 for a in raw), dtype=np.float64, count=len(raw))
+
+
+def _factorize(values):
+    """(int32 codes, labels) with labels in first-seen order; None counts as ""."""
+    labels = list(dict.fromkeys(values))
+    if None in labels:
+        values = [v or "" for v in values]
+        labels = list(dict.fromkeys(values))
+    table = {v: i for i, v in enumerate(labels)}
+    codes = np.fromiter(map(table.__getitem__, values), dtype=np.int32, count=len(values))
+    return codes, labels
+
+
+@contextmanager
+def _gc_paused():
+    """Hold off the cyclic GC while allocating many objects that can't form cycles.
+
+    Each allocation burst otherwise triggers collections that traverse every
+    record built so far, which costs more than building them.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _column(rows, i):
+    return list(map(itemgetter(i), rows))
+
+
+def _absent(n):
+    """Codes and labels for a column that was not read: every row is ""."""
+    return np.zeros(n, dtype=np.int32), [""]
+
+
+class ExpenseColumns:
+    """Typed columns for a batch of Expenses rows.
+
+    day is days since 1970-01-01 and ts epoch minutes (time of day added when
+    it parses); both are NO_DATE for an empty date. valid is False where the
+    date could not be parsed -- get_expenses never returns those rows.
+
+    width is how many leading columns were read (A:D is 4). Columns past it
+    come out empty, and to_expenses() needs all eight.
+    """
+
+    def __init__(self, rows, row_numbers, width=8):
+        if rows and min(map(len, rows)) < width:
+            rows = [r if len(r) >= width else list(r) + [""] * (width - len(r)) for r in rows]
+        self._rows = rows
+        self.row = np.asarray(row_numbers, dtype=np.int64)
+        self.user_code, self.users = _factorize(_column(rows, 0))
+        self.day, self.valid, self._date_kind, self._date_fallback = _parse_dates(_column(rows, 1))
+        self.minute, self._time_kind, self._time_fallback = _parse_times(_column(rows, 2))
+        self.amount = _parse_amounts(_column(rows, 3))
+        n = len(rows)
+        self.category_code, self.categories = _factorize(_column(rows, 4)) if width > 4 else _absent(n)
+        self.payment_code, self.payment_modes = _factorize(_column(rows, 5)) if width > 5 else _absent(n)
+        dated = self.day != NO_DATE
+        self.ts = np.where(
+            dated, np.where(dated, self.day, 0) * MINUTES_PER_DAY + np.maximum(self.minute, 0), NO_DATE
+        )
+
+    def __len__(self):
+        return len(self._rows)
+
+    def select(self, user_id: str = None, from_day: int = None, to_day: int = None):
+        """Indices of valid rows for user_id with day in [from_day, to_day], in sheet order.
+
+        from_day=None also admits rows with an empty date, as get_expenses does.
+        """
+        mask = self.valid.copy()
+        if user_id is not None:
+            try:
+                mask &= self.user_code == self.users.index(user_id)
+            except ValueError:
+                return np.zeros(0, dtype=np.int64)
+        if from_day is not None:
+            mask &= self.day >= from_day
+        if to_day is not None:
+            mask &= self.day <= to_day
+        return np.flatnonzero(mask)
+
+    def days(self):
+        """Day number per row (NO_DATE for an empty date), None where it is unparseable."""
+        return [d if v else None for d, v in zip(self.day.tolist(), self.valid.tolist())]
+
+    def date_display(self, i: int) -> str:
+        kind = self._date_kind[i]
+        if kind == _KIND_SERIAL:
+            return day_string(self.day[i])
+        if kind == _KIND_TEXT:
+            return self._rows[i][1].strip()
+        return self._date_fallback.get(int(i), "")
+
+    def time_display(self, i: int) -> str:
+        kind = self._time_kind[i]
+        if kind == _KIND_SERIAL:
+            h, m = divmod(int(round(float(self._rows[i][2]) * 24 * 60)), 60)
+            return f"{h:02d}:{m:02d}"
+        if kind == _KIND_TEXT:
+            return self._rows[i][2].strip()
+        return self._time_fallback.get(int(i), "")
+
+    def cells(self, indices):
+        """(day, category, payment mode, amount, 1) rollup cells for the given row indices."""
+        idx = np.asarray(indices, dtype=np.int64)
+        categories, payment_modes = self.categories, self.payment_modes
+        columns = zip(
+            self.day[idx].tolist(), self.category_code[idx].tolist(), self.payment_code[idx].tolist(),
+            self.amount[idx].tolist(),
+        )
+        return [(day, categories[c], payment_modes[p], amount, 1) for day, c, p, amount in columns]
+
+    def _displays(self, col: int, idx, display):
+        """display(i) for each row in idx, interned, computed once per distinct raw cell."""
+        raw = [self._rows[i][col] for i in idx]
+        table = {}
+        for value, i in zip(raw, idx):
+            if value not in table:
+                table[value] = sys.intern(display(i))
+        return list(map(table.__getitem__, raw))
+
+    def to_expenses(self, indices=None):
+        """Expense records for the given row indices (all rows by default)."""
+        idx = np.arange(len(self)) if indices is None else np.asarray(indices, dtype=np.int64)
+        positions = idx.tolist()
+        intern = sys.intern
+        users = [intern(v) for v in self.users]
+        categories = [intern(v) for v in self.categories]
+        payment_modes = [intern(v) for v in self.payment_modes]
+        rows = [self._rows[i] for i in positions]
+        with _gc_paused():
+            return list(map(
+                Expense,
+                self.row[idx].tolist(),
+                map(users.__getitem__, self.user_code[idx].tolist()),
+                self._displays(1, positions, self.date_display),
+                self._displays(2, positions, self.time_display),
+                self.ts[idx].tolist(),
+                self.amount[idx].tolist(),
+                map(categories.__getitem__, self.category_code[idx].tolist()),
+                map(payment_modes.__getitem__, self.payment_code[idx].tolist()),
+                [r[6] or "" for r in rows],
+                [r[7] or "" for r in rows],
+            ))
+
+
+def parse_days(values):
+    """Day number per raw Date cell (NO_DATE for an empty one), None where it is unparseable."""
+    day, valid, _, _ = _parse_dates(["" if v is None else v for v in values])
+    return [d if v else None for d, v in zip(day.tolist(), valid.tolist())]
+
+
+def parse_expense_rows(rows, first_row: int = 2, row_numbers=None, width: int = 8) -> ExpenseColumns:
+    """Parse raw Expenses rows (no header) into ExpenseColumns.
+
+    Rows are numbered from first_row unless explicit sheet row_numbers are given.
+    width is the number of leading columns the rows were read with.
+    """
+    if row_numbers is None:
+        row_numbers = np.arange(first_row, first_row + len(rows), dtype=np.int64)
+    return ExpenseColumns(rows, row_numbers, width)
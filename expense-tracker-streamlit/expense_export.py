@@ -0,0 +1,71 @@
+"""Writing exported expenses as CSV or Parquet.
+
+Both writers take an iterable of pages (lists of Expense records, as yielded
+by sheets_helper.iter_expense_pages) and write each page before pulling the next,
+so only one page is held in memory at a time.
+"""
+import csv
+import io
+from operator import attrgetter
+
+# (expense key, column header) in export order.
+EXPORT_COLUMNS = (
+    ("date", "Date"),
+    ("time", "Time"),
+    ("amount", "Amount"),
+    ("category", "Category"),
+    ("paymentMode", "Payment Mode"),
+    ("notes", "Notes"),
+    ("createdAt", "Created"),
+)
+# An Expense's values for EXPORT_COLUMNS, as a tuple.
+_export_values = attrgetter("date", "time", "amount", "category", "payment_mode", "notes", "created_at")
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def write_csv(pages, out) -> int:
+    """Write pages as UTF-8 CSV (with a header row) to the binary file out; returns the row count."""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow([header for _, header in EXPORT_COLUMNS])
+    count = 0
+    for page in pages:
+        writer.writerows(map(_export_values, page))
+        count += len(page)
+    text.detach()  # leave out open for the caller
+    return count
+
+
+def write_parquet(pages, out) -> int:
+    """Write pages as one Parquet row group per page to the binary file out; returns the row count.
+
+    Raises ImportError if pyarrow is not installed.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("date", pa.string()),
+        ("time", pa.string()),
+        ("amount", pa.float64()),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("paymentMode", pa.dictionary(pa.int32(), pa.string())),
+        ("notes", pa.string()),
+        ("createdAt", pa.string()),
+    ])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for page in pages:
+            values = zip(*map(_export_values, page)) if page else [[]] * len(EXPORT_COLUMNS)
+            columns = {key: list(column) for (key, _), column in zip(EXPORT_COLUMNS, values)}
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            count += len(page)
+    return count
@@ -0,0 +1,275 @@
+"""Timing spans and counters for the Sheets backend and the app.
+
+Off unless configure() is given at least one sink; when off, span() returns a
+shared no-op context manager and count() returns at once, so instrumented code
+costs one global check per call.
+
+    with span("sheets.get_all_values", tab="Expenses") as s:
+        rows = ws.get_all_values()
+        s.set(rows=len(rows))
+    count("rows_read", len(rows))
+
+Finished spans go to every sink. Sinks are objects with emit(event), where
+event is a dict: {"type": "span", "name", "ms", "parent", "thread", "at", **attrs}.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+# Sheets API read/write quota per user per minute (Google's default).
+DEFAULT_QUOTA_PER_MINUTE = 60
+
+_enabled = False
+_sinks = []
+_lock = threading.Lock()
+_local = threading.local()
+_counters = {}
+_span_stats = {}
+_requests = deque()
+_quota = {"per_minute": DEFAULT_QUOTA_PER_MINUTE}
+
+
+# --- Sinks ---
+
+
+class LogSink:
+    """One log line per span on the "expense_tracker.perf" logger."""
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("expense_tracker.perf")
+
+    def emit(self, event):
+        attrs = " ".join(f"{k}={v}" for k, v in event.items() if k not in ("type", "name", "ms", "at", "thread"))
+        self.logger.info("%s %.2fms %s", event["name"], event["ms"], attrs)
+
+
+class JsonFileSink:
+    """Appends each span as a JSON line to path."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class MemorySink:
+    """Keeps the last maxlen spans for the in-app debug panel."""
+
+    def __init__(self, maxlen: int = 500):
+        self.events = deque(maxlen=maxlen)
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+def configure(sinks, quota_per_minute: int = DEFAULT_QUOTA_PER_MINUTE):
+    """Send spans to sinks (a list); an empty list turns instrumentation off."""
+    global _enabled
+    with _lock:
+        _sinks[:] = list(sinks)
+        _quota["per_minute"] = quota_per_minute
+        _enabled = bool(_sinks)
+
+
+def configure_from_settings(kinds: str, json_path: str = None, quota_per_minute: int = DEFAULT_QUOTA_PER_MINUTE):
+    """configure() from a comma-separated list of "log", "json" and "panel" ("" or "off" disables)."""
+    sinks = []
+    for kind in (k.strip().lower() for k in (kinds or "").split(",")):
+        if kind == "log":
+            sinks.append(LogSink())
+        elif kind == "json":
+            sinks.append(JsonFileSink(json_path or "expense_tracker_perf.jsonl"))
+        elif kind == "panel":
+            sinks.append(MemorySink())
+    configure(sinks, quota_per_minute)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def memory_sink():
+    """The configured MemorySink, or None."""
+    return next((s for s in _sinks if isinstance(s, MemorySink)), None)
+
+
+# --- Spans ---
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start", "parent")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self.start) * 1000
+        _local.stack.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _record(self.name, ms, self.parent, self.attrs)
+        return False
+
+
+def span(name: str, **attrs):
+    """Context manager timing the enclosed block as name (a no-op when disabled)."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def _record(name, ms, parent, attrs):
+    event = {"type": "span", "name": name, "ms": round(ms, 3), "parent": parent,
+             "thread": threading.current_thread().name, "at": time.time(), **attrs}
+    with _lock:
+        stats = _span_stats.get(name)
+        if stats is None:
+            stats = _span_stats[name] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        stats["count"] += 1
+        stats["total_ms"] += ms
+        stats["max_ms"] = max(stats["max_ms"], ms)
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.emit(event)
+        except Exception:
+            pass  # a broken sink must never break the app
+
+
+# --- Counters ---
+
+
+def count(name: str, n: int = 1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def count_request():
+    """Count one Sheets API request against the per-minute quota."""
+    if not _enabled:
+        return
+    now = time.time()
+    with _lock:
+        _counters["sheets.requests"] = _counters.get("sheets.requests", 0) + 1
+        _requests.append(now)
+        while _requests and _requests[0] < now - 60:
+            _requests.popleft()
+
+
+def summary():
+    """Counters, per-span aggregates and Sheets requests in the last minute against quota."""
+    now = time.time()
+    with _lock:
+        while _requests and _requests[0] < now - 60:
+            _requests.popleft()
+        spans = {
+            name: dict(s, mean_ms=round(s["total_ms"] / s["count"], 3), total_ms=round(s["total_ms"], 3),
+                       max_ms=round(s["max_ms"], 3))
+            for name, s in sorted(_span_stats.items())
+        }
+        return {
+            "enabled": _enabled,
+            "counters": dict(sorted(_counters.items())),
+            "spans": spans,
+            "requests_last_minute": len(_requests),
+            "quota_per_minute": _quota["per_minute"],
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _span_stats.clear()
+        _requests.clear()
+        for sink in _sinks:
+            if isinstance(sink, MemorySink):
+                sink.events.clear()
+
+
+# --- Worksheet wrapper ---
+
+
+def _cells_size(values):
+    """Rough payload size in bytes of a list of rows (or a list of row lists)."""
+    total = 0
+    for row in values or ():
+        if isinstance(row, list):
+            for cell in row:
+                total += _cells_size(cell) if isinstance(cell, list) else len(str(cell))
+        else:
+            total += len(str(row))
+    return total
+
+
+class InstrumentedWorksheet:
+    """Wraps a gspread Worksheet: each API method call is a span and a counted request."""
+
+    _READS = ("get_all_values", "get", "batch_get", "col_values")
+    _WRITES = ("append_row", "append_rows", "update_cell", "delete_rows")
+
+    def __init__(self, ws):
+        self._ws = ws
+
+    def __getattr__(self, name):
+        attr = getattr(self._ws, name)
+        if name not in self._READS and name not in self._WRITES or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            count_request()
+            with span(f"sheets.{name}", tab=self._ws.title) as s:
+                result = attr(*args, **kwargs)
+                if name in self._READS:
+                    rows = sum(len(r) for r in result) if name == "batch_get" else len(result)
+                    size = _cells_size(result)
+                    s.set(rows=rows, bytes=size)
+                    count("sheets.rows_read", rows)
+                    count("sheets.bytes_read", size)
+                else:
+                    sent = args[0] if args else kwargs.get("values") or kwargs.get("rows") or []
+                    rows = len(sent) if name == "append_rows" else 1
+                    s.set(rows=rows)
+                    count("sheets.rows_written", rows)
+            return result
+
+        return call
+
+
+def wrap_worksheet(ws):
+    """ws wrapped for accounting when instrumentation is on, else ws itself."""
+    return InstrumentedWorksheet(ws) if _enabled else ws
@@ -0,0 +1,516 @@
+"""SQLite mirror of the Expenses and Users tabs.
+
+The Google Sheet stays authoritative: rows only get here by being read back from
+the sheet. sheets_helper keeps the mirror in sync (appended rows incrementally,
+the whole tab on a full resync) and serves reads from it.
+
+Alongside the raw expenses the mirror keeps rollups: amount sums and row
+counts per (user, day, category, payment mode), and a version per user, both
+updated in the same transaction as every change to the expenses table. The
+versions live in the file, so every process sharing it sees rows any one of
+them synced.
+
+The database runs in WAL mode. Reads take a connection from a small pool and
+run alongside each other and alongside a write; writes are serialized.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+SCHEMA_VERSION = 4
+
+# Index changes are made in place rather than by bumping SCHEMA_VERSION, which
+# would empty every mirror and lock out every SqliteStore file: opening a file
+# that still has expenses_user_day (user_id, day) swaps it for
+# expenses_user_day_time.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    tab TEXT PRIMARY KEY,
+    row_count INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    full_synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_probes (
+    tab TEXT PRIMARY KEY,
+    last_row TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS expenses (
+    row INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    day INTEGER,
+    ts INTEGER,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    payment_mode TEXT NOT NULL,
+    notes TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+DROP INDEX IF EXISTS expenses_user_day;
+CREATE INDEX IF NOT EXISTS expenses_user_day_time ON expenses (user_id, day, time);
+CREATE INDEX IF NOT EXISTS expenses_user_created ON expenses (user_id, created_at);
+CREATE TABLE IF NOT EXISTS rollups (
+    user_id TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    payment_mode TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, day, category, payment_mode)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS users (
+    row INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE TABLE IF NOT EXISTS user_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+_DATA_TABLES = ("expenses", "rollups", "users", "user_versions", "sync_state", "sync_probes")
+
+# ORDER BY clauses for expense_page, by sort name and direction. sheets_helper
+# sorts rows not yet mirrored with the same keys. expenses_user_day_time entries
+# are in (day, time, row) order within a user, so date-sorted pages are read
+# straight off the index instead of sorting the user's whole range first.
+ORDER_BY = {
+    ("date", False): "day, time, row",
+    ("date", True): "day DESC, time DESC, row DESC",
+    ("amount", False): "amount, row",
+    ("amount", True): "amount DESC, row DESC",
+    ("category", False): "category, day, time, row",
+    ("category", True): "category DESC, day DESC, time DESC, row DESC",
+}
+
+
+class LocalMirror:
+    """File-backed copy of the sheet's rows, shared by all script threads.
+
+    Up to pool_size connections are kept open for reuse; more are opened (and
+    closed after use) when more threads read at once.
+    """
+
+    # A mirror only holds copies, so one left by another sheet or an older
+    # layout is emptied rather than trusted.
+    _disposable = True
+
+    def __init__(self, path: str, sheet_id: str, pool_size: int = 4):
+        self.path = path
+        self._write_lock = threading.RLock()
+        self._pool = queue.LifoQueue(maxsize=max(pool_size, 1))
+        with self._writing() as conn:
+            self._create_schema(conn)
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            if meta and (meta.get("sheet_id") != sheet_id or meta.get("schema") != str(SCHEMA_VERSION)):
+                if not self._disposable:
+                    raise RuntimeError(
+                        f"{path} holds data for {meta.get('sheet_id')!r} at schema {meta.get('schema')}, "
+                        f"not {sheet_id!r} at schema {SCHEMA_VERSION}"
+                    )
+                # Different sheet or older layout: start from an empty mirror.
+                for table in _DATA_TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self._create_schema(conn)
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('sheet_id', ?)", (sheet_id,))
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(SCHEMA_VERSION),))
+
+    def _create_schema(self, conn):
+        # Statement by statement: executescript() would commit the open transaction.
+        for statement in _SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @contextmanager
+    def _reading(self):
+        """A pooled connection for the duration of the block."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def _writing(self):
+        """A pooled connection inside a write transaction, committed when the block exits cleanly."""
+        with self._write_lock, self._reading() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        with self._write_lock:
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    return
+
+    # --- Sync bookkeeping ---
+    # sheets_helper reads the sheet without holding anything, so an incremental
+    # change passes expect, the sync_state it started from. It is applied only
+    # if the tab's rows and checksum are still those (no other thread or
+    # process synced the tab meanwhile); the method then returns True.
+
+    def sync_state(self, tab: str):
+        """Return {"row_count", "synced_at", "full_synced_at", "last_row"} or None if never synced.
+
+        last_row is the checksum sheets_helper took of the tab's last synced row, or None.
+        """
+        with self._reading() as conn:
+            return self._sync_state(conn, tab)
+
+    @staticmethod
+    def _sync_state(conn, tab):
+        row = conn.execute(
+            "SELECT row_count, synced_at, full_synced_at, last_row FROM sync_state "
+            "LEFT JOIN sync_probes USING (tab) WHERE tab = ?", (tab,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def _state_moved(self, conn, tab, expect) -> bool:
+        if expect is None:
+            return False
+        state = self._sync_state(conn, tab)
+        keys = ("row_count", "full_synced_at", "last_row")
+        return state is None or any(state[k] != expect[k] for k in keys)
+
+    def mark_stale(self, tab: str):
+        """Force the next read of tab to sync, e.g. after we appended to it."""
+        with self._writing() as conn:
+            conn.execute("UPDATE sync_state SET synced_at = 0 WHERE tab = ?", (tab,))
+
+    def touch(self, tab: str, last_row=None, expect=None) -> bool:
+        """Record that tab was found unchanged (and, if given, its last row's checksum)."""
+        with self._writing() as conn:
+            if self._state_moved(conn, tab, expect):
+                return False
+            conn.execute("UPDATE sync_state SET synced_at = ? WHERE tab = ?", (time.time(), tab))
+            if last_row is not None:
+                conn.execute("INSERT OR REPLACE INTO sync_probes VALUES (?, ?)", (tab, last_row))
+        return True
+
+    @staticmethod
+    def _set_state(conn, tab, row_count, full, last_row=None):
+        now = time.time()
+        if last_row is None:
+            conn.execute("DELETE FROM sync_probes WHERE tab = ?", (tab,))
+        else:
+            conn.execute("INSERT OR REPLACE INTO sync_probes VALUES (?, ?)", (tab, last_row))
+        if full:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)", (tab, row_count, now, now)
+            )
+        else:
+            conn.execute(
+                "UPDATE sync_state SET row_count = ?, synced_at = ? WHERE tab = ?", (row_count, now, tab)
+            )
+
+    # --- Expenses ---
+
+    def replace_expenses(self, expenses, row_count: int, tab: str = "expenses", id_range=None, last_row=None):
+        """Replace mirrored expenses (full resync of one tab). row_count counts data rows.
+
+        With id_range (first, end) only expenses with ids in it are replaced, for
+        sheets whose expenses are split over several tabs; otherwise all are.
+        """
+        expenses = list(expenses)
+        with self._writing() as conn:
+            if id_range is None:
+                old_users = [r[0] for r in conn.execute("SELECT DISTINCT user_id FROM expenses")]
+                conn.execute("DELETE FROM expenses")
+                self._insert_expenses(conn, expenses)
+                self._rebuild_rollups(conn)
+            else:
+                old = conn.execute("SELECT * FROM expenses WHERE row >= ? AND row < ?", id_range).fetchall()
+                old_users = [r["user_id"] for r in old]
+                self._delete_expenses(conn, old)
+                self._insert_expenses(conn, expenses)
+                self._add_to_rollups(conn, expenses, sign=1)
+            # Any of these users' rows may have changed.
+            self._bump_versions(conn, old_users + [e.user_id for e, _ in expenses])
+            self._set_state(conn, tab, row_count, full=True, last_row=last_row)
+
+    def append_expenses(self, expenses, row_count: int, tab: str = "expenses", last_row=None, expect=None) -> bool:
+        """Add rows appended to the sheet since the last sync."""
+        expenses = list(expenses)
+        with self._writing() as conn:
+            if self._state_moved(conn, tab, expect):
+                return False
+            if expenses:
+                # Rows we already hold under these numbers are being replaced.
+                ids = {e.id for e, _ in expenses}
+                replaced = [
+                    r for r in conn.execute(
+                        "SELECT * FROM expenses WHERE row >= ? AND row <= ?", (min(ids), max(ids))
+                    ).fetchall()
+                    if r["row"] in ids
+                ]
+                self._add_to_rollups(conn, ((e, day) for day, e in _expenses_from_rows(replaced)), sign=-1)
+                self._bump_versions(conn, [r["user_id"] for r in replaced] + [e.user_id for e, _ in expenses])
+            self._insert_expenses(conn, expenses)
+            self._add_to_rollups(conn, expenses, sign=1)
+            self._set_state(conn, tab, row_count, full=False, last_row=last_row)
+        return True
+
+    def _delete_expenses(self, conn, rows):
+        self._add_to_rollups(conn, ((e, day) for day, e in _expenses_from_rows(rows)), sign=-1)
+        self._bump_versions(conn, [r["user_id"] for r in rows])
+        conn.executemany("DELETE FROM expenses WHERE row = ?", ((r["row"],) for r in rows))
+        return len(rows)
+
+    def drop_copied_legacy(self, legacy_end: int, key_prefix: str, copies=None):
+        """Delete legacy expenses (ids below legacy_end) that were copied into a month tab.
+
+        A copy has the same user and createdAt as the original, or key_prefix plus
+        the original's row number if it had none. copies lists the (user_id,
+        createdAt) of month-tab rows just synced; None checks every legacy row.
+        Returns how many were deleted.
+        """
+        with self._writing() as conn:
+            if copies is None:
+                rows = conn.execute(
+                    "SELECT * FROM expenses AS l WHERE l.row < ? AND EXISTS ("
+                    "SELECT 1 FROM expenses AS c WHERE c.user_id = l.user_id AND c.row >= ? AND c.created_at = "
+                    "CASE WHEN l.created_at = '' THEN ? || l.row ELSE l.created_at END)",
+                    (legacy_end, legacy_end, key_prefix),
+                ).fetchall()
+            else:
+                found = {}
+                for user_id, created_at in copies:
+                    if not created_at:
+                        continue
+                    suffix = created_at[len(key_prefix):] if created_at.startswith(key_prefix) else ""
+                    if suffix.isdigit():
+                        query, params = "row = ? AND user_id = ? AND created_at = ''", (int(suffix), user_id)
+                    else:
+                        query, params = "user_id = ? AND created_at = ? AND row < ?", (user_id, created_at, legacy_end)
+                    for r in conn.execute(f"SELECT * FROM expenses WHERE {query}", params):
+                        found[r["row"]] = r
+                rows = list(found.values())
+            return self._delete_expenses(conn, rows)
+
+    @staticmethod
+    def _insert_expenses(conn, expenses):
+        conn.executemany(
+            "INSERT OR REPLACE INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    e.id, e.user_id, day, e.ts, e.date, e.time, e.amount,
+                    e.category, e.payment_mode, e.notes, e.created_at,
+                )
+                for e, day in expenses
+            ),
+        )
+
+    def expenses_for(self, user_id: str, from_day: int, to_day: int):
+        """(day, expense) pairs of user_id with day in [from_day, to_day], in sheet order.
+
+        day is days since 1970-01-01; rows with an empty date carry the caller's
+        "no date" sentinel and rows whose date could not be parsed have no day,
+        so they are never returned.
+        """
+        with self._reading() as conn:
+            rows = conn.execute(
+                "SELECT * FROM expenses WHERE user_id = ? AND day >= ? AND day <= ? ORDER BY row",
+                (user_id, from_day, to_day),
+            ).fetchall()
+        return list(_expenses_from_rows(rows))
+
+    def expense_pages(self, user_id: str, from_day: int, to_day: int, page_size: int):
+        """Like expenses_for, but yields lists of at most page_size expenses.
+
+        Pages are fetched by row number as they are consumed, so no connection
+        is held while the caller works on a page.
+        """
+        after = -1
+        while True:
+            with self._reading() as conn:
+                rows = conn.execute(
+                    "SELECT * FROM expenses WHERE user_id = ? AND day >= ? AND day <= ? AND row > ? "
+                    "ORDER BY row LIMIT ?",
+                    (user_id, from_day, to_day, after, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            after = rows[-1]["row"]
+            yield [e for _, e in _expenses_from_rows(rows)]
+
+    def expense_page(self, user_id: str, from_day: int, to_day: int, order_by: str, offset: int, limit: int):
+        """(rows in range, one page of (day, expense) pairs) for user_id, sorted in SQL.
+
+        order_by is one of ORDER_BY's values.
+        """
+        where = "WHERE user_id = ? AND day >= ? AND day <= ?"
+        with self._reading() as conn:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM expenses {where}", (user_id, from_day, to_day)
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM expenses {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                (user_id, from_day, to_day, limit, offset),
+            ).fetchall()
+        return total, list(_expenses_from_rows(rows))
+
+    # --- Versions ---
+
+    @staticmethod
+    def _bump_versions(conn, user_ids):
+        conn.executemany(
+            "INSERT INTO user_versions VALUES (?, 1) ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+            ((user_id,) for user_id in set(user_ids)),
+        )
+
+    def user_version(self, user_id: str) -> int:
+        """Bumped on every change to user_id's expenses, by any process."""
+        with self._reading() as conn:
+            row = conn.execute("SELECT version FROM user_versions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    # --- Rollups ---
+
+    @staticmethod
+    def _add_to_rollups(conn, expenses, sign: int):
+        cells = {}
+        for e, day in expenses:
+            if day is None:
+                continue
+            cell = cells.setdefault((e.user_id, day, e.category, e.payment_mode), [0.0, 0])
+            cell[0] += e.amount
+            cell[1] += 1
+        conn.executemany(
+            "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, day, category, payment_mode) "
+            "DO UPDATE SET total = total + excluded.total, count = count + excluded.count",
+            ((*key, sign * total, sign * count) for key, (total, count) in cells.items()),
+        )
+        if sign < 0:
+            conn.execute("DELETE FROM rollups WHERE count <= 0")
+
+    @staticmethod
+    def _rebuild_rollups(conn):
+        conn.execute("DELETE FROM rollups")
+        conn.execute(
+            "INSERT INTO rollups "
+            "SELECT user_id, day, category, payment_mode, SUM(amount), COUNT(*) FROM expenses "
+            "WHERE day IS NOT NULL GROUP BY user_id, day, category, payment_mode"
+        )
+
+    def rebuild_rollups(self):
+        """Recompute every rollup from the mirrored expenses."""
+        with self._writing() as conn:
+            self._rebuild_rollups(conn)
+
+    def rollups_for(self, user_id: str, from_day: int, to_day: int):
+        """(day, category, payment mode, total, count) for user_id with day in [from_day, to_day], by day."""
+        with self._reading() as conn:
+            rows = conn.execute(
+                "SELECT day, category, payment_mode, total, count FROM rollups "
+                "WHERE user_id = ? AND day >= ? AND day <= ? ORDER BY day",
+                (user_id, from_day, to_day),
+            ).fetchall()
+        return [tuple(r) for r in rows]
+
+    def day_bounds(self, user_id: str, after_day: int):
+        """(first, last) day of user_id's expenses dated after after_day, or None if there are none."""
+        with self._reading() as conn:
+            row = conn.execute(
+                "SELECT MIN(day), MAX(day) FROM expenses WHERE user_id = ? AND day > ?", (user_id, after_day)
+            ).fetchone()
+        return (row[0], row[1]) if row[0] is not None else None
+
+    def written_created_at(self, user_id: str, from_day: int, to_day: int, created_at):
+        """The subset of created_at values already mirrored for user_id in [from_day, to_day]."""
+        created_at = list(created_at)
+        if not created_at:
+            return set()
+        marks = ", ".join("?" * len(created_at))
+        with self._reading() as conn:
+            rows = conn.execute(
+                f"SELECT created_at FROM expenses WHERE user_id = ? AND day >= ? AND day <= ? "
+                f"AND created_at IN ({marks})",
+                (user_id, from_day, to_day, *created_at),
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    # --- Users ---
+
+    def replace_users(self, users, row_count: int, last_row=None):
+        with self._writing() as conn:
+            conn.execute("DELETE FROM users")
+            self._insert_users(conn, users)
+            self._set_state(conn, "users", row_count, full=True, last_row=last_row)
+
+    def append_users(self, users, row_count: int, last_row=None, expect=None) -> bool:
+        with self._writing() as conn:
+            if self._state_moved(conn, "users", expect):
+                return False
+            self._insert_users(conn, users)
+            self._set_state(conn, "users", row_count, full=False, last_row=last_row)
+        return True
+
+    @staticmethod
+    def _insert_users(conn, users):
+        conn.executemany(
+            "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?)",
+            ((row, u["userId"], u["email"], u["passwordHash"], u["createdAt"]) for row, u in users),
+        )
+
+    def set_password_hash(self, user_id: str, password_hash: str) -> bool:
+        """Store user_id's new hash; False if there is no such user."""
+        with self._writing() as conn:
+            cur = conn.execute("UPDATE users SET password_hash = ? WHERE user_id = ?", (password_hash, user_id))
+        return cur.rowcount > 0
+
+    def all_users(self):
+        with self._reading() as conn:
+            rows = conn.execute("SELECT * FROM users ORDER BY row").fetchall()
+        return [_user_from_row(r) for r in rows]
+
+
+def _expenses_from_rows(rows):
+    """(day, Expense) per expenses row."""
+    from expense_columns import make_expense  # loads numpy; not needed to import this module
+
+    for r in rows:
+        yield r["day"], make_expense(
+            r["row"], r["user_id"], r["date"], r["time"], r["ts"], r["amount"],
+            r["category"], r["payment_mode"], r["notes"], r["created_at"],
+        )
+
+
+def _user_from_row(r):
+    return {
+        "userId": r["user_id"],
+        "email": r["email"],
+        "passwordHash": r["password_hash"],
+        "createdAt": r["created_at"],
+    }
@@ -0,0 +1,78 @@
+"""Maintenance commands for the Sheets backend.
+
+Usage:
+    python manage.py rebuild-rollups
+    python manage.py sync-mirror [--full]
+    python manage.py shard-expenses [--batch-rows N] [--state PATH] [--prune]
+    python manage.py copy-to-sqlite [--path FILE]
+
+Settings are read the same way as the app (.streamlit/secrets.toml, then
+environment variables), so run it from this directory.
+"""
+import argparse
+import sys
+
+import sheets_helper
+
+
+def cmd_rebuild_rollups(args):
+    sheets_helper.rebuild_rollups()
+    print("Rollups rebuilt from the Expenses tab.")
+
+
+def cmd_sync_mirror(args):
+    sheets_helper.sync_mirror(full=args.full)
+    print("Mirror synced" + (" (full)." if args.full else "."))
+
+
+def cmd_shard_expenses(args):
+    if args.prune:
+        deleted = sheets_helper.prune_legacy_expenses(args.state)
+        print(f"Deleted {deleted} copied rows from the Expenses tab.")
+        return
+    progress = None
+    for progress in sheets_helper.migrate_legacy_expenses(args.batch_rows, args.state):
+        print(f"Up to row {progress['next_row'] - 1}: {progress['copied']} copied, "
+              f"{progress['already_copied']} already copied, {progress['undated']} left (no date)")
+    print("Done. Run again with --prune to delete the copied rows from the Expenses tab.")
+
+
+def cmd_copy_to_sqlite(args):
+    counts = sheets_helper.copy_sheet_to_sqlite(args.path)
+    print(f"Copied {counts['users']} users and {counts['expenses']} expenses. "
+          "Set STORAGE_BACKEND=sqlite to switch the app over.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rebuild-rollups", help="recompute the rollups from the raw Expenses tab")
+    p.set_defaults(func=cmd_rebuild_rollups)
+
+    p = sub.add_parser("sync-mirror", help="bring the local mirror up to date with the sheet")
+    p.add_argument("--full", action="store_true", help="re-read every row, not just appended ones")
+    p.set_defaults(func=cmd_sync_mirror)
+
+    p = sub.add_parser("shard-expenses", help="copy the Expenses tab into month tabs (resumable)")
+    p.add_argument("--batch-rows", type=int, default=sheets_helper.DEFAULT_SHARD_MIGRATION_BATCH_ROWS,
+                   help="legacy rows read per batch")
+    p.add_argument("--state", help="progress file (default: in the temp directory)")
+    p.add_argument("--prune", action="store_true", help="after a finished run, delete the copied legacy rows")
+    p.set_defaults(func=cmd_shard_expenses)
+
+    p = sub.add_parser("copy-to-sqlite", help="copy the sheet into a new SQLite store")
+    p.add_argument("--path", help="database file (default: SQLITE_DB_PATH)")
+    p.set_defaults(func=cmd_copy_to_sqlite)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
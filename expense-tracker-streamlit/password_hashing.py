@@ -0,0 +1,166 @@
+"""bcrypt hashing and verification off the Streamlit script thread.
+
+Work runs on a small process pool (or a thread pool where processes are not
+available) so a burst of logins doesn't stall other sessions' reruns. The pool
+has a bounded queue, failed logins are throttled per email, and hashes made
+with a different cost than configured are flagged for rehashing.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+
+
+class PasswordBusyError(RuntimeError):
+    """Too many password checks are queued; the caller should try again shortly."""
+
+
+class TooManyAttemptsError(RuntimeError):
+    """Too many failed logins for this email recently."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many attempts. Try again in {max(1, int(retry_after))} seconds")
+        self.retry_after = retry_after
+
+
+# --- Pool workers (top-level so the process pool can pickle them) ---
+
+
+def _hash_worker(password: bytes, rounds: int, submitted_at: float):
+    started = time.time()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode()
+    return hashed, started - submitted_at, time.time() - started
+
+
+def _check_worker(password: bytes, pw_hash: bytes, submitted_at: float):
+    started = time.time()
+    ok = bcrypt.checkpw(password, pw_hash)
+    return ok, started - submitted_at, time.time() - started
+
+
+def hash_cost(pw_hash: str):
+    """The cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None if it isn't one."""
+    parts = (pw_hash or "").split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = 12, workers: int = 2, max_queue: int = 32,
+                 max_attempts: int = 5, attempt_window: float = 300.0, use_processes: bool = True):
+        self.rounds = rounds
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.attempt_window = attempt_window
+        self._executor = None
+        if use_processes:
+            try:
+                import multiprocessing
+
+                # spawn: forking a process that runs Streamlit's threads is unsafe.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            except (ImportError, NotImplementedError, OSError):
+                self._executor = None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._failures = {}  # email -> deque of failure times
+        self._stats = {
+            "hashes": 0, "checks": 0, "busy": 0, "throttled": 0, "rehash_needed": 0,
+            "hash_seconds": 0.0, "max_hash_seconds": 0.0, "queue_seconds": 0.0, "max_queue_seconds": 0.0,
+        }
+
+    # --- Queueing ---
+
+    def _submit(self, kind: str, fn, *args):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._stats["busy"] += 1
+                raise PasswordBusyError("The server is busy signing people in. Please try again in a moment")
+            self._queued += 1
+        try:
+            future = self._executor.submit(fn, *args, time.time())
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+        with self._lock:
+            self._stats[kind] += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._queued -= 1
+            if future.cancelled() or future.exception() is not None:
+                return
+            _, waited, took = future.result()
+            self._stats["queue_seconds"] += waited
+            self._stats["max_queue_seconds"] = max(self._stats["max_queue_seconds"], waited)
+            self._stats["hash_seconds"] += took
+            self._stats["max_hash_seconds"] = max(self._stats["max_hash_seconds"], took)
+
+    # --- Throttling ---
+
+    def _check_throttle(self, email: str):
+        now = time.time()
+        with self._lock:
+            failures = self._failures.get(email)
+            if not failures:
+                return
+            while failures and failures[0] < now - self.attempt_window:
+                failures.popleft()
+            if not failures:
+                del self._failures[email]
+            elif len(failures) >= self.max_attempts:
+                self._stats["throttled"] += 1
+                raise TooManyAttemptsError(failures[0] + self.attempt_window - now)
+
+    def _record(self, email: str, ok: bool):
+        with self._lock:
+            if ok:
+                self._failures.pop(email, None)
+            else:
+                self._failures.setdefault(email, deque()).append(time.time())
+
+    # --- Public API ---
+
+    def hash_async(self, password: str):
+        """Future whose result is (hash, queue wait, hash time); raises PasswordBusyError if the queue is full."""
+        return self._submit("hashes", _hash_worker, password.encode(), self.rounds)
+
+    def hash(self, password: str) -> str:
+        return self.hash_async(password).result()[0]
+
+    def verify(self, email: str, password: str, pw_hash: str):
+        """(matches, needs_rehash) for password against pw_hash.
+
+        Raises TooManyAttemptsError after max_attempts failures for email within
+        attempt_window seconds, and PasswordBusyError if the queue is full.
+        """
+        email = (email or "").strip().lower()
+        self._check_throttle(email)
+        ok = self._submit("checks", _check_worker, password.encode(), pw_hash.encode()).result()[0]
+        self._record(email, ok)
+        needs_rehash = ok and hash_cost(pw_hash) != self.rounds
+        if needs_rehash:
+            with self._lock:
+                self._stats["rehash_needed"] += 1
+        return ok, needs_rehash
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats, queued=self._queued, throttled_emails=len(self._failures))
+        done = s["hashes"] + s["checks"]
+        s["mean_hash_seconds"] = round(s["hash_seconds"] / done, 4) if done else 0.0
+        s["mean_queue_seconds"] = round(s["queue_seconds"] / done, 4) if done else 0.0
+        return s
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,113 @@
+"""A memory-bounded LRU cache for things the app renders: aggregated series
+and Plotly figures.
+
+Keys are tuples whose first item is a kind ("dashboard", "view", ...) used for
+per-kind hit rates. Callers put whatever identifies the inputs in the rest of
+the key, typically (user, range, data version), so entries are never
+invalidated; they just stop being asked for and age out.
+
+    figures = cache.get_or_build(("dashboard", user_id, day, version), build)
+"""
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+def estimate_size(value) -> int:
+    """Rough size in bytes of value, following mappings, lists, tuples and Plotly figures."""
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        v = stack.pop()
+        if id(v) in seen:
+            continue
+        seen.add(id(v))
+        if hasattr(v, "to_plotly_json"):
+            v = v.to_plotly_json()
+        total += sys.getsizeof(v)
+        if isinstance(v, Mapping):
+            stack.extend(v.keys())
+            stack.extend(v.values())
+        elif isinstance(v, (list, tuple, set, frozenset)):
+            stack.extend(v)
+    return total
+
+
+class RenderCache:
+    """LRU over (key -> value), evicting least recently used entries past max_bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._kinds = {}  # kind -> {"hits", "misses"}
+        self._evictions = 0
+
+    def _kind_stats(self, key):
+        kind = key[0] if isinstance(key, tuple) and key else key
+        stats = self._kinds.get(kind)
+        if stats is None:
+            stats = self._kinds[kind] = {"hits": 0, "misses": 0}
+        return stats
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            stats = self._kind_stats(key)
+            if entry is None:
+                stats["misses"] += 1
+                return default
+            stats["hits"] += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        """Store value; values bigger than max_bytes on their own are not kept."""
+        size = estimate_size(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._evictions += 1
+
+    def get_or_build(self, key, build):
+        """Cached value for key, else build() stored under key.
+
+        Two sessions missing the same key at once both build; the later put wins.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Entries, bytes used, evictions and hits/misses/hit rate per kind."""
+        with self._lock:
+            kinds = {}
+            for kind, s in sorted(self._kinds.items(), key=lambda kv: str(kv[0])):
+                lookups = s["hits"] + s["misses"]
+                kinds[kind] = dict(s, hit_rate=round(s["hits"] / lookups, 3) if lookups else 0.0)
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "kinds": kinds,
+            }
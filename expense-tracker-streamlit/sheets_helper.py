@@ -1,28 +1,182 @@
 """Google Sheets helper - reads/writes Expenses and Users using same schema as Node app."""
+import atexit
+import hashlib
+import importlib
 import os
 import json
+import re
 import secrets as _secrets_mod  # renamed to avoid conflict with st.secrets
-from datetime import datetime
+import tempfile
+import threading
+import time as _time
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from itertools import count, islice, zip_longest
+from datetime import date as _date, datetime, timedelta, timezone
 from typing import Optional
 
-import gspread
-from google.oauth2.service_account import Credentials
+from expense_export import parquet_available, write_csv, write_parquet  # noqa: F401
+import instrumentation
+from instrumentation import span, wrap_worksheet
+from local_mirror import ORDER_BY, LocalMirror
+from password_hashing import PasswordBusyError, PasswordHasher, TooManyAttemptsError  # noqa: F401
+from render_cache import RenderCache
+import startup
+from sqlite_store import SqliteStorage, SqliteStore
+from statement_import import StatementFormatError, read_statement, to_expenses  # noqa: F401
+from storage import Storage, day_range
+from throttle import SingleFlight, TokenBucket, backoff_delays
+from write_queue import JournalBusyError, WriteBehindQueue
 
+# expense_columns and analytics load numpy (most of this module's import time),
+# so the functions that need them import them. Their parsing helpers stay
+# reachable as sheets_helper.<name>, loaded on first access.
+_EXPENSE_COLUMNS_EXPORTS = (
+    "NO_DATE", "day_number", "day_string", "parse_days", "parse_expense_rows", "parse_sheet_date", "parse_sheet_time",
+)
 
-def _get_sheet_id():
+
+def __getattr__(name):
+    if name in _EXPENSE_COLUMNS_EXPORTS:
+        import expense_columns
+
+        return getattr(expense_columns, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_setting(name: str, default=None):
     # Try Streamlit secrets first
     try:
         import streamlit as st
-        return st.secrets["SHEET_ID"]
+        return st.secrets[name]
     except Exception:
         pass
     # Fall back to env var
-    return os.environ.get("SHEET_ID") or None
+    return os.environ.get(name) or default
+
+
+def _get_bool_setting(name: str, default: bool) -> bool:
+    v = _get_setting(name)
+    if v is None:
+        return default
+    if isinstance(v, bool):
+        return v
+    return str(v).strip().lower() not in ("0", "false", "no", "off", "")
+
+
+def _get_sheet_id():
+    return _get_setting("SHEET_ID")
+
+
 EXPENSES_TAB = "Expenses"
 USERS_TAB = "Users"
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
+# Local mirror (see local_mirror.py). Reads are served from it once it has been
+# synced within MIRROR_MAX_STALENESS_SECONDS; a full resync runs at least every
+# MIRROR_FULL_RESYNC_SECONDS to pick up edits and deletions in the sheet.
+DEFAULT_MIRROR_MAX_STALENESS_SECONDS = 15
+DEFAULT_MIRROR_FULL_RESYNC_SECONDS = 3600
+
+# In-process email -> user index used by login/signup (see find_user_by_email).
+DEFAULT_USER_CACHE_TTL_SECONDS = 60
+DEFAULT_USER_NEGATIVE_CACHE_SIZE = 1024
+DEFAULT_USER_NEGATIVE_TTL_SECONDS = 30
+
+# Write-behind appends (see write_queue.py). Without WRITE_JOURNAL_PATH each
+# process takes the first journal in the temp dir no other process holds, out
+# of WRITE_JOURNAL_SLOTS per sheet. A row whose append fails WRITE_MAX_ATTEMPTS
+# times (about 45 minutes of failed flushes at the 60 s backoff cap), or is
+# rejected with anything but a 429 or 5xx, is moved to <journal>.dead.
+DEFAULT_WRITE_BATCH_SIZE = 50
+DEFAULT_WRITE_FLUSH_SECONDS = 2.0
+DEFAULT_WRITE_MAX_ATTEMPTS = 50
+WRITE_JOURNAL_SLOTS = 16
+
+# Rows per append_rows call when importing statements.
+DEFAULT_IMPORT_CHUNK_ROWS = 1000
+
+# Rows read per page when exporting.
+DEFAULT_EXPORT_PAGE_ROWS = 5000
+
+# Legacy rows read per batch by `manage.py shard-expenses`.
+DEFAULT_SHARD_MIGRATION_BATCH_ROWS = 2000
+
+# Rows per page of the expense list, and the orders it can be sorted in.
+EXPENSE_PAGE_SIZE = 50
+EXPENSE_SORTS = ("date", "amount", "category")
+
+# Login prefetch: a thread pool shared by all sessions loads a user's dashboard
+# data while the post-login rerun is still starting; unused results expire. The
+# dashboard waits at most PREFETCH_WAIT_SECONDS for one still running.
+DEFAULT_PREFETCH_WORKERS = 4
+DEFAULT_PREFETCH_MAX_PENDING = 16
+DEFAULT_PREFETCH_TTL_SECONDS = 30
+DEFAULT_PREFETCH_WAIT_SECONDS = 1.5
+
+# Password hashing (see password_hashing.py): bcrypt cost for new hashes (older
+# hashes are upgraded on login), worker processes, queue bound and the number of
+# failed logins per email allowed within PASSWORD_ATTEMPT_WINDOW_SECONDS.
+DEFAULT_BCRYPT_ROUNDS = 12
+DEFAULT_PASSWORD_WORKERS = 2
+DEFAULT_PASSWORD_MAX_QUEUE = 32
+DEFAULT_PASSWORD_MAX_ATTEMPTS = 5
+DEFAULT_PASSWORD_ATTEMPT_WINDOW_SECONDS = 300
+
+# Storage backend: "sheets" (the Google Sheet) or "sqlite", which keeps
+# everything in the SQLITE_DB_PATH file instead (see sqlite_store.py). The store
+# and the mirror each keep up to SQLITE_POOL_SIZE connections open.
+DEFAULT_STORAGE_BACKEND = "sheets"
+DEFAULT_SQLITE_DB_PATH = "expense_tracker.sqlite3"
+DEFAULT_SQLITE_POOL_SIZE = 4
+
+# Sharding: EXPENSES_SHARDING=month writes expenses to one tab per month
+# ("Expenses YYYY-MM") and reads only the tabs overlapping the requested dates.
+# Empty (the default) keeps everything in the Expenses tab.
+DEFAULT_EXPENSES_SHARDING = ""
+
+# Startup (see startup.py): STARTUP_WARMUP loads the Sheets client and the
+# modules later pages need on a background thread once the first page is up;
+# STARTUP_PROFILE logs and shows import and first-paint times.
+DEFAULT_STARTUP_WARMUP = True
+DEFAULT_STARTUP_PROFILE = False
+
+# Render cache (see render_cache.py): memory budget for cached dashboard/view
+# aggregates and figures, shared by all sessions.
+DEFAULT_RENDER_CACHE_MAX_MB = 64
+
+# Request shaping (see throttle.py). All API calls share one token bucket sized
+# to the per-minute quota; 429s, 5xx and connection errors are retried with
+# jittered exponential backoff before SheetsUnavailableError is raised.
+DEFAULT_SHEETS_QUOTA_PER_MINUTE = instrumentation.DEFAULT_QUOTA_PER_MINUTE
+DEFAULT_SHEETS_BURST = 10
+DEFAULT_SHEETS_QUOTA_WAIT_SECONDS = 30
+DEFAULT_SHEETS_MAX_ATTEMPTS = 5
+
+# Spans and counters (see instrumentation.py): INSTRUMENTATION is a comma-separated
+# list of sinks ("log", "json", "panel"); empty turns it off. The panel and the
+# startup timings cover every session, so they are only shown to the
+# comma-separated emails in DEBUG_PANEL_EMAILS (empty: nobody).
+DEFAULT_DEBUG_PANEL_EMAILS = ""
+instrumentation.configure_from_settings(
+    _get_setting("INSTRUMENTATION", ""),
+    json_path=_get_setting("INSTRUMENTATION_JSON_PATH"),
+    quota_per_minute=int(_get_setting("SHEETS_QUOTA_PER_MINUTE", DEFAULT_SHEETS_QUOTA_PER_MINUTE)),
+)
+startup.configure(_get_bool_setting("STARTUP_PROFILE", DEFAULT_STARTUP_PROFILE))
+
+
+def can_view_debug_panel(email: Optional[str]) -> bool:
+    """Whether email is listed in DEBUG_PANEL_EMAILS."""
+    allowed = str(_get_setting("DEBUG_PANEL_EMAILS", DEFAULT_DEBUG_PANEL_EMAILS) or "")
+    norm = (email or "").strip().lower()
+    return bool(norm) and norm in {e.strip().lower() for e in allowed.split(",")}
+
+# IST = UTC+5:30; all "today"/"this week" logic is relative to it.
+IST = timezone(timedelta(hours=5, minutes=30))
+
 CATEGORIES = ["Food", "Transport", "Shopping", "Bills", "Entertainment", "Health", "Other"]
 PAYMENT_MODES = ["Cash", "UPI", "Card", "Net Banking", "Other"]
 
@@ -49,6 +203,8 @@ def _get_credentials():
                 creds_dict = json.loads(json_str)
             except json.JSONDecodeError:
                 creds_dict = None
+    from google.oauth2.service_account import Credentials
+
     if creds_dict:
         return Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
     path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
@@ -57,183 +213,2075 @@ def _get_credentials():
     raise ValueError("Set GOOGLE_APPLICATION_CREDENTIALS_JSON or GOOGLE_APPLICATION_CREDENTIALS")
 
 
-def get_sheet(sheet_name: str):
+# --- Client pool ---
+# One authorized client, spreadsheet and set of worksheet handles per process.
+# Streamlit runs each session's script on its own thread, so all access goes
+# through _pool_lock. gspread and google-auth are imported here, on first use:
+# they are a large part of a cold start, and the login page renders without
+# them (warm_up() loads them in the background once it has).
+
+_AUTH_ERROR_CODES = (401, 403)
+_RETRY_ERROR_CODES = (429, 500, 502, 503, 504)
+
+
+class SheetsUnavailableError(RuntimeError):
+    """Google Sheets could not be reached: quota exhausted or repeated server/network errors."""
+
+_pool_lock = threading.RLock()
+_pool = {"creds": None, "client": None, "spreadsheet": None, "sheet_id": None, "worksheets": {}}
+_pool_stats = {"hits": 0, "misses": 0, "authorizations": 0, "token_refreshes": 0, "rebuilds": 0, "retries": 0}
+
+
+def _refresh_if_expired(creds):
+    """Refresh the access token in place once it has expired."""
+    if creds is not None and creds.token and creds.expired:
+        from google.auth.transport.requests import Request
+
+        with span("sheets.token_refresh"):
+            creds.refresh(Request())
+        _pool_stats["token_refreshes"] += 1
+
+
+def _get_spreadsheet():
+    """Return the pooled spreadsheet, authorizing on first use."""
     sheet_id = _get_sheet_id()
     if not sheet_id:
         raise ValueError("SHEET_ID not set (use env var or .streamlit/secrets.toml)")
-    creds = _get_credentials()
-    gc = gspread.authorize(creds)
-    spreadsheet = gc.open_by_key(sheet_id)
-    return spreadsheet.worksheet(sheet_name)
+    with _pool_lock:
+        if _pool["spreadsheet"] is not None and _pool["sheet_id"] == sheet_id:
+            _refresh_if_expired(_pool["creds"])
+            return _pool["spreadsheet"]
+        with span("sheets.authorize"):
+            import gspread
 
+            creds = _get_credentials()
+            gc = gspread.authorize(creds)
+            instrumentation.count_request()
+            spreadsheet = gc.open_by_key(sheet_id)
+        _pool.update(creds=creds, client=gc, spreadsheet=spreadsheet, sheet_id=sheet_id, worksheets={})
+        _pool_stats["authorizations"] += 1
+        return spreadsheet
 
-def parse_sheet_date(val):
-    if val is None or val == "":
-        return ""
-    try:
-        n = float(val)
-        if n > 1000:
-            from datetime import timedelta
-            base = datetime(1899, 12, 30)
-            d = base + timedelta(days=n)
-            return d.strftime("%Y-%m-%d")
-    except (ValueError, TypeError):
-        pass
-    return str(val).strip() or ""
 
+def get_sheet(sheet_name: str):
+    with _pool_lock:
+        spreadsheet = _get_spreadsheet()
+        ws = _pool["worksheets"].get(sheet_name)
+        if ws is not None:
+            _pool_stats["hits"] += 1
+            return wrap_worksheet(ws)
+        _pool_stats["misses"] += 1
+        instrumentation.count_request()
+        ws = spreadsheet.worksheet(sheet_name)
+        _pool["worksheets"][sheet_name] = ws
+        return wrap_worksheet(ws)
 
-def parse_sheet_time(val):
-    if val is None or val == "":
-        return ""
-    try:
-        n = float(val)
-        if 0 <= n < 1:
-            total_min = int(round(n * 24 * 60))
-            h, m = divmod(total_min, 60)
-            return f"{h:02d}:{m:02d}"
-    except (ValueError, TypeError):
-        pass
-    return str(val).strip() or ""
+
+def reset_sheet_pool():
+    """Drop all pooled handles; the next get_sheet re-authorizes."""
+    with _pool_lock:
+        _pool.update(creds=None, client=None, spreadsheet=None, sheet_id=None, worksheets={})
+
+
+def use_spreadsheet(spreadsheet, sheet_id: str):
+    """Serve sheet_id from spreadsheet instead of authorizing against Google.
+
+    spreadsheet only needs worksheet(name); this is how the offline benchmarks
+    plug in their in-memory fake. It stays in place until reset_sheet_pool()
+    or until SHEET_ID points elsewhere.
+    """
+    with _pool_lock:
+        _pool.update(creds=None, client=None, spreadsheet=spreadsheet, sheet_id=sheet_id, worksheets={})
+
+
+def get_pool_stats():
+    """Counters for the client pool (hits/misses per worksheet lookup, handshakes)."""
+    with _pool_lock:
+        return dict(_pool_stats)
+
+
+def _api_error_code(exc):
+    """The HTTP status of a gspread APIError, None for anything else."""
+    import gspread
+
+    return exc.code if isinstance(exc, gspread.exceptions.APIError) else None
+
+
+def _is_auth_error(exc):
+    from google.auth.exceptions import RefreshError
+
+    return isinstance(exc, RefreshError) or _api_error_code(exc) in _AUTH_ERROR_CODES
+
+
+def _is_retryable(exc):
+    import requests
+
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return _api_error_code(exc) in _RETRY_ERROR_CODES
+
+
+_limiter_lock = threading.Lock()
+_limiter = {"bucket": None, "config": None}
+_single_flight = SingleFlight()
+
+
+def _get_limiter():
+    per_minute = float(_get_setting("SHEETS_QUOTA_PER_MINUTE", DEFAULT_SHEETS_QUOTA_PER_MINUTE))
+    burst = int(_get_setting("SHEETS_BURST", DEFAULT_SHEETS_BURST))
+    with _limiter_lock:
+        if _limiter["config"] != (per_minute, burst):
+            _limiter.update(bucket=TokenBucket(per_minute / 60.0, burst), config=(per_minute, burst))
+        return _limiter["bucket"]
+
+
+def _unavailable(exc):
+    code = _api_error_code(exc)
+    if code == 429:
+        return SheetsUnavailableError("Google Sheets is rate limiting requests; please try again in a minute")
+    if code is not None:
+        return SheetsUnavailableError(f"Google Sheets is unavailable right now (HTTP {code}); please try again")
+    return SheetsUnavailableError("Could not reach Google Sheets; check your connection and try again")
+
+
+def _with_sheet(sheet_name: Optional[str], fn, idempotent: bool = True):
+    """Run fn(worksheet) within the rate limit (fn(spreadsheet) when sheet_name is None).
+
+    Auth failures rebuild the pool and retry once; 429s, 5xx and connection
+    errors are retried with jittered backoff, then raised as SheetsUnavailableError.
+    Pass idempotent=False for appends and deletes: a timeout or 5xx may come
+    after Sheets applied the request, so only 429s (rejected outright) are
+    retried and anything else is raised for the caller to check.
+    """
+    wait = float(_get_setting("SHEETS_QUOTA_WAIT_SECONDS", DEFAULT_SHEETS_QUOTA_WAIT_SECONDS))
+    attempts = int(_get_setting("SHEETS_MAX_ATTEMPTS", DEFAULT_SHEETS_MAX_ATTEMPTS))
+    delays = backoff_delays(attempts)
+    rebuilt = False
+    while True:
+        if not _get_limiter().acquire(timeout=wait):
+            raise SheetsUnavailableError("Too many Google Sheets requests right now; please try again in a minute")
+        try:
+            return fn(get_sheet(sheet_name) if sheet_name is not None else _get_spreadsheet())
+        except Exception as e:
+            if _is_auth_error(e) and not rebuilt:
+                with _pool_lock:
+                    reset_sheet_pool()
+                    _pool_stats["rebuilds"] += 1
+                rebuilt = True
+                continue
+            if not _is_retryable(e):
+                raise
+            if not idempotent and _api_error_code(e) != 429:
+                raise _unavailable(e) from e
+            delay = next(delays, None)
+            if delay is None:
+                raise _unavailable(e) from e
+            _pool_stats["retries"] += 1
+            _time.sleep(delay)
+
+
+def _read_sheet(sheet_name: str, method: str, *args):
+    """ws.<method>(*args) for a read; identical reads already in flight share one request.
+
+    The result may be shared with other threads, so callers must not modify it.
+    """
+    key = (_get_sheet_id(), sheet_name, method, args)
+    return _single_flight.do(key, lambda: _with_sheet(sheet_name, lambda ws: getattr(ws, method)(*args)))
+
+
+def get_throttle_stats():
+    """Counters for the rate limiter and read coalescing."""
+    return {"limiter": _get_limiter().stats(), "single_flight": _single_flight.stats()}
+
+
+def now_ist():
+    """Current time in IST (works on Streamlit Cloud which runs in UTC)."""
+    return datetime.now(IST).replace(tzinfo=None)
 
 
 def generate_user_id():
     return _secrets_mod.token_hex(16)
 
 
-# --- Users ---
+# --- Expense shards ---
+# With sharding on, expenses live in month tabs plus the original Expenses tab
+# ("legacy": rows from before sharding, and rows without a usable date).
+# `manage.py shard-expenses` copies legacy rows into month tabs; until a copy is
+# removed from the legacy tab, reads drop it there in favour of the month tab's.
+# Expense ids are unique across tabs: a tab's rows are numbered from
+# _shard_base(tab), which is 0 for the legacy tab.
 
+EXPENSES_HEADER = ["UserId", "Date", "Time", "Amount", "Category", "Payment Mode", "Notes", "Created"]
+SHARD_ROW_SPAN = 10_000_000  # more rows than a spreadsheet has room for
+# Created value given to copies of legacy rows that had none, so they can be matched.
+LEGACY_KEY_PREFIX = "legacy-row-"
+_SHARD_TAB_RE = re.compile(r"^" + re.escape(EXPENSES_TAB) + r" (\d{4})-(\d{2})$")
 
-def get_all_users():
+_shard_lock = threading.Lock()
+_shard_create_lock = threading.Lock()
+_shard_titles = {"titles": None, "sheet_id": None, "at": 0.0}
+
+
+def _sharded() -> bool:
+    mode = str(_get_setting("EXPENSES_SHARDING", DEFAULT_EXPENSES_SHARDING) or "").strip().lower()
+    if mode not in ("", "off", "month"):
+        raise ValueError(f"EXPENSES_SHARDING must be empty or 'month', not {mode!r}")
+    return mode == "month"
+
+
+def _shard_month(tab: str):
+    """(year, month) of a month tab; None for the legacy tab and any other."""
+    m = _SHARD_TAB_RE.match(tab)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+def _is_expense_tab(tab: str) -> bool:
+    return tab == EXPENSES_TAB or _shard_month(tab) is not None
+
+
+def _shard_base(tab: str) -> int:
+    month = _shard_month(tab)
+    return 0 if month is None else (month[0] * 12 + month[1]) * SHARD_ROW_SPAN
+
+
+def _shard_days(month):
+    """[first, last] day numbers of a (year, month)."""
+    from expense_columns import day_number
+
+    year, mon = month
+    following = f"{year + 1:04d}-01-01" if mon == 12 else f"{year:04d}-{mon + 1:02d}-01"
+    return day_number(f"{year:04d}-{mon:02d}-01"), day_number(following) - 1
+
+
+def expense_tab_for(date: str) -> str:
+    """The tab an expense dated date (YYYY-MM-DD) is written to."""
+    if not _sharded():
+        return EXPENSES_TAB
+    try:
+        d = datetime.strptime(str(date)[:10], "%Y-%m-%d")
+    except ValueError:
+        return EXPENSES_TAB
+    return f"{EXPENSES_TAB} {d.year:04d}-{d.month:02d}"
+
+
+def _worksheet_titles(refresh: bool = False):
+    """Titles of the spreadsheet's tabs, re-listed at most every MIRROR_MAX_STALENESS_SECONDS
+    so month tabs other processes create are noticed."""
+    max_age = float(_get_setting("MIRROR_MAX_STALENESS_SECONDS", DEFAULT_MIRROR_MAX_STALENESS_SECONDS))
+    sheet_id = _get_sheet_id()
+    with _shard_lock:
+        cached = dict(_shard_titles)
+    if not refresh and cached["sheet_id"] == sheet_id and _time.time() - cached["at"] < max_age:
+        return cached["titles"]
+
+    def list_titles(spreadsheet):
+        instrumentation.count_request()
+        return frozenset(ws.title for ws in spreadsheet.worksheets())
+
+    titles = _single_flight.do((sheet_id, "worksheets"), lambda: _with_sheet(None, list_titles))
+    with _shard_lock:
+        _shard_titles.update(titles=titles, sheet_id=sheet_id, at=_time.time())
+    return titles
+
+
+def _expense_tabs(from_day: Optional[int] = None, to_day: Optional[int] = None):
+    """The legacy tab plus the month tabs overlapping [from_day, to_day] (None bounds are open)."""
+    if not _sharded():
+        return [EXPENSES_TAB]
+    tabs = [EXPENSES_TAB]
+    for title in sorted(_worksheet_titles()):
+        month = _shard_month(title)
+        if month is None:
+            continue
+        first, last = _shard_days(month)
+        if (from_day is None or last >= from_day) and (to_day is None or first <= to_day):
+            tabs.append(title)
+    return tabs
+
+
+def _ensure_shard(tab: str):
+    """Create month tab tab, with the header row, unless it exists."""
+    if tab in _worksheet_titles():
+        return
+    with _shard_create_lock:
+        if tab in _worksheet_titles(refresh=True):
+            return
+
+        def create(spreadsheet):
+            import gspread
+
+            instrumentation.count_request()
+            try:
+                spreadsheet.add_worksheet(title=tab, rows=1000, cols=len(EXPENSES_HEADER))
+            except gspread.exceptions.APIError as e:
+                if e.code != 400:
+                    raise
+                return False  # another process created it first
+            return True
+
+        if _with_sheet(None, create):
+            _with_sheet(tab, lambda ws: ws.append_row(EXPENSES_HEADER, value_input_option="RAW"), idempotent=False)
+        _worksheet_titles(refresh=True)
+
+
+def _copy_key(expense) -> str:
+    """What a month-tab copy of legacy expense stores as createdAt."""
+    return expense.created_at or f"{LEGACY_KEY_PREFIX}{expense.id}"
+
+
+def _row_keys(tab: str):
+    """(userId, createdAt) of every row of tab, the header included."""
+    ids = _read_sheet(tab, "col_values", 1)
+    created = _read_sheet(tab, "col_values", _tab_width(tab))
+    return set(zip_longest(ids, created, fillvalue=""))
+
+
+def _drop_copied_legacy(found):
+    """found ((day, expense) pairs from several tabs) minus legacy expenses also present as a month-tab copy."""
+    copies = {(e.user_id, e.created_at) for _, e in found if e.id >= SHARD_ROW_SPAN}
+    if not copies:
+        return found
+    return [(d, e) for d, e in found if e.id >= SHARD_ROW_SPAN or (e.user_id, _copy_key(e)) not in copies]
+
+
+# --- Data versions ---
+# A counter per user, bumped whenever rows of theirs may have been added or
+# changed, plus an epoch bumped when everyone's may have (row index rebuilds).
+# These cover this process's own writes and the row index; rows synced into
+# the mirror bump the mirror's versions instead, which every process sharing
+# the file reads. Anything derived from a user's expenses can be cached under
+# get_data_version().
+
+_versions_lock = threading.Lock()
+_data_versions = {"epoch": 0, "users": {}}
+
+
+def _bump_versions(user_ids=None):
+    """Bump the version of each of user_ids, or of every user when None."""
+    with _versions_lock:
+        if user_ids is None:
+            _data_versions["epoch"] += 1
+            return
+        users = _data_versions["users"]
+        for user_id in set(user_ids):
+            users[user_id] = users.get(user_id, 0) + 1
+
+
+def get_data_version(user_id: str):
+    """A value that changes whenever user_id's expenses this day, week or month may have changed.
+
+    With the sheet, syncs the mirror first (subject to MIRROR_MAX_STALENESS_SECONDS),
+    so rows other processes appended are noticed; without the mirror, the row
+    index is refreshed instead. Either way that is one change probe per tab, and
+    edits above a tab's last row only show up with the next full re-read. With
+    the SQLite backend it is the store's own per-user write counter.
+    """
+    return _get_storage().data_version(user_id)
+
+
+_render_cache_lock = threading.Lock()
+_render_cache = {"instance": None}
+
+
+def get_render_cache():
+    """The process-wide RenderCache (sized from RENDER_CACHE_MAX_MB on first use)."""
+    with _render_cache_lock:
+        if _render_cache["instance"] is None:
+            max_mb = float(_get_setting("RENDER_CACHE_MAX_MB", DEFAULT_RENDER_CACHE_MAX_MB))
+            _render_cache["instance"] = RenderCache(int(max_mb * 1024 * 1024))
+        return _render_cache["instance"]
+
+
+# --- Storage backend ---
+# Expenses and users are read and written through the Storage (see storage.py)
+# that _get_storage() picks from STORAGE_BACKEND. The mirror, row index and
+# write-behind queue below all belong to SheetsStorage; with the SQLite backend
+# none of them is used. A new backend is a Storage plus an entry here.
+
+_sqlite_lock = threading.Lock()
+_sqlite = {"instance": None, "path": None}
+
+
+def _open_sqlite_storage(path: Optional[str] = None):
+    path = path or _get_setting("SQLITE_DB_PATH", DEFAULT_SQLITE_DB_PATH)
+    with _sqlite_lock:
+        if _sqlite["instance"] is None or _sqlite["path"] != path:
+            pool_size = int(_get_setting("SQLITE_POOL_SIZE", DEFAULT_SQLITE_POOL_SIZE))
+            _sqlite.update(instance=SqliteStorage(SqliteStore(path, pool_size)), path=path)
+        return _sqlite["instance"]
+
+
+_STORAGE_BACKENDS = {
+    "sheets": lambda: _sheets_storage,
+    "sqlite": _open_sqlite_storage,
+}
+
+
+def _storage_backend() -> str:
+    backend = str(_get_setting("STORAGE_BACKEND", DEFAULT_STORAGE_BACKEND) or DEFAULT_STORAGE_BACKEND).strip().lower()
+    if backend not in _STORAGE_BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND must be one of {', '.join(map(repr, _STORAGE_BACKENDS))}, not {backend!r}")
+    return backend
+
+
+def _get_storage() -> Storage:
+    """The process-wide Storage for STORAGE_BACKEND."""
+    return _STORAGE_BACKENDS[_storage_backend()]()
+
+
+# --- Change probes ---
+# What we already hold for a tab (mirror rows, the row index) is checked with
+# one small read from the last known row down: that row must still match the
+# checksum taken when it was read, and anything after it was appended since.
+# No new rows and a matching checksum means the tab is unchanged; a mismatch
+# (the last row was edited, or rows were deleted) means a full re-read. Edits
+# above the last row are still only seen by the periodic full re-read.
+
+_probe_lock = threading.Lock()
+_probe_stats = {"probes": 0, "unchanged": 0, "appended": 0, "changed": 0}
+
+
+def _row_checksum(row, width: int) -> str:
+    """Checksum of the first width cells of a raw row; trailing empty cells don't count."""
+    cells = [str(v) for v in row[:width]]
+    while cells and cells[-1] == "":
+        cells.pop()
+    return hashlib.blake2b("\x1f".join(cells).encode(), digest_size=8).hexdigest()
+
+
+def _count_probe(outcome: str):
+    with _probe_lock:
+        _probe_stats["probes"] += 1
+        _probe_stats[outcome] += 1
+    instrumentation.count(f"probe.{outcome}")
+
+
+def _probe_tab(tab: str, row_count: int, last_row: Optional[str], width: int):
+    """(rows appended after the first row_count data rows of tab, checksum of the tab's last row),
+    or None if the last of those rows no longer matches last_row.
+
+    last_row None (no checksum taken yet) accepts the row as it is now.
+    """
+    if row_count == 0:
+        new = list(_read_sheet(tab, "get", f"A2:{_col_letter(width)}"))
+        _count_probe("appended" if new else "unchanged")
+        return new, (_row_checksum(new[-1], width) if new else None)
+    # Row 1 is the header, so the last known data row is sheet row row_count + 1.
+    rows = _read_sheet(tab, "get", f"A{row_count + 1}:{_col_letter(width)}")
+    if not rows or (last_row is not None and _row_checksum(rows[0], width) != last_row):
+        _count_probe("changed")
+        return None
+    _count_probe("appended" if len(rows) > 1 else "unchanged")
+    return list(rows[1:]), _row_checksum(rows[-1], width)
+
+
+def get_probe_stats():
+    """Change probe outcomes; hit_rate is the share that found the tab unchanged."""
+    with _probe_lock:
+        stats = dict(_probe_stats)
+    stats["hit_rate"] = round(stats["unchanged"] / stats["probes"], 3) if stats["probes"] else None
+    return stats
+
+
+# --- Local mirror ---
+
+_TAB_WIDTHS = {EXPENSES_TAB: 8, USERS_TAB: 4}
+
+_mirror_lock = threading.Lock()
+_mirror = {"instance": None, "sheet_id": None}
+# Times an incremental sync starts over after another sync of the tab landed first.
+_MIRROR_SYNC_ATTEMPTS = 3
+
+
+def _get_mirror():
+    """Return the process-wide LocalMirror, or None when it is disabled or unavailable."""
+    if not _get_bool_setting("MIRROR_ENABLED", True):
+        return None
+    sheet_id = _get_sheet_id()
+    if not sheet_id:
+        return None
+    with _mirror_lock:
+        if _mirror["instance"] is None or _mirror["sheet_id"] != sheet_id:
+            path = _get_setting("MIRROR_DB_PATH") or os.path.join(
+                tempfile.gettempdir(), "expense_tracker_mirror.sqlite3"
+            )
+            pool_size = int(_get_setting("SQLITE_POOL_SIZE", DEFAULT_SQLITE_POOL_SIZE))
+            try:
+                _mirror.update(instance=LocalMirror(path, sheet_id, pool_size), sheet_id=sheet_id)
+            except Exception:
+                return None
+        return _mirror["instance"]
+
+
+def _mirror_tab(tab: str) -> str:
+    """The mirror's sync_state key for a sheet tab."""
+    if tab == USERS_TAB:
+        return "users"
+    return "expenses" if tab == EXPENSES_TAB else f"expenses:{tab}"
+
+
+def _tab_width(tab: str) -> int:
+    return _TAB_WIDTHS[USERS_TAB if tab == USERS_TAB else EXPENSES_TAB]
+
+
+def _col_letter(n: int) -> str:
+    return chr(ord("A") + n - 1)
+
+
+def _sync_tab(mirror, tab: str, full: bool, max_staleness: Optional[float]):
+    """Bring mirror's copy of tab up to date, unless it was synced within max_staleness.
+
+    Only rows appended since the last sync are read, or the whole tab when full
+    is set, a full re-read is due or the last synced row changed. Nothing is
+    locked while the sheet is read: concurrent staleness-bound syncs of a tab
+    share one, and an incremental result is applied only if no other sync got
+    there first (see LocalMirror's sync bookkeeping), else it starts over.
+    """
+    if full or max_staleness is None:
+        _sync_tab_now(mirror, tab, full)
+        return
+    state = mirror.sync_state(_mirror_tab(tab))
+    if state is not None and _time.time() - state["synced_at"] < max_staleness:
+        return
+    _single_flight.do(("mirror", mirror.path, tab), lambda: _sync_tab_now(mirror, tab, False))
+
+
+def _sync_tab_now(mirror, tab: str, full: bool):
+    table = _mirror_tab(tab)
+    width = _tab_width(tab)
+    resync_every = float(_get_setting("MIRROR_FULL_RESYNC_SECONDS", DEFAULT_MIRROR_FULL_RESYNC_SECONDS))
+    for _ in range(_MIRROR_SYNC_ATTEMPTS):
+        state = mirror.sync_state(table)
+        incremental = not full and state is not None and _time.time() - state["full_synced_at"] < resync_every
+        if incremental:
+            known = state["row_count"]
+            probed = _probe_tab(tab, known, state["last_row"], width)
+            if probed is None:
+                incremental = False  # the last synced row changed: rows were edited or deleted
+            else:
+                rows, last_row = probed
+                if not rows:
+                    mirror.touch(table, last_row, expect=state)
+                    return
+                first_row = known + 2
+        if not incremental:
+            rows = _read_sheet(tab, "get_all_values")[1:]
+            first_row, known = 2, 0
+            last_row = _row_checksum(rows[-1], width) if rows else None
+        # Ranged reads drop trailing empty cells; pad like get_all_values does.
+        rows = [list(r) + [""] * (width - len(r)) for r in rows]
+        if _store_synced_rows(mirror, tab, rows, first_row, known + len(rows), last_row,
+                              expect=state if incremental else None):
+            return
+    # Other syncs kept landing first; what they stored is at least as recent.
+
+
+def _store_synced_rows(mirror, tab: str, rows, first_row: int, row_count: int, last_row, expect) -> bool:
+    """Write rows read from tab into mirror: appended rows when expect (the sync_state
+    they were read against) is given, else the whole tab. False if expect is out of date."""
+    from expense_columns import parse_expense_rows
+
+    table = _mirror_tab(tab)
+    full = expect is None
+    if tab == USERS_TAB:
+        records = [(first_row + i, u) for i, u in enumerate(_rows_to_users(rows)) if u]
+        with span("mirror.store", tab=table, rows=len(records), full=full):
+            if full:
+                mirror.replace_users(records, row_count, last_row)
+                return True
+            return mirror.append_users(records, row_count, last_row, expect=expect)
+    base = _shard_base(tab)
+    with span("parse.expenses", rows=len(rows)):
+        cols = parse_expense_rows(rows, base + first_row)
+        records = list(zip(cols.to_expenses(), cols.days()))
+    sharded = _sharded()
+    with span("mirror.store", tab=table, rows=len(records), full=full):
+        if not full:
+            if not mirror.append_expenses(records, row_count, tab=table, last_row=last_row, expect=expect):
+                return False
+        elif sharded:
+            mirror.replace_expenses(
+                records, row_count, tab=table, id_range=(base, base + SHARD_ROW_SPAN), last_row=last_row
+            )
+        else:
+            mirror.replace_expenses(records, row_count, tab=table, last_row=last_row)
+        if sharded and tab == EXPENSES_TAB and full:
+            mirror.drop_copied_legacy(SHARD_ROW_SPAN, LEGACY_KEY_PREFIX)
+        elif sharded and tab != EXPENSES_TAB:
+            mirror.drop_copied_legacy(
+                SHARD_ROW_SPAN, LEGACY_KEY_PREFIX, [(e.user_id, e.created_at) for e, _ in records]
+            )
+    return True
+
+
+def sync_mirror(full: bool = False):
+    """Bring the local mirror up to date with the sheet.
+
+    By default only rows appended since the last sync are fetched; full=True
+    re-reads both tabs, which also picks up edited or deleted rows. Does
+    nothing with the SQLite backend.
+    """
+    _get_storage().sync(full)
+
+
+def _synced_mirror(tab: str):
+    """Return the mirror with tab no staler than the configured bound, or None to read the sheet.
+
+    If syncing fails but the mirror holds an earlier copy, that copy is served.
+    """
+    mirror = _get_mirror()
+    if mirror is None:
+        return None
+    max_staleness = float(_get_setting("MIRROR_MAX_STALENESS_SECONDS", DEFAULT_MIRROR_MAX_STALENESS_SECONDS))
     try:
-        ws = get_sheet(USERS_TAB)
-        rows = ws.get_all_values()
+        _sync_tab(mirror, tab, full=False, max_staleness=max_staleness)
     except Exception:
+        if mirror.sync_state(_mirror_tab(tab)) is None:
+            raise
+    return mirror
+
+
+def _synced_expense_mirror(from_day: Optional[int] = None, to_day: Optional[int] = None):
+    """_synced_mirror for every expense tab overlapping [from_day, to_day]."""
+    mirror = None
+    for tab in _expense_tabs(from_day, to_day):
+        mirror = _synced_mirror(tab)
+        if mirror is None:
+            return None
+    return mirror
+
+
+def _mark_mirror_stale(tab: str):
+    mirror = _get_mirror()
+    if mirror is not None:
+        mirror.mark_stale(_mirror_tab(tab))
+
+
+# --- Write-behind appends ---
+# add_expense/create_user journal their row and return; WriteBehindQueue
+# flushes batches with append_rows. Reads merge in rows still queued so this
+# process always sees its own writes.
+
+_write_queue_lock = threading.Lock()
+_write_queue = {"instance": None, "sheet_id": None}
+
+
+def _get_write_queue():
+    """Return the process-wide WriteBehindQueue, or None to append synchronously."""
+    if not _get_bool_setting("WRITE_BEHIND_ENABLED", True):
+        return None
+    sheet_id = _get_sheet_id()
+    if not sheet_id:
+        return None
+    with _write_queue_lock:
+        if _write_queue["instance"] is None or _write_queue["sheet_id"] != sheet_id:
+            _write_queue.update(instance=_open_write_queue(sheet_id), sheet_id=sheet_id)
+        return _write_queue["instance"]
+
+
+def _open_write_queue(sheet_id: str):
+    """A WriteBehindQueue on a journal no other process holds (JournalBusyError if there is none)."""
+    def open_queue(path):
+        return WriteBehindQueue(
+            path,
+            _flush_appends,
+            batch_size=int(_get_setting("WRITE_BATCH_SIZE", DEFAULT_WRITE_BATCH_SIZE)),
+            flush_seconds=float(_get_setting("WRITE_FLUSH_SECONDS", DEFAULT_WRITE_FLUSH_SECONDS)),
+            max_attempts=int(_get_setting("WRITE_MAX_ATTEMPTS", DEFAULT_WRITE_MAX_ATTEMPTS)),
+            is_permanent=_is_permanent_write_error,
+        )
+
+    path = _get_setting("WRITE_JOURNAL_PATH")
+    if path:
+        return open_queue(path)
+    # Slot 0 keeps the name journals had before there were slots.
+    for slot in range(WRITE_JOURNAL_SLOTS):
+        suffix = f".{slot}" if slot else ""
+        try:
+            return open_queue(os.path.join(tempfile.gettempdir(), f"expense_tracker_journal_{sheet_id}{suffix}.jsonl"))
+        except JournalBusyError:
+            continue
+    raise JournalBusyError(f"All {WRITE_JOURNAL_SLOTS} write journals for this sheet are in use; set WRITE_JOURNAL_PATH")
+
+
+def _is_permanent_write_error(exc):
+    """True when retrying an append can't help: anything but a 429, a 5xx or a lost connection."""
+    if isinstance(exc, SheetsUnavailableError):
+        return False  # _with_sheet ran out of retries on one of those
+    return not _is_retryable(exc)
+
+
+def _flush_appends(tab: str, rows, recovered: bool):
+    if _shard_month(tab) is not None:
+        _ensure_shard(tab)
+    if recovered:
+        # A previous process, or a failed flush, may have written these;
+        # userId and createdAt (first and last columns) identify rows that
+        # already made it; createdAt alone can repeat across users.
+        written = _row_keys(tab)
+        rows = [r for r in rows if (r[0], r[-1]) not in written]
+        if not rows:
+            return
+    result = _with_sheet(tab, lambda ws: ws.append_rows(rows, value_input_option="USER_ENTERED"), idempotent=False)
+    _mark_mirror_stale(tab)
+    if _is_expense_tab(tab):
+        _record_appended_rows(result, rows, tab)
+        _bump_versions(r[0] for r in rows)
+
+
+def _append(tab: str, row: list):
+    """Queue row for tab, or append it right away when write-behind is off."""
+    queue = _get_write_queue()
+    if queue is not None:
+        queue.enqueue(tab, row)
+    else:
+        if _shard_month(tab) is not None:
+            _ensure_shard(tab)
+        result = _with_sheet(tab, lambda ws: ws.append_row(row, value_input_option="USER_ENTERED"), idempotent=False)
+        _mark_mirror_stale(tab)
+        if _is_expense_tab(tab):
+            _record_appended_rows(result, [row], tab)
+    if _is_expense_tab(tab):
+        _bump_versions([row[0]])
+
+
+def _pending_rows(tab: str):
+    """(queue id, row) pairs journaled but not yet in the sheet.
+
+    Also starts the queue on first use, so a restarted process flushes whatever
+    the previous one left in the journal.
+    """
+    queue = _get_write_queue()
+    return queue.pending_rows(tab) if queue is not None else []
+
+
+def _pending_expense_rows():
+    """_pending_rows across every expense tab."""
+    queue = _get_write_queue()
+    if queue is None:
         return []
-    if len(rows) < 2:
-        return []
-    users = []
-    for row in rows[1:]:
-        if len(row) >= 4:
-            users.append({
-                "userId": row[0] or "",
-                "email": (row[1] or "").strip().lower(),
-                "passwordHash": row[2] or "",
-                "createdAt": row[3] or "",
-            })
-    return users
+    return [pair for tab in queue.pending_tabs() if _is_expense_tab(tab) for pair in queue.pending_rows(tab)]
+
+
+def flush_writes(tab: Optional[str] = None):
+    """Write any queued rows to the sheet now."""
+    with _write_queue_lock:
+        queue = _write_queue["instance"]
+    if queue is not None:
+        queue.flush(tab)
+
+
+def get_write_queue_stats():
+    """Queue counters; dead_letters is the number of rows in the dead-letter file."""
+    with _write_queue_lock:
+        queue = _write_queue["instance"]
+    return queue.stats() if queue is not None else {}
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        flush_writes()
+    except Exception:
+        pass  # still journaled; the next process flushes it
+
+
+# --- Users ---
+
+
+def _rows_to_users(rows):
+    """One user dict per row, or None for rows too short to hold a user."""
+    return [
+        {
+            "userId": row[0] or "",
+            "email": (row[1] or "").strip().lower(),
+            "passwordHash": row[2] or "",
+            "createdAt": row[3] or "",
+        }
+        if len(row) >= 4 else None
+        for row in rows
+    ]
+
+
+def get_all_users():
+    return _get_storage().users()
+
+
+# --- User lookup cache ---
+# Login and signup look users up by email. Rather than scanning the Users tab
+# per attempt, keep an email -> user dict for USER_CACHE_TTL_SECONDS and a
+# bounded cache of emails recently confirmed unknown. A remembered miss is
+# answered without a reload for USER_NEGATIVE_TTL_SECONDS, however old the
+# index is; a reload only forgets the emails it now finds.
+
+_user_cache_lock = threading.Lock()
+_user_reload_lock = threading.Lock()
+_signup_lock = threading.Lock()
+_user_cache = {"by_email": None, "loaded_at": 0.0}
+_user_negative = OrderedDict()  # email -> expires_at
+
+
+def _user_cache_ttl():
+    return float(_get_setting("USER_CACHE_TTL_SECONDS", DEFAULT_USER_CACHE_TTL_SECONDS))
+
+
+def _reload_user_index(requested_at: float, fresh: bool = False):
+    """Rebuild the email index unless another thread already did so after requested_at."""
+    with _user_reload_lock:
+        with _user_cache_lock:
+            if _user_cache["by_email"] is not None and _user_cache["loaded_at"] > requested_at:
+                return
+        by_email = {}
+        for u in _get_storage().users(fresh):
+            by_email.setdefault(u["email"], u)  # first row wins, as in the sheet
+        with _user_cache_lock:
+            _user_cache.update(by_email=by_email, loaded_at=_time.time())
+            for email in [e for e in _user_negative if e in by_email]:
+                del _user_negative[email]
+
+
+def _remember_unknown(email: str):
+    size = int(_get_setting("USER_NEGATIVE_CACHE_SIZE", DEFAULT_USER_NEGATIVE_CACHE_SIZE))
+    ttl = float(_get_setting("USER_NEGATIVE_TTL_SECONDS", DEFAULT_USER_NEGATIVE_TTL_SECONDS))
+    with _user_cache_lock:
+        _user_negative[email] = _time.time() + ttl
+        _user_negative.move_to_end(email)
+        while len(_user_negative) > size:
+            _user_negative.popitem(last=False)
+
+
+def invalidate_user_cache():
+    with _user_cache_lock:
+        _user_cache.update(by_email=None, loaded_at=0.0)
+        _user_negative.clear()
 
 
 def find_user_by_email(email: str):
-    users = get_all_users()
     norm = (email or "").strip().lower()
-    for u in users:
-        if u["email"] == norm:
-            return u
-    return None
+    now = _time.time()
+    with _user_cache_lock:
+        by_email = _user_cache["by_email"]
+        fresh = by_email is not None and now - _user_cache["loaded_at"] < _user_cache_ttl()
+        if fresh and norm in by_email:
+            return by_email[norm]
+        if by_email is not None and _user_negative.get(norm, 0) > now:
+            return None
+    # Expired, or unknown to a fresh index: reload, and in the latter case read
+    # past the mirror's staleness bound in case they just signed up elsewhere.
+    try:
+        _reload_user_index(now, fresh=fresh)
+    except Exception:
+        if by_email is None:
+            raise
+        # Serve the older index, but don't remember a miss we could not confirm.
+        return by_email.get(norm)
+    with _user_cache_lock:
+        user = (_user_cache["by_email"] or {}).get(norm)
+    if user is None:
+        _remember_unknown(norm)
+    return user
 
 
 def create_user(user_id: str, email: str, password_hash: str):
-    ws = get_sheet(USERS_TAB)
-    row = [user_id, email.strip().lower(), password_hash, datetime.utcnow().isoformat() + "Z"]
-    ws.append_row(row, value_input_option="USER_ENTERED")
+    """Add the user; returns it, or None if the storage refused the email as taken."""
+    norm = email.strip().lower()
+    created_at = datetime.utcnow().isoformat() + "Z"
+    if not _get_storage().append_user([user_id, norm, password_hash, created_at]):
+        return None
+    user = {"userId": user_id, "email": norm, "passwordHash": password_hash, "createdAt": created_at}
+    with _user_cache_lock:
+        if _user_cache["by_email"] is not None:
+            _user_cache["by_email"].setdefault(norm, user)
+        _user_negative.pop(norm, None)
+    return user
+
+
+def update_password_hash(user_id: str, password_hash: str) -> bool:
+    """Store user_id's new password hash; False if their row isn't in the sheet (or store) yet."""
+    updated = _get_storage().set_password_hash(user_id, password_hash)
+    if updated:
+        with _user_cache_lock:
+            by_email = _user_cache["by_email"] or {}
+            for email, u in by_email.items():
+                if u["userId"] == user_id:
+                    by_email[email] = dict(u, passwordHash=password_hash)
+    return updated
+
+
+def _update_password_cell(user_id: str, password_hash: str) -> bool:
+    """Overwrite user_id's PasswordHash cell in the Users tab."""
+    ids = _read_sheet(USERS_TAB, "col_values", 1)
+    if user_id not in ids:
+        return False
+    row = ids.index(user_id) + 1
+    _with_sheet(USERS_TAB, lambda ws: ws.update_cell(row, 3, password_hash))
+    mirror = _get_mirror()
+    if mirror is not None:
+        # Incremental syncs only read appended rows, so patch the edit in.
+        mirror.set_password_hash(user_id, password_hash)
+    return True
+
+
+_hasher_lock = threading.Lock()
+_hasher = {"instance": None}
+_rehash_stats = {"rehashed": 0, "rehash_failures": 0}
+
+
+def get_password_hasher():
+    """The process-wide PasswordHasher (created on first use from settings)."""
+    with _hasher_lock:
+        if _hasher["instance"] is None:
+            _hasher["instance"] = PasswordHasher(
+                rounds=int(_get_setting("BCRYPT_ROUNDS", DEFAULT_BCRYPT_ROUNDS)),
+                workers=int(_get_setting("PASSWORD_WORKERS", DEFAULT_PASSWORD_WORKERS)),
+                max_queue=int(_get_setting("PASSWORD_MAX_QUEUE", DEFAULT_PASSWORD_MAX_QUEUE)),
+                max_attempts=int(_get_setting("PASSWORD_MAX_ATTEMPTS", DEFAULT_PASSWORD_MAX_ATTEMPTS)),
+                attempt_window=float(
+                    _get_setting("PASSWORD_ATTEMPT_WINDOW_SECONDS", DEFAULT_PASSWORD_ATTEMPT_WINDOW_SECONDS)
+                ),
+                use_processes=_get_bool_setting("PASSWORD_USE_PROCESSES", True),
+            )
+        return _hasher["instance"]
+
+
+def rehash_password(user_id: str, password: str):
+    """In the background, rehash password at the configured cost and store it for user_id.
+
+    Best effort: if the pool is busy or the write fails, the old hash stays and
+    the next login tries again.
+    """
+    try:
+        future = get_password_hasher().hash_async(password)
+    except PasswordBusyError:
+        return
+
+    def store():
+        # Own thread: the pool's callback thread must not wait on the sheet.
+        try:
+            if update_password_hash(user_id, future.result()[0]):
+                _rehash_stats["rehashed"] += 1
+        except Exception:
+            _rehash_stats["rehash_failures"] += 1
+
+    threading.Thread(target=store, name="password-rehash", daemon=True).start()
+
+
+def get_password_stats():
+    """Hash/check counts, queue wait and hash latency, throttling and rehash counters."""
+    return dict(get_password_hasher().stats(), **_rehash_stats)
+
+
+def create_user_if_absent(user_id: str, email: str, password_hash: str):
+    """Create the user unless the email is already registered.
+
+    Returns the new user, or None if the email is taken. The check and the
+    append are serialized within this process and the check reads the sheet
+    fresh. If another process wins a simultaneous signup, the earliest row is
+    the account lookups resolve to, so this reports the email as taken. The
+    SQLite store's unique email index refuses the second row outright.
+    """
+    norm = email.strip().lower()
+    with _signup_lock:
+        _reload_user_index(_time.time(), fresh=True)
+        with _user_cache_lock:
+            if norm in _user_cache["by_email"]:
+                return None
+        user = create_user(user_id, norm, password_hash)
+        if user is None:
+            return None
+        flush_writes(USERS_TAB)
+        _reload_user_index(_time.time(), fresh=True)
+        with _user_cache_lock:
+            winner = _user_cache["by_email"].get(norm)
+    if winner is not None and winner["userId"] != user_id:
+        return None
+    return user
 
 
 # --- Expenses ---
 
 
-def _row_to_expense(row, idx):
-    if len(row) < 8:
-        row = row + [""] * (8 - len(row))
-    uid, date, time, amount, category, payment_mode, notes, created = row[:8]
-    return {
-        "id": idx + 2,
-        "userId": uid or "",
-        "date": parse_sheet_date(date) or date or "",
-        "time": parse_sheet_time(time) or time or "",
-        "amount": float(amount) if amount else 0,
-        "category": category or "",
-        "paymentMode": payment_mode or "",
-        "notes": notes or "",
-        "createdAt": created or "",
-    }
+# --- Per-user row index ---
+# userId -> sheet row numbers, for the direct (no mirror) read path. Built from
+# columns A:B once, then extended with whatever was appended since, so a user's
+# expenses can be fetched with ranged reads instead of the whole tab. Each
+# user's rows are also kept sorted by date, so a date range is located with
+# two bisects and only the rows in it are fetched. Each refresh is a change
+# probe; dates edited in place above the last row are picked up when the index
+# is rebuilt, every MIRROR_FULL_RESYNC_SECONDS. The sheet is read without
+# holding _row_index_lock: a refresh notes the index's generation, reads, and
+# applies what it read only if no one changed the index in the meantime.
 
+_ROW_INDEX_BATCH_RANGES = 100
+
+# Last column a ranged read needs. Sums never look at Notes or Created, so
+# they read A:F (UserId .. Payment Mode), and plain totals only A:D.
+_ALL_COLUMNS = "H"
+_CELL_COLUMNS = "F"
+_TOTAL_COLUMNS = "D"
+_UPDATED_RANGE_RE = re.compile(r"![A-Z]+(\d+)")
+
+_row_index_lock = threading.Lock()
+_row_index = {}  # tab -> {"gen", "row_count", "last_row", "built_at", "rows", "by_day"}
+_row_index_gens = count(1)  # bumped on every change to a tab's index
+_ROW_INDEX_REFRESH_ATTEMPTS = 3
+
+
+def reset_row_index(tab: Optional[str] = None):
+    """Forget the row index of tab (of every expense tab when None)."""
+    with _row_index_lock:
+        if tab is None:
+            _row_index.clear()
+        else:
+            _row_index.pop(tab, None)
+
+
+def _new_tab_index():
+    return {"gen": next(_row_index_gens), "row_count": None, "last_row": None, "built_at": 0.0, "rows": {}, "by_day": {}}
+
+
+def _tab_index(tab: str):
+    # Caller holds _row_index_lock.
+    index = _row_index.get(tab)
+    if index is None:
+        index = _row_index[tab] = _new_tab_index()
+    return index
+
+
+def _index_row(index, user_id: str, row_num: int, day):
+    index["rows"].setdefault(user_id, []).append(row_num)
+    if day is None:
+        return  # unparseable date: never in a date range
+    days, rows = index["by_day"].setdefault(user_id, ([], []))
+    # Appends are usually the latest date, so this is almost always the end.
+    at = bisect_right(days, day)
+    days.insert(at, day)
+    rows.insert(at, row_num)
+
+
+def _index_rows(index, cells, first_row):
+    from expense_columns import parse_days
+
+    days = parse_days([r[1] if len(r) > 1 else "" for r in cells])
+    for i, (r, day) in enumerate(zip(cells, days)):
+        uid = r[0] if r else ""
+        if uid:
+            _index_row(index, uid, first_row + i, day)
+
+
+def _refresh_row_index(tab: str = EXPENSES_TAB):
+    """Index rows appended to tab since the last refresh (the whole of columns A:B the first time,
+    or again once the tab's last row changed). Concurrent refreshes of a tab share one."""
+    _single_flight.do(("row_index", _get_sheet_id(), tab), lambda: _refresh_tab_index(tab))
+
+
+def _refresh_tab_index(tab: str):
+    full_every = float(_get_setting("MIRROR_FULL_RESYNC_SECONDS", DEFAULT_MIRROR_FULL_RESYNC_SECONDS))
+    for _ in range(_ROW_INDEX_REFRESH_ATTEMPTS):
+        with _row_index_lock:
+            index = _tab_index(tab)
+            gen, known, last_row, built_at = index["gen"], index["row_count"], index["last_row"], index["built_at"]
+        probed = None
+        if known is not None and _time.time() - built_at <= full_every:
+            probed = _probe_tab(tab, known, last_row, _TAB_WIDTHS[EXPENSES_TAB])
+        if probed is None:
+            cells = _read_sheet(tab, "get", "A2:B")
+            # The next probe takes the last row's checksum (this read only has A:B).
+            rebuilt = _new_tab_index()
+            _index_rows(rebuilt, cells, 2)
+            rebuilt.update(row_count=len(cells), built_at=_time.time())
+            with _row_index_lock:
+                if _tab_index(tab)["gen"] != gen:
+                    continue  # appended to or reset while reading: read again
+                _row_index[tab] = rebuilt
+            _bump_versions()
+            return
+        cells, checksum = probed
+        with _row_index_lock:
+            index = _tab_index(tab)
+            if index["gen"] != gen:
+                continue
+            _index_rows(index, cells, known + 2)
+            index.update(gen=next(_row_index_gens), row_count=known + len(cells), last_row=checksum)
+        if cells:
+            _bump_versions(r[0] for r in cells if r)
+        return
+
+
+def _indexed_rows(user_id: str, tab: str, from_day: Optional[int] = None, to_day: Optional[int] = None):
+    """Sorted row numbers of user_id in tab, only those dated in [from_day, to_day] if either is given."""
+    _refresh_row_index(tab)
+    with _row_index_lock:
+        index = _tab_index(tab)
+        if from_day is None and to_day is None:
+            return list(index["rows"].get(user_id, ()))
+        days, rows = index["by_day"].get(user_id, ((), ()))
+        lo = 0 if from_day is None else bisect_left(days, from_day)
+        hi = len(days) if to_day is None else bisect_right(days, to_day)
+        return sorted(rows[lo:hi])
+
+
+def _indexed_day_bounds(user_id: str, tab: str):
+    """(first, last) dated day of user_id's rows in tab, or None."""
+    from expense_columns import NO_DATE
+
+    _refresh_row_index(tab)
+    with _row_index_lock:
+        days, _ = _tab_index(tab)["by_day"].get(user_id, ((), ()))
+        lo = bisect_right(days, NO_DATE)
+        return (days[lo], days[-1]) if lo < len(days) else None
+
+
+def _record_appended_rows(append_result, rows, tab: str = EXPENSES_TAB):
+    """Add rows written by append_row(s) to tab's index without another read."""
+    from expense_columns import parse_days
 
-def get_expenses(user_id: str, from_date: Optional[str] = None, to_date: Optional[str] = None):
-    if not user_id:
-        return []
     try:
-        ws = get_sheet(EXPENSES_TAB)
-        rows = ws.get_all_values()
-    except Exception:
-        return []
-    if len(rows) < 2:
-        return []
-    expenses = []
-    from_dt = datetime.min if not from_date else datetime.strptime(from_date[:10], "%Y-%m-%d")
-    to_dt = datetime.max if not to_date else datetime.strptime(to_date[:10], "%Y-%m-%d")
-    to_dt = to_dt.replace(hour=23, minute=59, second=59, microsecond=999999)
-    for i, row in enumerate(rows[1:]):
-        exp = _row_to_expense(row, i)
-        if exp["userId"] != user_id:
+        updated = append_result["updates"]["updatedRange"]
+        first_row = int(_UPDATED_RANGE_RE.search(updated).group(1))
+    except (KeyError, TypeError, AttributeError, ValueError):
+        reset_row_index(tab)
+        return
+    with _row_index_lock:
+        index = _row_index.get(tab)
+        known = index["row_count"] if index else None
+        # Only extend if nothing else was appended in between; else re-probe later.
+        if known is not None and first_row == known + 2:
+            days = parse_days([r[1] for r in rows])
+            for i, (row, day) in enumerate(zip(rows, days)):
+                _index_row(index, row[0], first_row + i, day)
+            # The sheet may store a value differently from how we sent it, so
+            # the checksum is taken from the next probe instead.
+            index.update(gen=next(_row_index_gens), row_count=known + len(rows), last_row=None)
+
+
+def _row_ranges(row_nums):
+    """Collapse sorted row numbers into (first, last) ranges of consecutive rows."""
+    ranges = []
+    start = prev = None
+    for n in row_nums:
+        if prev is not None and n == prev + 1:
+            prev = n
             continue
-        try:
-            d = datetime.strptime(exp["date"][:10], "%Y-%m-%d") if exp["date"] else datetime.min
-            if exp["time"]:
-                try:
-                    h, m = map(int, exp["time"].split(":")[:2])
-                    d = d.replace(hour=h, minute=m, second=0)
-                except (ValueError, IndexError):
-                    pass
-            if from_dt <= d <= to_dt:
-                expenses.append(exp)
-        except (ValueError, TypeError):
-            pass
-    return expenses
+        if start is not None:
+            ranges.append((start, prev))
+        start = prev = n
+    if start is not None:
+        ranges.append((start, prev))
+    return ranges
 
 
-def get_totals(user_id: str, ref_date: Optional[datetime] = None):
-    from datetime import timedelta
-    if not ref_date:
-        ref_date = datetime.now()
-    # Fetch from start of week (or month) to end of month
-    start_week = ref_date
-    while start_week.weekday() != 0:
-        start_week = start_week - timedelta(days=1)
-    start_week = start_week.replace(hour=0, minute=0, second=0, microsecond=0)
-    start_month = ref_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    fetch_from = min(start_week, start_month)
-    end_month = ref_date.replace(day=1) + timedelta(days=32)
-    end_month = (end_month.replace(day=1) - timedelta(days=1)).replace(hour=23, minute=59, second=59, microsecond=999999)
-    expenses = get_expenses(
-        user_id,
-        from_date=fetch_from.strftime("%Y-%m-%d"),
-        to_date=end_month.strftime("%Y-%m-%d"),
+def _range_batches(ranges, max_rows: Optional[int]):
+    """Group (first, last) row ranges into batch_get calls of at most
+    _ROW_INDEX_BATCH_RANGES ranges and, if given, about max_rows rows."""
+    batch, rows = [], 0
+    for a, b in ranges:
+        while max_rows and b - a + 1 > max_rows - rows:
+            # Split long runs so one call never returns much more than max_rows.
+            cut = a + max(max_rows - rows, 1) - 1
+            batch.append((a, cut))
+            yield batch
+            batch, rows, a = [], 0, cut + 1
+        if a <= b:
+            batch.append((a, b))
+            rows += b - a + 1
+        if len(batch) >= _ROW_INDEX_BATCH_RANGES or (max_rows and rows >= max_rows):
+            yield batch
+            batch, rows = [], 0
+    if batch:
+        yield batch
+
+
+def _user_row_pages(user_id: str, max_rows: Optional[int] = None, tab: str = EXPENSES_TAB,
+                    from_day: Optional[int] = None, to_day: Optional[int] = None, last_col: str = _ALL_COLUMNS):
+    """Yield lists of (sheet row number, raw row) for the indexed rows of user_id in tab
+    dated in [from_day, to_day] (all of them without bounds), one batch_get per list.
+
+    Only columns A:last_col are fetched.
+    """
+    row_nums = _indexed_rows(user_id, tab, from_day, to_day)
+    for chunk in _range_batches(_row_ranges(row_nums), max_rows):
+        names = [f"A{a}:{last_col}{b}" for a, b in chunk]
+        values = _read_sheet(tab, "batch_get", tuple(names))
+        page = []
+        for (a, b), block in zip(chunk, values):
+            block = list(block)
+            for offset in range(b - a + 1):
+                page.append((a + offset, list(block[offset]) if offset < len(block) else []))
+        yield page
+
+
+def _fetch_user_rows(user_id: str, tab: str = EXPENSES_TAB, from_day: Optional[int] = None,
+                     to_day: Optional[int] = None, last_col: str = _ALL_COLUMNS):
+    """(sheet row number, raw row) pairs for the indexed rows of user_id in tab in [from_day, to_day]."""
+    pages = _user_row_pages(user_id, tab=tab, from_day=from_day, to_day=to_day, last_col=last_col)
+    return [pair for page in pages for pair in page]
+
+
+def _user_rows_from_index(user_id: str, tab: str = EXPENSES_TAB, from_day: Optional[int] = None,
+                          to_day: Optional[int] = None, last_col: str = _ALL_COLUMNS):
+    rows = _fetch_user_rows(user_id, tab, from_day, to_day, last_col)
+    if any((row[0] if row else "") != user_id for _, row in rows):
+        # Rows moved under us (deleted or reordered in the sheet): rebuild once.
+        reset_row_index(tab)
+        rows = _fetch_user_rows(user_id, tab, from_day, to_day, last_col)
+    return rows
+
+
+def _query_written_expenses(user_id: str, from_day: Optional[int], to_day: Optional[int]):
+    from expense_columns import parse_expense_rows
+
+    mirror = _synced_expense_mirror(from_day, to_day)
+    if mirror is not None:
+        with span("mirror.expenses_for") as s:
+            found = mirror.expenses_for(user_id, *day_range(from_day, to_day))
+            s.set(rows=len(found))
+        return found
+    found = []
+    tabs = _expense_tabs(from_day, to_day)
+    for tab in tabs:
+        rows = _user_rows_from_index(user_id, tab, from_day, to_day)
+        base = _shard_base(tab)
+        with span("parse.expenses", rows=len(rows)):
+            cols = parse_expense_rows([r for _, r in rows], row_numbers=[base + n for n, _ in rows])
+            idx = cols.select(user_id, from_day, to_day)
+            found += zip(cols.day[idx].tolist(), cols.to_expenses(idx))
+    return _drop_copied_legacy(found) if len(tabs) > 1 else found
+
+
+def _pending_expenses(user_id: str, from_day: Optional[int], to_day: Optional[int]):
+    """(day, expense) pairs for this user's still-queued expenses in range (ids are negative queue ids)."""
+    from expense_columns import parse_expense_rows
+
+    pending = [(qid, row) for qid, row in _pending_expense_rows() if row[0] == user_id]
+    if not pending:
+        return []
+    cols = parse_expense_rows(
+        [["" if v is None else str(v) for v in row] for _, row in pending],
+        row_numbers=[-qid for qid, _ in pending],
     )
-    start_day = ref_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_day = ref_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    end_week = start_week + timedelta(days=6)
-    end_week = end_week.replace(hour=23, minute=59, second=59, microsecond=999999)
+    idx = cols.select(user_id, from_day, to_day)
+    return list(zip(cols.day[idx].tolist(), cols.to_expenses(idx)))
 
-    def dt(exp):
-        try:
-            d = datetime.strptime(exp["date"][:10], "%Y-%m-%d")
-            if exp.get("time"):
-                parts = exp["time"].split(":")
-                h, m = int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
-                d = d.replace(hour=h, minute=m, second=0)
-            return d
-        except (ValueError, TypeError, IndexError):
-            return datetime.min
 
-    daily = sum(e["amount"] for e in expenses if start_day <= dt(e) <= end_day)
-    weekly = sum(e["amount"] for e in expenses if start_week <= dt(e) <= end_week)
-    monthly = sum(e["amount"] for e in expenses if start_month <= dt(e) <= end_month)
-    return {"daily": daily, "weekly": weekly, "monthly": monthly}
+def _with_pending_expenses(found, user_id: str, from_day: Optional[int], to_day: Optional[int]):
+    """found plus this user's still-queued expenses in range."""
+    pending = _pending_expenses(user_id, from_day, to_day)
+    if not pending:
+        return found
+    # A just-flushed row can be in the mirror and the queue for a moment.
+    written = {e.created_at for _, e in found}
+    return found + [(day, e) for day, e in pending if e.created_at not in written]
+
+
+def get_expenses(user_id: str, from_date: Optional[str] = None, to_date: Optional[str] = None):
+    from expense_columns import day_number
+
+    if not user_id:
+        return []
+    from_day = day_number(from_date) if from_date else None
+    to_day = day_number(to_date) if to_date else None
+    return [e for _, e in _get_storage().read_expenses(user_id, from_day, to_day)]
+
+
+# Python equivalents of local_mirror.ORDER_BY, for rows sorted outside SQLite.
+_SORT_KEYS = {
+    "date": lambda item: (item[0], item[1].time, item[1].id),
+    "amount": lambda item: (item[1].amount, item[1].id),
+    "category": lambda item: (item[1].category, item[0], item[1].time, item[1].id),
+}
+
+
+def get_expense_page(user_id: str, from_date: Optional[str] = None, to_date: Optional[str] = None,
+                     sort: str = "date", descending: bool = True, offset: int = 0,
+                     limit: int = EXPENSE_PAGE_SIZE):
+    """One page of user_id's expenses in range, sorted by sort (one of EXPENSE_SORTS).
+
+    Returns {"total": expenses in range, "expenses": [...]}. With the mirror or
+    the SQLite backend the sort and slice run in SQLite, so only the page is
+    materialized; queued expenses are merged in.
+    """
+    from expense_columns import day_number
+
+    if sort not in EXPENSE_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(EXPENSE_SORTS)}")
+    if not user_id:
+        return {"total": 0, "expenses": []}
+    from_day = day_number(from_date) if from_date else None
+    to_day = day_number(to_date) if to_date else None
+    total, expenses = _get_storage().expense_page(user_id, from_day, to_day, sort, descending, offset, limit)
+    return {"total": total, "expenses": expenses}
+
+
+def _written_expense_pages(user_id: str, from_day: Optional[int], to_day: Optional[int], page_rows: int):
+    from expense_columns import parse_expense_rows
+
+    mirror = _synced_expense_mirror(from_day, to_day)
+    if mirror is not None:
+        yield from mirror.expense_pages(user_id, *day_range(from_day, to_day), page_size=page_rows)
+        return
+    # Month tabs first, so legacy rows already copied into one can be skipped.
+    tabs = _expense_tabs(from_day, to_day)
+    copied = set()
+    for tab in tabs[1:] + tabs[:1]:
+        base = _shard_base(tab)
+        for rows in _user_row_pages(user_id, max_rows=page_rows, tab=tab, from_day=from_day, to_day=to_day):
+            if any((row[0] if row else "") != user_id for _, row in rows):
+                # Rows moved under us; earlier pages may already be out of date.
+                reset_row_index(tab)
+                raise RuntimeError("The Expenses sheet changed during the export; please try again")
+            cols = parse_expense_rows([r for _, r in rows], row_numbers=[base + n for n, _ in rows])
+            page = cols.to_expenses(cols.select(user_id, from_day, to_day))
+            if tab != EXPENSES_TAB:
+                copied.update(e.created_at for e in page)
+            elif copied:
+                page = [e for e in page if _copy_key(e) not in copied]
+            yield page
+
+
+def iter_expense_pages(user_id: str, from_date: Optional[str] = None, to_date: Optional[str] = None,
+                       page_rows: int = DEFAULT_EXPORT_PAGE_ROWS):
+    """Yield the user's expenses in [from_date, to_date] as lists of about page_rows dicts.
+
+    Same rows and order as get_expenses, but read one page at a time (from
+    SQLite, or with paged batch_get calls) so memory stays bounded however much
+    history the user has. Errors are raised rather than swallowed.
+    """
+    from expense_columns import day_number
+
+    if not user_id:
+        return
+    from_day = day_number(from_date) if from_date else None
+    to_day = day_number(to_date) if to_date else None
+    yield from _get_storage().expense_pages(user_id, from_day, to_day, page_rows)
+
+
+def export_expenses(user_id: str, out, from_date: Optional[str] = None, to_date: Optional[str] = None,
+                    fmt: str = "csv") -> int:
+    """Write the user's expenses in range to the binary file out as "csv" or "parquet".
+
+    Returns the number of rows written. Parquet needs pyarrow (see
+    expense_export.parquet_available()).
+    """
+    pages = iter_expense_pages(user_id, from_date, to_date)
+    if fmt == "csv":
+        return write_csv(pages, out)
+    if fmt == "parquet":
+        return write_parquet(pages, out)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def _period_bounds(ref):
+    """Day numbers (first, last) of the day, Monday-based week and month containing ref."""
+    if isinstance(ref, datetime):
+        ref = ref.date()
+    start_week = ref - timedelta(days=ref.weekday())
+    start_month = ref.replace(day=1)
+    end_month = (start_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    to_day = lambda d: (d - _date(1970, 1, 1)).days  # noqa: E731
+    return {
+        "day": (to_day(ref), to_day(ref)),
+        "week": (to_day(start_week), to_day(start_week) + 6),
+        "month": (to_day(start_month), to_day(end_month)),
+    }
+
+
+def _cells_from_expenses(rows):
+    return [(day, e.category, e.payment_mode, e.amount, 1) for day, e in rows]
+
+
+def _indexed_cells(user_id: str, from_day: int, to_day: int, last_col: str):
+    """Cells for user_id in [from_day, to_day] from the sheet, reading only columns A:last_col
+    of the indexed rows. None when whole rows are needed after all."""
+    from expense_columns import parse_expense_rows
+
+    if _pending_expenses(user_id, from_day, to_day):
+        # Queued rows are told apart from just-flushed ones by Created (column H).
+        return None
+    found = []
+    for tab in _expense_tabs(from_day, to_day):
+        rows = _user_rows_from_index(user_id, tab, from_day, to_day, last_col)
+        if rows:
+            found.append((tab, rows))
+    if len(found) > 1 and found[0][0] == EXPENSES_TAB:
+        # Legacy rows may also have month-tab copies, again matched by Created.
+        return None
+    width = ord(last_col) - ord("A") + 1
+    cells = []
+    for _, rows in found:
+        with span("parse.cells", rows=len(rows)):
+            cols = parse_expense_rows([r for _, r in rows], row_numbers=[n for n, _ in rows], width=width)
+            cells += cols.cells(cols.select(user_id, from_day, to_day))
+    return cells
+
+
+def rebuild_rollups():
+    """Recompute the rollups from the raw expense tabs (a full re-read into the mirror).
+
+    With the SQLite backend, recomputes the store's rollups from its expenses.
+    """
+    _get_storage().rebuild_rollups()
+
+
+def _aggregate_cells(cells, bounds, periods, by_day):
+    """Add cells into periods[name] for each bounds[name] they fall in, and into
+    by_day (if given) for days of bounds["month"]."""
+    from expense_columns import day_string
+
+    month_first, month_last = bounds["month"] if by_day is not None else (0, -1)
+    for day, category, mode, amount, n in cells:
+        for name, (first, last) in bounds.items():
+            if first <= day <= last:
+                p = periods[name]
+                p["count"] += n
+                p["total"] += amount
+                p["by_category"][category] = p["by_category"].get(category, 0) + amount
+                p["by_payment_mode"][mode] = p["by_payment_mode"].get(mode, 0) + amount
+        if month_first <= day <= month_last:
+            key = day_string(day)
+            by_day[key] = by_day.get(key, 0) + amount
+
+
+def get_dashboard_snapshot(user_id: str, ref_date=None, include_expenses: bool = False):
+    """Everything the dashboard and expense views show, from a single read.
+
+    ref_date (date or datetime) defaults to today in IST. Returns::
+
+        {
+            "ref_date": "YYYY-MM-DD",
+            "totals": {"daily", "weekly", "monthly"},
+            "periods": {
+                "day" | "week" | "month": {
+                    "from", "to", "count", "total", "by_category", "by_payment_mode",
+                    "expenses",  # only with include_expenses=True
+                },
+            },
+            "by_day": {"YYYY-MM-DD": amount},   # days of the month that have spending
+        }
+
+    Without include_expenses the sums come from the rollups (see
+    Storage.rollup_cells) and no expense rows are read.
+    """
+    from expense_columns import day_string
+
+    if ref_date is None and user_id:
+        prefetched = _take_prefetched(user_id)
+        if prefetched is not None:
+            return prefetched
+    ref = ref_date or now_ist()
+    bounds = _period_bounds(ref)
+    periods = {
+        name: {
+            "from": day_string(first),
+            "to": day_string(last),
+            "count": 0,
+            "total": 0,
+            "by_category": {},
+            "by_payment_mode": {},
+        }
+        for name, (first, last) in bounds.items()
+    }
+    if include_expenses:
+        for p in periods.values():
+            p["expenses"] = []
+    by_day = {}
+    if user_id:
+        fetch_from = min(first for first, _ in bounds.values())
+        fetch_to = max(last for _, last in bounds.values())
+        storage = _get_storage()
+        if include_expenses:
+            rows = storage.read_expenses(user_id, fetch_from, fetch_to)
+            cells = _cells_from_expenses(rows)
+        else:
+            rows = []
+            cells = storage.rollup_cells(user_id, fetch_from, fetch_to)
+        with span("snapshot.aggregate", cells=len(cells)):
+            _aggregate_cells(cells, bounds, periods, by_day)
+        for day, e in rows:
+            for name, (first, last) in bounds.items():
+                if first <= day <= last:
+                    periods[name]["expenses"].append(e)
+    return {
+        "ref_date": day_string(bounds["day"][0]),
+        "totals": {
+            "daily": periods["day"]["total"],
+            "weekly": periods["week"]["total"],
+            "monthly": periods["month"]["total"],
+        },
+        "periods": periods,
+        "by_day": dict(sorted(by_day.items())),
+    }
+
+
+def get_range_summary(user_id: str, from_date: str, to_date: str):
+    """Count, total and per-category / per-payment-mode sums of user_id's expenses in [from_date, to_date].
+
+    Shaped like a get_dashboard_snapshot() period. Any range costs the same
+    as the dashboard's: rollups with the mirror, the date index without it.
+    """
+    from expense_columns import day_number
+
+    from_day, to_day = day_number(from_date), day_number(to_date)
+    period = {"from": from_date, "to": to_date, "count": 0, "total": 0, "by_category": {}, "by_payment_mode": {}}
+    if user_id:
+        cells = _get_storage().rollup_cells(user_id, from_day, to_day)
+        with span("snapshot.aggregate", cells=len(cells)):
+            _aggregate_cells(cells, {"range": (from_day, to_day)}, {"range": period}, None)
+    return period
+
+
+def get_expense_years(user_id: str):
+    """Years from user_id's first dated expense to this year (or their last, if later), newest first."""
+    from expense_columns import day_string
+
+    this_year = now_ist().year
+    bounds = _get_storage().day_bounds(user_id) if user_id else None
+    if bounds is None:
+        return [this_year]
+    first, last = int(day_string(bounds[0])[:4]), int(day_string(bounds[1])[:4])
+    return list(range(max(last, this_year), min(first, this_year) - 1, -1))
+
+
+def get_spending_analytics(user_id: str, ref_date=None):
+    """Monthly trends, rolling averages and period-over-period changes of user_id's
+    spending up to ref_date (today in IST by default); see analytics.analyze().
+
+    Reads the same cells as the dashboard sums, over the user's whole history.
+    """
+    from analytics import analyze
+    from expense_columns import day_number
+
+    ref = ref_date or now_ist()
+    if isinstance(ref, datetime):
+        ref = ref.date()
+    ref_day = day_number(ref.isoformat())
+    storage = _get_storage()
+    bounds = storage.day_bounds(user_id) if user_id else None
+    first_day = min(bounds[0], ref_day) if bounds else ref_day
+    cells = storage.rollup_cells(user_id, first_day, ref_day) if bounds else []
+    with span("analytics.analyze", cells=len(cells)):
+        return analyze(cells, first_day, ref_day)
+
+
+def get_totals(user_id: str, ref_date: Optional[datetime] = None):
+    """Today's, this week's and this month's totals ({"daily", "weekly", "monthly"}).
+
+    Only amounts are summed, so without the mirror just columns A:D of the
+    user's rows in those dates are read.
+    """
+    bounds = _period_bounds(ref_date or now_ist())
+    sums = dict.fromkeys(bounds, 0)
+    if user_id:
+        fetch_from = min(first for first, _ in bounds.values())
+        fetch_to = max(last for _, last in bounds.values())
+        cells = _get_storage().rollup_cells(user_id, fetch_from, fetch_to, amounts_only=True)
+        with span("totals.aggregate", cells=len(cells)):
+            for day, _, _, amount, _ in cells:
+                for name, (first, last) in bounds.items():
+                    if first <= day <= last:
+                        sums[name] += amount
+    return {"daily": sums["day"], "weekly": sums["week"], "monthly": sums["month"]}
 
 
 def add_expense(user_id: str, date: str, time: str, amount: float, category: str, payment_mode: str, notes: str):
     if not user_id:
         raise ValueError("User ID required")
-    ws = get_sheet(EXPENSES_TAB)
     row = [user_id, date, time, amount, category, payment_mode, notes, datetime.utcnow().isoformat() + "Z"]
-    ws.append_row(row, value_input_option="USER_ENTERED")
+    _get_storage().append_expenses([row])
+    cancel_prefetch(user_id)
+
+
+# --- Sheets backend ---
+
+
+class SheetsStorage(Storage):
+    """The Google Sheet. Reads come from the local mirror when it is enabled,
+    else from the sheet through the row index; appends go through the
+    write-behind queue, and rows still queued are merged into every read."""
+
+    # --- Expenses ---
+
+    def data_version(self, user_id: str):
+        bounds = _period_bounds(now_ist()).values()
+        from_day, to_day = min(first for first, _ in bounds), max(last for _, last in bounds)
+        mirror = _synced_expense_mirror(from_day, to_day)
+        if mirror is None:
+            for tab in _expense_tabs(from_day, to_day):
+                _refresh_row_index(tab)
+        synced = mirror.user_version(user_id) if mirror is not None else 0
+        with _versions_lock:
+            return _data_versions["epoch"], _data_versions["users"].get(user_id, 0), synced
+
+    def read_expenses(self, user_id: str, from_day, to_day):
+        found = _query_written_expenses(user_id, from_day, to_day)
+        return _with_pending_expenses(found, user_id, from_day, to_day)
+
+    def expense_page(self, user_id: str, from_day, to_day, sort: str, descending: bool, offset: int, limit: int):
+        key = _SORT_KEYS[sort]
+        mirror = _synced_expense_mirror(from_day, to_day)
+        if mirror is None:
+            rows = sorted(self.read_expenses(user_id, from_day, to_day), key=key, reverse=descending)
+            return len(rows), [e for _, e in rows[offset:offset + limit]]
+
+        lo, hi = day_range(from_day, to_day)
+        pending = _pending_expenses(user_id, from_day, to_day)
+        if pending:
+            written = mirror.written_created_at(user_id, lo, hi, [e.created_at for _, e in pending])
+            pending = [(day, e) for day, e in pending if e.created_at not in written]
+        with span("mirror.expense_page", sort=sort, offset=offset) as s:
+            if not pending:
+                total, rows = mirror.expense_page(user_id, lo, hi, ORDER_BY[sort, descending], offset, limit)
+            else:
+                # Queued rows can sort anywhere, so read the mirror from the top and merge.
+                total, rows = mirror.expense_page(user_id, lo, hi, ORDER_BY[sort, descending], 0, offset + limit)
+                rows = sorted(rows + pending, key=key, reverse=descending)[offset:offset + limit]
+                total += len(pending)
+            s.set(rows=len(rows), total=total)
+        return total, [e for _, e in rows]
+
+    def expense_pages(self, user_id: str, from_day, to_day, page_rows: int):
+        pending = [e for _, e in _pending_expenses(user_id, from_day, to_day)]
+        queued = {e.created_at for e in pending}
+        for page in _written_expense_pages(user_id, from_day, to_day, page_rows):
+            page = [e for e in page if e.created_at not in queued]
+            if page:
+                yield page
+        if pending:
+            yield pending
+
+    def rollup_cells(self, user_id: str, from_day: int, to_day: int, amounts_only: bool = False):
+        """From the mirror's rollups, so the cost follows days x categories rather
+        than rows; without the mirror, summed from raw rows, fetching only the
+        columns needed."""
+        mirror = _synced_expense_mirror(from_day, to_day)
+        if mirror is None:
+            cells = _indexed_cells(user_id, from_day, to_day, _TOTAL_COLUMNS if amounts_only else _CELL_COLUMNS)
+            if cells is None:
+                cells = _cells_from_expenses(self.read_expenses(user_id, from_day, to_day))
+            return cells
+        with span("mirror.rollups_for") as s:
+            cells = mirror.rollups_for(user_id, from_day, to_day)
+            s.set(cells=len(cells))
+        pending = _pending_expenses(user_id, from_day, to_day)
+        if pending:
+            written = mirror.written_created_at(user_id, from_day, to_day, [e.created_at for _, e in pending])
+            cells += _cells_from_expenses([(day, e) for day, e in pending if e.created_at not in written])
+        return cells
+
+    def day_bounds(self, user_id: str):
+        from expense_columns import NO_DATE
+
+        bounds = []
+        mirror = _synced_expense_mirror()
+        if mirror is not None:
+            bounds.append(mirror.day_bounds(user_id, NO_DATE))
+        else:
+            bounds += [_indexed_day_bounds(user_id, tab) for tab in _expense_tabs()]
+        pending = [day for day, _ in _pending_expenses(user_id, None, None) if day != NO_DATE]
+        if pending:
+            bounds.append((min(pending), max(pending)))
+        days = [d for b in bounds if b for d in b]
+        return (min(days), max(days)) if days else None
+
+    def append_expenses(self, rows, bulk: bool = False):
+        """Each row goes to its month's tab when sharded. Bulk rows skip the
+        queue and are appended with one call per tab."""
+        by_tab = {}
+        for row in rows:
+            by_tab.setdefault(expense_tab_for(row[1]), []).append(row)
+        for tab, tab_rows in by_tab.items():
+            if bulk:
+                _flush_appends(tab, tab_rows, recovered=False)
+            else:
+                for row in tab_rows:
+                    _append(tab, row)
+
+    def rebuild_rollups(self):
+        mirror = _get_mirror()
+        if mirror is None:
+            raise RuntimeError("Rollups are kept in the local mirror; enable it with MIRROR_ENABLED")
+        for tab in _expense_tabs():
+            _sync_tab(mirror, tab, full=True, max_staleness=None)
+        if _sharded():
+            # Per-tab resyncs adjust the rollups rather than recomputing them.
+            mirror.rebuild_rollups()
+
+    # --- Users ---
+
+    def users(self, fresh: bool = False):
+        """From the mirror if enabled, else the sheet, plus queued signups."""
+        mirror = _get_mirror()
+        if mirror is not None and fresh:
+            _sync_tab(mirror, USERS_TAB, full=False, max_staleness=None)
+        else:
+            mirror = _synced_mirror(USERS_TAB)
+        if mirror is not None:
+            users = mirror.all_users()
+        else:
+            rows = _read_sheet(USERS_TAB, "get_all_values")
+            users = [u for u in _rows_to_users(rows[1:]) if u]
+        pending = [u for u in _rows_to_users([row for _, row in _pending_rows(USERS_TAB)]) if u]
+        if pending:
+            written = {u["createdAt"] for u in users}
+            users += [u for u in pending if u["createdAt"] not in written]
+        return users
+
+    def append_user(self, row) -> bool:
+        _append(USERS_TAB, row)
+        return True
+
+    def set_password_hash(self, user_id: str, password_hash: str) -> bool:
+        return _update_password_cell(user_id, password_hash)
+
+    # --- Caches ---
+
+    def sync(self, full: bool = False):
+        mirror = _get_mirror()
+        if mirror is None:
+            return
+        for tab in [USERS_TAB] + _expense_tabs():
+            _sync_tab(mirror, tab, full=full, max_staleness=None)
+
+    def warm(self, from_day: int, to_day: int):
+        tabs = _expense_tabs(from_day, to_day)
+        if _get_mirror() is not None:
+            for tab in tabs:
+                _synced_mirror(tab)
+        else:
+            for tab in tabs:
+                _refresh_row_index(tab)
+
+
+_sheets_storage = SheetsStorage()
+
+
+# --- Login prefetch ---
+# prefetch_user() runs as soon as a password checks out. By the time the
+# post-login rerun renders the dashboard, get_dashboard_snapshot() can hand back
+# the prefetched snapshot (which also carries this week's and month's expenses)
+# and the mirror or row index is already warm.
+
+_prefetch_lock = threading.Lock()
+_prefetch = {"executor": None, "entries": {}}
+_prefetch_stats = {"started": 0, "used": 0, "late": 0, "expired": 0, "cancelled": 0, "skipped": 0, "failed": 0}
+
+
+def _get_prefetch_executor():
+    with _prefetch_lock:
+        if _prefetch["executor"] is None:
+            workers = int(_get_setting("PREFETCH_WORKERS", DEFAULT_PREFETCH_WORKERS))
+            _prefetch["executor"] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sheets-prefetch")
+        return _prefetch["executor"]
+
+
+def _run_prefetch(user_id: str, entry):
+    # Warm the read path first so a logout that lands meanwhile skips the rest.
+    bounds = _period_bounds(now_ist()).values()
+    _get_storage().warm(min(first for first, _ in bounds), max(last for _, last in bounds))
+    if entry["cancelled"].is_set():
+        return None
+    return get_dashboard_snapshot(user_id, now_ist(), include_expenses=True)
+
+
+def prefetch_user(user_id: str) -> bool:
+    """Start loading user_id's dashboard data in the background.
+
+    Returns False if prefetching is disabled (PREFETCH_WORKERS=0), already
+    running for this user, or too many prefetches are queued.
+    """
+    if not user_id or int(_get_setting("PREFETCH_WORKERS", DEFAULT_PREFETCH_WORKERS)) <= 0:
+        return False
+    max_pending = int(_get_setting("PREFETCH_MAX_PENDING", DEFAULT_PREFETCH_MAX_PENDING))
+    executor = _get_prefetch_executor()
+    with _prefetch_lock:
+        entries = _prefetch["entries"]
+        current = entries.get(user_id)
+        if current is not None and not current["future"].done():
+            return False
+        if sum(not e["future"].done() for e in entries.values()) >= max_pending:
+            _prefetch_stats["skipped"] += 1
+            return False
+        entry = {"cancelled": threading.Event(), "started_at": _time.time()}
+        entry["future"] = executor.submit(_run_prefetch, user_id, entry)
+        entries[user_id] = entry
+        _prefetch_stats["started"] += 1
+    return True
+
+
+def cancel_prefetch(user_id: str):
+    """Drop user_id's prefetch (on logout, or once their data changes); queued work never runs."""
+    with _prefetch_lock:
+        entry = _prefetch["entries"].pop(user_id, None)
+        if entry is None:
+            return
+        entry["cancelled"].set()
+        entry["future"].cancel()
+        _prefetch_stats["cancelled"] += 1
+
+
+def _drop_prefetch(user_id: str, entry):
+    with _prefetch_lock:
+        if _prefetch["entries"].get(user_id) is entry:
+            del _prefetch["entries"][user_id]
+
+
+def _take_prefetched(user_id: str):
+    """user_id's prefetched snapshot, if ready within PREFETCH_WAIT_SECONDS; else None.
+
+    Only get_dashboard_snapshot calls this. The entry is dropped once used,
+    failed or expired; one still running is left for a later rerun.
+    """
+    with _prefetch_lock:
+        entry = _prefetch["entries"].get(user_id)
+    if entry is None:
+        return None
+    ttl = float(_get_setting("PREFETCH_TTL_SECONDS", DEFAULT_PREFETCH_TTL_SECONDS))
+    remaining = entry["started_at"] + ttl - _time.time()
+    if remaining <= 0:
+        _drop_prefetch(user_id, entry)
+        entry["future"].cancel()
+        _prefetch_stats["expired"] += 1
+        return None
+    wait = float(_get_setting("PREFETCH_WAIT_SECONDS", DEFAULT_PREFETCH_WAIT_SECONDS))
+    try:
+        snapshot = entry["future"].result(timeout=min(wait, remaining))
+    except FutureTimeoutError:
+        _prefetch_stats["late"] += 1
+        return None
+    except Exception:
+        # The caller's own read reports any real error.
+        _drop_prefetch(user_id, entry)
+        _prefetch_stats["failed"] += 1
+        return None
+    _drop_prefetch(user_id, entry)
+    if snapshot is None or snapshot["ref_date"] != now_ist().date().isoformat():
+        return None
+    _prefetch_stats["used"] += 1
+    return snapshot
+
+
+def get_prefetch_stats():
+    with _prefetch_lock:
+        return dict(_prefetch_stats, pending=sum(not e["future"].done() for e in _prefetch["entries"].values()))
+
+
+# --- Startup warmup ---
+# A new process renders its first page without the Sheets client. Right after
+# that, one background thread imports what later pages need (modules passed in
+# by app.py) and loads the user index, opening the client on the way, so the
+# first login pays for neither.
+
+_warmup_lock = threading.Lock()
+_warmup = {"started": False}
+
+
+def warm_up(modules=()) -> bool:
+    """Start the warmup thread unless it already ran in this process (or STARTUP_WARMUP is off)."""
+    if not _get_bool_setting("STARTUP_WARMUP", DEFAULT_STARTUP_WARMUP):
+        return False
+    with _warmup_lock:
+        if _warmup["started"]:
+            return False
+        _warmup["started"] = True
+    threading.Thread(target=_run_warm_up, args=(tuple(modules),), name="warm-up", daemon=True).start()
+    return True
+
+
+def _run_warm_up(modules):
+    started = _time.perf_counter()
+    try:
+        for name in modules:
+            importlib.import_module(name)
+        _reload_user_index(_time.time())
+    except Exception:
+        return  # the first login does the work instead, and reports any error
+    startup.record_first("warm_up", started)
+
+
+# --- Statement import ---
+
+
+def _drop_duplicates(expenses, existing: Counter, stats):
+    """Skip expenses matching an existing (date, amount), each existing row matching once."""
+    for e in expenses:
+        key = (e["date"], int(round(e["amount"] * 100)))
+        if existing[key] > 0:
+            existing[key] -= 1
+            stats["duplicates"] += 1
+            continue
+        yield e
+
+
+def import_statement(user_id: str, lines, chunk_rows: int = DEFAULT_IMPORT_CHUNK_ROWS):
+    """Import debits from a bank/UPI statement CSV, yielding progress after each chunk written.
+
+    lines is any iterable of CSV text lines (e.g. a text wrapper around the
+    upload); it is streamed, never loaded whole. Debits that match one of the
+    user's existing expenses on date and amount are skipped, so re-importing a
+    statement adds nothing. Each yield is a dict of running counts: "read",
+    "imported", "duplicates", "credits", "invalid" and "chunks". Raises
+    StatementFormatError if no usable header row is found.
+    """
+    from expense_columns import NO_DATE, day_string
+
+    if not user_id:
+        raise ValueError("User ID required")
+    storage = _get_storage()
+    existing = Counter(
+        (day_string(day), int(round(e.amount * 100)))
+        for day, e in storage.read_expenses(user_id, None, None)
+        if day != NO_DATE
+    )
+    stats = {"read": 0, "imported": 0, "duplicates": 0, "credits": 0, "invalid": 0, "chunks": 0}
+    expenses = to_expenses(read_statement(lines), CATEGORIES, PAYMENT_MODES, stats)
+    rows = (
+        [user_id, e["date"], e["time"], e["amount"], e["category"], e["paymentMode"], e["notes"],
+         datetime.utcnow().isoformat() + "Z"]
+        for e in _drop_duplicates(expenses, existing, stats)
+    )
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            break
+        storage.append_expenses(chunk, bulk=True)
+        cancel_prefetch(user_id)
+        stats["imported"] += len(chunk)
+        stats["chunks"] += 1
+        yield dict(stats)
+    if not stats["chunks"]:
+        yield dict(stats)
+
+
+# --- Shard migration ---
+# Copies the legacy Expenses tab into month tabs while the app keeps running
+# with EXPENSES_SHARDING=month. Reads skip legacy rows once their copy exists,
+# so nothing is counted twice mid-way; prune_legacy_expenses() then deletes the
+# copied rows from the legacy tab.
+
+
+def _migration_state_path(state_path: Optional[str]):
+    return state_path or os.path.join(tempfile.gettempdir(), f"expense_tracker_shard_migration_{_get_sheet_id()}.json")
+
+
+def migrate_legacy_expenses(batch_rows: int = DEFAULT_SHARD_MIGRATION_BATCH_ROWS, state_path: Optional[str] = None):
+    """Copy legacy expense rows into their month tabs, yielding progress after each batch.
+
+    Resumable: the next legacy row to read is saved to state_path after every
+    batch, and a row whose copy is already in its month tab (matched on userId
+    and createdAt) is never copied twice. Rows without a usable date stay in the
+    legacy tab. Progress dicts have "next_row", "copied", "already_copied" and
+    "undated".
+    """
+    from expense_columns import NO_DATE, day_string, parse_expense_rows
+
+    if not _sharded():
+        raise RuntimeError("Set EXPENSES_SHARDING=month (for the app too) before migrating")
+    path = _migration_state_path(state_path)
+    state = {"next_row": 2}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    stats = {"next_row": state["next_row"], "copied": 0, "already_copied": 0, "undated": 0}
+    existing = {}  # month tab -> (userId, createdAt) of the rows already in it
+    width = _tab_width(EXPENSES_TAB)
+    while True:
+        first = state["next_row"]
+        rows = _read_sheet(EXPENSES_TAB, "get", f"A{first}:{_col_letter(width)}{first + batch_rows - 1}")
+        if not rows:
+            break
+        rows = [list(r) + [""] * (width - len(r)) for r in rows]
+        days = parse_expense_rows(rows, first).days()
+        by_tab = {}
+        for i, (row, day) in enumerate(zip(rows, days)):
+            if not row[0]:
+                continue
+            if day is None or day == NO_DATE:
+                stats["undated"] += 1
+                continue
+            tab = expense_tab_for(day_string(day))
+            if tab not in existing:
+                _ensure_shard(tab)
+                existing[tab] = _row_keys(tab)
+            copy = row[:width - 1] + [row[width - 1] or f"{LEGACY_KEY_PREFIX}{first + i}"]
+            # createdAt has millisecond resolution, so two users can share one.
+            key = (copy[0], copy[-1])
+            if key in existing[tab]:
+                stats["already_copied"] += 1
+                continue
+            existing[tab].add(key)
+            by_tab.setdefault(tab, []).append(copy)
+        for tab, copies in by_tab.items():
+            _flush_appends(tab, copies, recovered=False)
+            stats["copied"] += len(copies)
+        state["next_row"] = first + len(rows)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        stats["next_row"] = state["next_row"]
+        yield dict(stats)
+    yield dict(stats)
+
+
+def prune_legacy_expenses(state_path: Optional[str] = None) -> int:
+    """Delete legacy rows that have a month-tab copy; returns how many were deleted.
+
+    Only runs once migrate_legacy_expenses() has read the whole legacy tab.
+    Deleting shifts the remaining rows, so the mirror's copy of the legacy tab
+    and the row index are rebuilt afterwards.
+    """
+    from expense_columns import NO_DATE, day_string, parse_expense_rows
+
+    path = _migration_state_path(state_path)
+    if not os.path.exists(path):
+        raise RuntimeError("Run the migration first")
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    width = _tab_width(EXPENSES_TAB)
+    rows = _read_sheet(EXPENSES_TAB, "get_all_values")[1:]
+    if len(rows) + 2 > state["next_row"]:
+        raise RuntimeError("Rows were added to the legacy tab since the migration ran; run it again first")
+    copied = {tab: _row_keys(tab) for tab in _expense_tabs()[1:]}
+    doomed = []
+    days = parse_expense_rows([list(r) + [""] * (width - len(r)) for r in rows]).days()
+    for i, (row, day) in enumerate(zip(rows, days)):
+        if not row or not row[0] or day is None or day == NO_DATE:
+            continue
+        key = (row[0], (row[width - 1] if len(row) >= width else "") or f"{LEGACY_KEY_PREFIX}{i + 2}")
+        if key in copied.get(expense_tab_for(day_string(day)), ()):
+            doomed.append(i + 2)
+    # Bottom up, so earlier row numbers stay valid. Deletes are not retried
+    # (a replay would remove other rows); after a failure, run this again.
+    try:
+        for first, last in reversed(_row_ranges(doomed)):
+            _with_sheet(EXPENSES_TAB, lambda ws: ws.delete_rows(first, last), idempotent=False)
+    finally:
+        reset_row_index(EXPENSES_TAB)
+    mirror = _get_mirror()
+    if mirror is not None:
+        _sync_tab(mirror, EXPENSES_TAB, full=True, max_staleness=None)
+    os.remove(path)
+    return len(doomed)
+
+
+# --- SQLite migration ---
+
+
+def copy_sheet_to_sqlite(path: Optional[str] = None):
+    """Copy every user and expense from the sheet into a new SQLite store at path.
+
+    path defaults to SQLITE_DB_PATH and must not already hold data. Queued
+    writes are flushed first. Expense tabs are read the way the mirror syncs
+    them, so month tabs and not-yet-pruned legacy copies come out as the app
+    shows them. Returns {"users", "expenses"} counts. Point STORAGE_BACKEND at
+    sqlite afterwards; rows added to the sheet after the copy are not carried over.
+    """
+    if _storage_backend() != "sheets":
+        raise RuntimeError("Copying reads the sheet; run it with STORAGE_BACKEND=sheets")
+    store = _open_sqlite_storage(path).store
+    if not store.is_empty():
+        raise RuntimeError(f"{store.path} already holds data")
+    flush_writes()
+    for tab in [USERS_TAB] + _expense_tabs():
+        _sync_tab(store, tab, full=True, max_staleness=None)
+    if _sharded():
+        store.rebuild_rollups()
+    return {"users": len(store.all_users()), "expenses": store.expense_count()}
@@ -0,0 +1,148 @@
+"""SQLite as the primary store, in place of the Google Sheet (STORAGE_BACKEND=sqlite).
+
+SqliteStore is the mirror's database used as the source of truth: the same
+tables, indexes (expenses by user, day and time, users by email) and rollups.
+Rows are written here directly instead of being appended to the sheet, and the
+file is never emptied on a mismatch the way a mirror is. SqliteStorage serves
+the storage.Storage interface from it.
+
+Unlike the sheet (and so the mirror), the store holds each email once: its
+email index is UNIQUE, so two processes signing up the same email at once
+can't both succeed.
+
+Expense and user ids continue the sheet's row numbers, so a store migrated
+from a sheet (sheets_helper.copy_sheet_to_sqlite) keeps the ids it had.
+"""
+import sqlite3
+
+from instrumentation import span
+from local_mirror import ORDER_BY, LocalMirror
+from storage import Storage, day_range
+
+# Stands in for the sheet id in the meta table.
+STORE_ID = "sqlite-store"
+
+class SqliteStore(LocalMirror):
+    """Authoritative expenses and users in one SQLite file, shared by every session and process."""
+
+    _disposable = False
+
+    def __init__(self, path: str, pool_size: int = 4):
+        super().__init__(path, STORE_ID, pool_size)
+
+    def _create_schema(self, conn):
+        super()._create_schema(conn)
+        if not any(i["name"] == "users_email" and i["unique"] for i in conn.execute("PRAGMA index_list(users)")):
+            # A store created before the index was UNIQUE may hold an email
+            # twice. Lookups only ever found its first row, so the later ones go.
+            conn.execute("DELETE FROM users WHERE row NOT IN (SELECT MIN(row) FROM users GROUP BY email)")
+            conn.execute("DROP INDEX users_email")
+            conn.execute("CREATE UNIQUE INDEX users_email ON users (email)")
+
+    @staticmethod
+    def _insert_users(conn, users):
+        # A copied sheet may list an email twice; keep its first row, the one lookups resolve to.
+        conn.executemany(
+            "INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?, ?)",
+            ((row, u["userId"], u["email"], u["passwordHash"], u["createdAt"]) for row, u in users),
+        )
+
+    @staticmethod
+    def _next_row(conn, table: str) -> int:
+        # Row 1 is the sheet's header, so data starts at 2 as it does there.
+        return (conn.execute(f"SELECT MAX(row) FROM {table}").fetchone()[0] or 1) + 1
+
+    def add_expense_rows(self, rows):
+        """Store sheet-layout expense rows (UserId .. Created); returns their ids."""
+        from expense_columns import parse_expense_rows
+
+        rows = [[("" if v is None else str(v)) for v in r] for r in rows]
+        if not rows:
+            return []
+        with self._writing() as conn:
+            first = self._next_row(conn, "expenses")
+            cols = parse_expense_rows(rows, first)
+            records = list(zip(cols.to_expenses(), cols.days()))
+            self._insert_expenses(conn, records)
+            self._add_to_rollups(conn, records, sign=1)
+            self._bump_versions(conn, [r[0] for r in rows])
+        return list(range(first, first + len(rows)))
+
+    def add_user_rows(self, rows):
+        """Store sheet-layout user rows (UserId, Email, PasswordHash, CreatedAt).
+
+        Raises sqlite3.IntegrityError, storing none of them, if an email is already taken.
+        """
+        with self._writing() as conn:
+            first = self._next_row(conn, "users")
+            conn.executemany(
+                "INSERT INTO users VALUES (?, ?, ?, ?, ?)",
+                ((first + i, r[0], r[1].strip().lower(), r[2], r[3]) for i, r in enumerate(rows)),
+            )
+
+    def expense_count(self) -> int:
+        with self._reading() as conn:
+            return conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def is_empty(self) -> bool:
+        with self._reading() as conn:
+            return not any(
+                conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in ("expenses", "users")
+            )
+
+
+class SqliteStorage(Storage):
+    """Every read and write goes straight to a SqliteStore; there is nothing to sync or queue."""
+
+    def __init__(self, store: SqliteStore):
+        self.store = store
+
+    def data_version(self, user_id: str):
+        return self.store.user_version(user_id)
+
+    def read_expenses(self, user_id: str, from_day, to_day):
+        with span("store.expenses_for") as s:
+            found = self.store.expenses_for(user_id, *day_range(from_day, to_day))
+            s.set(rows=len(found))
+        return found
+
+    def expense_page(self, user_id: str, from_day, to_day, sort: str, descending: bool, offset: int, limit: int):
+        with span("store.expense_page", sort=sort, offset=offset) as s:
+            total, rows = self.store.expense_page(
+                user_id, *day_range(from_day, to_day), ORDER_BY[sort, descending], offset, limit
+            )
+            s.set(rows=len(rows), total=total)
+        return total, [e for _, e in rows]
+
+    def expense_pages(self, user_id: str, from_day, to_day, page_rows: int):
+        return self.store.expense_pages(user_id, *day_range(from_day, to_day), page_size=page_rows)
+
+    def rollup_cells(self, user_id: str, from_day: int, to_day: int, amounts_only: bool = False):
+        with span("store.rollups_for") as s:
+            cells = self.store.rollups_for(user_id, from_day, to_day)
+            s.set(cells=len(cells))
+        return cells
+
+    def day_bounds(self, user_id: str):
+        from expense_columns import NO_DATE
+
+        return self.store.day_bounds(user_id, NO_DATE)
+
+    def append_expenses(self, rows, bulk: bool = False):
+        self.store.add_expense_rows(rows)
+
+    def rebuild_rollups(self):
+        self.store.rebuild_rollups()
+
+    def users(self, fresh: bool = False):
+        return self.store.all_users()
+
+    def append_user(self, row) -> bool:
+        try:
+            self.store.add_user_rows([row])
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def set_password_hash(self, user_id: str, password_hash: str) -> bool:
+        return self.store.set_password_hash(user_id, password_hash)
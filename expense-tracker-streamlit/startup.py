@@ -0,0 +1,63 @@
+"""Cold-start timings (reported when STARTUP_PROFILE is on).
+
+Streamlit re-executes app.py on every rerun, but the modules it imports are
+loaded once per process, so only the first run pays for them. app.py imports
+this module before its other modules and asks run_started() when the run
+began. The first time its imports finish and the first time each page
+finishes rendering are kept here for the life of the process:
+
+    imports            first run: start of app.py -> imports done
+    first_paint.auth   first run that rendered the login page, start -> end
+    first_paint.<page> same for dashboard / add / expenses / import
+    warm_up            the background warmup thread (sheets_helper.warm_up)
+
+With STARTUP_PROFILE on they are also logged to expense_tracker.startup and
+shown under the page to users listed in DEBUG_PANEL_EMAILS. Time the server
+spends booting before the first run is not included.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger("expense_tracker.startup")
+
+# When app.py's first run got here; nothing before it imports anything slow.
+_imported_at = time.perf_counter()
+
+_lock = threading.Lock()
+_state = {"enabled": False, "first_run": True}
+_timings = {}  # name -> ms, first occurrence in this process
+
+
+def configure(enabled: bool):
+    _state["enabled"] = enabled
+
+
+def enabled() -> bool:
+    return _state["enabled"]
+
+
+def run_started() -> float:
+    """perf_counter() at the start of the current app.py run: this module's import
+    on the first run (so its imports are counted), now on every later one."""
+    with _lock:
+        first, _state["first_run"] = _state["first_run"], False
+    return _imported_at if first else time.perf_counter()
+
+
+def record_first(name: str, started: float):
+    """Keep the time since started (a time.perf_counter() value) under name,
+    unless name was already recorded in this process."""
+    ms = round((time.perf_counter() - started) * 1000, 1)
+    with _lock:
+        if name in _timings:
+            return
+        _timings[name] = ms
+    if _state["enabled"]:
+        logger.info("%s: %.1f ms", name, ms)
+
+
+def timings():
+    """{name: ms} recorded so far, in the order they happened."""
+    with _lock:
+        return dict(_timings)
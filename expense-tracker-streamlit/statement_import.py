@@ -0,0 +1,220 @@
+"""Parsing bank/UPI statement CSVs into expense rows.
+
+Every stage is a generator over the file, so memory does not depend on its
+size: read_statement() finds the header and yields one dict per CSV row,
+to_expenses() keeps debits and maps them onto the app's categories and payment
+modes. sheets_helper.import_statement() dedupes and writes the result.
+"""
+import csv
+import re
+from datetime import datetime
+
+# How far into the file to look for the header row (banks put account details above it).
+MAX_PREAMBLE_ROWS = 30
+
+_DATE_HEADERS = ("transaction date", "txn date", "tran date", "value date", "date")
+_TIME_HEADERS = ("transaction time", "txn time", "time")
+_DESCRIPTION_HEADERS = ("description", "narration", "particulars", "remarks", "details", "transaction details", "merchant", "name")
+_DEBIT_HEADERS = ("withdrawal amt", "withdrawal amount", "withdrawal", "debit amount", "debit", "dr amount", "dr", "paid", "spent")
+_AMOUNT_HEADERS = ("transaction amount", "amount (inr)", "amount(inr)", "amount")
+_TYPE_HEADERS = ("transaction type", "txn type", "type", "dr/cr", "cr/dr", "debit/credit")
+_CATEGORY_HEADERS = ("category",)
+_MODE_HEADERS = ("payment mode", "mode", "payment method", "instrument")
+
+_DATE_FORMATS = (
+    "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d-%m-%y",
+    "%d-%b-%Y", "%d %b %Y", "%d-%b-%y", "%d %b %y", "%d %B %Y", "%b %d, %Y",
+)
+_TIME_FORMATS = ("%H:%M:%S", "%H:%M", "%I:%M %p", "%I:%M:%S %p")
+
+CATEGORY_KEYWORDS = {
+    "Food": ("swiggy", "zomato", "restaurant", "cafe", "coffee", "dominos", "mcdonald", "kfc", "pizza",
+             "bakery", "food", "blinkit", "zepto", "bigbasket", "grocer", "dine"),
+    "Transport": ("uber", "ola", "rapido", "metro", "irctc", "railway", "petrol", "fuel", "fastag",
+                  "redbus", "cab", "parking", "indigo", "air india"),
+    "Shopping": ("amazon", "flipkart", "myntra", "ajio", "meesho", "nykaa", "mall", "store", "mart", "decathlon"),
+    "Bills": ("electricity", "bill", "recharge", "airtel", "jio", "vodafone", "broadband", "dth",
+              "insurance", "rent", "emi", "water", "gas"),
+    "Entertainment": ("netflix", "spotify", "hotstar", "prime video", "bookmyshow", "pvr", "inox",
+                      "youtube", "steam", "playstation"),
+    "Health": ("pharmacy", "apollo", "medplus", "hospital", "clinic", "1mg", "pharmeasy", "netmeds",
+               "doctor", "diagnostic", "lab"),
+}
+
+MODE_KEYWORDS = (
+    ("UPI", ("upi", "vpa", "gpay", "phonepe", "bhim", "paytm")),
+    ("Card", ("pos", "card", "visa", "mastercard", "rupay", "ecom")),
+    ("Net Banking", ("neft", "imps", "rtgs", "netbanking", "net banking", "ib/", "ibfund")),
+    ("Cash", ("atm", "cash")),
+)
+
+_NUMBER_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+def _keyword_re(words):
+    # Match at the start of a word so "ola" doesn't fire on "Motorola".
+    return re.compile(r"(?<![a-z0-9])(?:" + "|".join(re.escape(w) for w in words) + ")")
+
+
+_CATEGORY_RES = [(category, _keyword_re(words)) for category, words in CATEGORY_KEYWORDS.items()]
+_MODE_RES = [(mode, _keyword_re(words)) for mode, words in MODE_KEYWORDS]
+
+
+class StatementFormatError(ValueError):
+    """The file does not look like a statement we can read."""
+
+
+def _find(headers, names):
+    for name in names:
+        if name in headers:
+            return headers.index(name)
+    return None
+
+
+def _header_columns(row):
+    headers = [h.strip().lower() for h in row]
+    cols = {
+        "date": _find(headers, _DATE_HEADERS),
+        "time": _find(headers, _TIME_HEADERS),
+        "description": _find(headers, _DESCRIPTION_HEADERS),
+        "debit": _find(headers, _DEBIT_HEADERS),
+        "amount": _find(headers, _AMOUNT_HEADERS),
+        "type": _find(headers, _TYPE_HEADERS),
+        "category": _find(headers, _CATEGORY_HEADERS),
+        "mode": _find(headers, _MODE_HEADERS),
+    }
+    if cols["date"] is None or (cols["debit"] is None and cols["amount"] is None):
+        return None
+    return cols
+
+
+def read_statement(lines):
+    """Yield {"line", "date", "time", "description", "debit", "amount", "type", "category", "mode"}
+    (raw strings, "" when the column is absent) for each row after the header."""
+    reader = csv.reader(lines)
+    cols = None
+    for _ in range(MAX_PREAMBLE_ROWS):
+        row = next(reader, None)
+        if row is None:
+            break
+        cols = _header_columns(row)
+        if cols:
+            break
+    if not cols:
+        raise StatementFormatError("Could not find a header row with a date and an amount/debit column")
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield dict(
+            {k: (row[i].strip() if i is not None and i < len(row) else "") for k, i in cols.items()},
+            line=reader.line_num,
+        )
+
+
+def parse_amount(text: str):
+    """Amount as a float, or None. Handles 1,234.50, ₹/Rs/INR prefixes, (123) and trailing Dr/Cr."""
+    if not text:
+        return None
+    t = text.strip()
+    negative = t.startswith("(") and t.endswith(")")
+    lowered = t.lower()
+    if lowered.endswith("dr"):
+        negative = True
+    m = _NUMBER_RE.search(t.replace(" ", ""))
+    if not m:
+        return None
+    value = float(m.group(0).replace(",", ""))
+    return -abs(value) if negative else value
+
+
+def parse_date(text: str):
+    """YYYY-MM-DD for the date part of text, or None."""
+    text = text.strip()
+    for candidate in (text, text.split(" ")[0], text.split("T")[0]):
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, fmt).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    return None
+
+
+def parse_time(time_text: str, date_text: str = ""):
+    """HH:MM from a time column, or from a time part of the date column; "" if none."""
+    candidates = [time_text.strip()] if time_text else []
+    if " " in date_text.strip():
+        candidates.append(date_text.strip().split(" ", 1)[1])
+    for candidate in candidates:
+        for fmt in _TIME_FORMATS:
+            try:
+                return datetime.strptime(candidate, fmt).strftime("%H:%M")
+            except ValueError:
+                continue
+    return ""
+
+
+def categorize(description: str, categories, hint: str = ""):
+    """Pick one of categories: an explicit category column wins, then keywords, else "Other"."""
+    for c in categories:
+        if hint and hint.lower() == c.lower():
+            return c
+    text = description.lower()
+    for category, pattern in _CATEGORY_RES:
+        if category in categories and pattern.search(text):
+            return category
+    return "Other" if "Other" in categories else categories[-1]
+
+
+def payment_mode_for(description: str, payment_modes, hint: str = ""):
+    for m in payment_modes:
+        if hint and hint.lower() == m.lower():
+            return m
+    text = (hint + " " + description).lower()
+    for mode, pattern in _MODE_RES:
+        if mode in payment_modes and pattern.search(text):
+            return mode
+    return "Other" if "Other" in payment_modes else payment_modes[-1]
+
+
+def _debit_amount(rec):
+    """Spend for this row, or None for credits/unreadable amounts.
+
+    A debit/withdrawal column is used when present. A single Amount column
+    counts as spend when negative, or when a type column marks it as a debit.
+    """
+    if rec["debit"] or rec["amount"] == "":
+        value = parse_amount(rec["debit"])
+        return abs(value) if value else None
+    value = parse_amount(rec["amount"])
+    if not value:
+        return None
+    kind = rec["type"].lower()
+    if kind:
+        return abs(value) if kind.startswith(("d", "paid", "sent", "withdraw", "purchase")) else None
+    return abs(value) if value < 0 else None
+
+
+def to_expenses(records, categories, payment_modes, stats):
+    """Yield {"date", "time", "amount", "category", "paymentMode", "notes"} for each debit.
+
+    stats (a dict) is updated in place: "read", "credits" and "invalid" counts.
+    """
+    for rec in records:
+        stats["read"] += 1
+        date = parse_date(rec["date"])
+        amount = _debit_amount(rec)
+        if date is None:
+            stats["invalid"] += 1
+            continue
+        if amount is None:
+            stats["credits"] += 1
+            continue
+        description = rec["description"]
+        yield {
+            "date": date,
+            "time": parse_time(rec["time"], rec["date"]),
+            "amount": round(amount, 2),
+            "category": categorize(description, categories, rec["category"]),
+            "paymentMode": payment_mode_for(description, payment_modes, rec["mode"]),
+            "notes": description[:200],
+        }
@@ -0,0 +1,98 @@
+"""The storage interface: where expenses and users are read from and written to.
+
+sheets_helper does every read and write through one Storage, picked from
+STORAGE_BACKEND in sheets_helper._get_storage(): sheets_helper.SheetsStorage
+(the Google Sheet, with its mirror, row index and write-behind queue) or
+sqlite_store.SqliteStorage. Caching, user lookup, sums and exports sit above
+this interface and are the same for every backend.
+
+Expenses are expense_columns records and users are dicts with userId, email,
+passwordHash and createdAt. Rows to append use the sheet's column layout.
+Days are day numbers (see expense_columns.day_number); None leaves that end of
+a range open.
+"""
+
+# Upper bound standing in for an open-ended range.
+LAST_DAY = 2 ** 63 - 1
+
+
+def day_range(from_day, to_day):
+    """(from_day, to_day) with open (None) ends replaced by the lowest and highest day."""
+    from expense_columns import NO_DATE
+
+    return (NO_DATE if from_day is None else from_day, LAST_DAY if to_day is None else to_day)
+
+
+class Storage:
+    """Expenses and users of every user. Implementations must be safe to share between threads."""
+
+    # --- Expenses ---
+
+    def data_version(self, user_id: str):
+        """A value that changes whenever user_id's expenses may have changed."""
+        raise NotImplementedError
+
+    def read_expenses(self, user_id: str, from_day, to_day):
+        """(day, expense) pairs of user_id in [from_day, to_day], in the order they were added."""
+        raise NotImplementedError
+
+    def expense_page(self, user_id: str, from_day, to_day, sort: str, descending: bool, offset: int, limit: int):
+        """(expenses in range, one page of them) sorted by sort ("date", "amount" or "category")."""
+        raise NotImplementedError
+
+    def expense_pages(self, user_id: str, from_day, to_day, page_rows: int):
+        """Yield read_expenses' expenses (without days) as lists of about page_rows."""
+        raise NotImplementedError
+
+    def rollup_cells(self, user_id: str, from_day: int, to_day: int, amounts_only: bool = False):
+        """(day, category, payment mode, total, count) sums of user_id's expenses in [from_day, to_day].
+
+        With amounts_only the category and payment mode may be left "".
+        """
+        raise NotImplementedError
+
+    def day_bounds(self, user_id: str):
+        """(first, last) day of user_id's dated expenses, or None if they have none."""
+        raise NotImplementedError
+
+    def append_expenses(self, rows, bulk: bool = False):
+        """Add expense rows (UserId .. Created).
+
+        bulk marks a large batch (a statement import) that should be written in
+        as few calls as possible rather than queued row by row.
+        """
+        raise NotImplementedError
+
+    def rebuild_rollups(self):
+        """Recompute the sums rollup_cells reads from the expenses themselves."""
+        raise NotImplementedError
+
+    # --- Users ---
+
+    def users(self, fresh: bool = False):
+        """Every user, oldest first; errors propagate.
+
+        fresh skips any local copy that may lag other processes' signups.
+        """
+        raise NotImplementedError
+
+    def append_user(self, row) -> bool:
+        """Add a user row (UserId, Email, PasswordHash, CreatedAt).
+
+        False if the backend refused it because the email is already taken.
+        Backends that can't check that (the sheet) always return True.
+        """
+        raise NotImplementedError
+
+    def set_password_hash(self, user_id: str, password_hash: str) -> bool:
+        """Store user_id's new hash; False if there is no such user (yet)."""
+        raise NotImplementedError
+
+    # --- Caches ---
+    # For backends that keep local copies; the defaults do nothing.
+
+    def sync(self, full: bool = False):
+        """Bring local copies up to date now (full: re-read everything)."""
+
+    def warm(self, from_day: int, to_day: int):
+        """Get reads of [from_day, to_day] ready ahead of a request, e.g. right after login."""
@@ -0,0 +1,97 @@
+"""Request shaping for the Sheets API: a token bucket, single-flight reads and
+jittered retry delays. Nothing here knows about gspread; sheets_helper wires
+them together in _with_sheet and _read_sheet.
+"""
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to burst."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "rejected": 0}
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Take one token, waiting up to timeout seconds (None: forever); False if none came."""
+        start = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self._stats["acquired"] += 1
+                    if waited:
+                        self._stats["waited"] += 1
+                        self._stats["wait_seconds"] += now - start
+                    return True
+                wait = (1 - self._tokens) / self.rate
+                if timeout is not None and now + wait - start > timeout:
+                    self._stats["rejected"] += 1
+                    return False
+            waited = True
+            time.sleep(wait)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, tokens=round(self._tokens, 2))
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its result.
+
+    Callers must treat the shared result as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "shared": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+                leader = True
+                self._stats["calls"] += 1
+            else:
+                leader = False
+                self._stats["shared"] += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+def backoff_delays(attempts: int, base: float = 0.5, cap: float = 16.0, rng=random):
+    """Sleep times before each retry: "full jitter" exponential backoff, attempts - 1 of them."""
+    for n in range(attempts - 1):
+        yield rng.uniform(0, min(cap, base * 2 ** n))
@@ -0,0 +1,239 @@
+"""Write-behind queue for sheet appends.
+
+Rows are journaled to disk and handed back to the caller immediately; a
+background thread flushes them per tab with one append_rows call once
+batch_size rows are waiting or the oldest has waited flush_seconds. Rows still
+in the journal when the process stops are flushed by the next process to open
+it. A journal belongs to one process at a time (an flock on <journal>.lock, on
+platforms that have fcntl), so two live processes never replay each other's rows.
+
+A row is given up on after max_attempts failed writes, or at once when the
+error is one retrying can't fix (is_permanent). It is then moved from the
+journal to <journal>.dead, a JSON-lines file of the row and its last error.
+"""
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals are not locked
+    fcntl = None
+
+
+class JournalBusyError(RuntimeError):
+    """Another process has the journal open."""
+
+
+def _lock_journal(path: str):
+    """Lock path + ".lock" for this process; returns the open lock file (keep it open)."""
+    f = open(path + ".lock", "a")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise JournalBusyError(f"{path} is in use by another process")
+    return f
+
+
+class WriteBehindQueue:
+    """Journaled, batched appends; flush_fn(tab, rows, recovered) does the actual write.
+
+    recovered is True for rows that may already have reached the sheet: loaded
+    from a previous process's journal (it may have died mid-flush), or part of
+    a batch whose write failed (it may have failed after being applied).
+    is_permanent(exc) tells a write error that retrying can't fix; by default
+    every error is retried until max_attempts.
+    """
+
+    def __init__(self, journal_path: str, flush_fn, batch_size: int = 50, flush_seconds: float = 2.0,
+                 max_attempts: int = 50, is_permanent=None):
+        self.journal_path = journal_path
+        self.dead_letter_path = journal_path + ".dead"
+        self._lock_file = _lock_journal(journal_path)  # raises JournalBusyError
+        self._flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        self._is_permanent = is_permanent or (lambda exc: False)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._next_id = 1
+        self._stats = {"queued": 0, "flushed": 0, "batches": 0, "failures": 0, "recovered": 0, "dead_letters": 0}
+        self._last_error = None
+        self._load_journal()
+        self._thread = threading.Thread(target=self._run, name="sheets-write-behind", daemon=True)
+        self._thread.start()
+
+    # --- Journal ---
+
+    def _load_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn final line from a crash mid-write
+                entry["queued_at"] = time.time()
+                entry["recovered"] = True
+                entry.setdefault("attempts", 0)
+                self._pending.append(entry)
+                self._next_id = max(self._next_id, entry["id"] + 1)
+        self._stats["recovered"] = len(self._pending)
+        if os.path.exists(self.dead_letter_path):
+            with open(self.dead_letter_path, encoding="utf-8") as f:
+                self._stats["dead_letters"] = sum(1 for _ in f)
+
+    def _rewrite_journal(self):
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in self._pending:
+                f.write(json.dumps({"id": e["id"], "tab": e["tab"], "row": e["row"], "attempts": e["attempts"]}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_path)
+
+    def _dead_letter(self, entries, exc):
+        """Move entries from the journal to the dead-letter file. Call with _cond held."""
+        error = repr(exc)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for e in entries:
+                f.write(json.dumps({
+                    "id": e["id"], "tab": e["tab"], "row": e["row"], "attempts": e["attempts"],
+                    "error": error, "failed_at": time.time(),
+                }) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # Written there first: a crash in between leaves the row in both, not in neither.
+        dead = {e["id"] for e in entries}
+        self._pending = [e for e in self._pending if e["id"] not in dead]
+        self._rewrite_journal()
+        self._stats["dead_letters"] += len(entries)
+
+    # --- Public API ---
+
+    def enqueue(self, tab: str, row: list) -> int:
+        """Journal row for tab and return its queue id once it is durable on disk."""
+        with self._cond:
+            entry = {"id": self._next_id, "tab": tab, "row": row}
+            self._next_id += 1
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            entry.update(queued_at=time.time(), recovered=False, attempts=0)
+            self._pending.append(entry)
+            self._stats["queued"] += 1
+            self._cond.notify()
+        return entry["id"]
+
+    def pending_rows(self, tab: str):
+        """(queue id, row) for rows of tab not yet written to the sheet, oldest first."""
+        with self._cond:
+            return [(e["id"], list(e["row"])) for e in self._pending if e["tab"] == tab]
+
+    def pending_tabs(self):
+        """Tabs with rows not yet written, in order of their oldest row."""
+        with self._cond:
+            return list(dict.fromkeys(e["tab"] for e in self._pending))
+
+    def flush(self, tab: str = None):
+        """Write everything queued (for tab, or all tabs) now; raises if a write fails.
+
+        Rows given up on (see the module docstring) count as failed writes.
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch = [e for e in self._pending if tab is None or e["tab"] == tab]
+            groups = {}
+            for e in batch:
+                groups.setdefault((e["tab"], e["recovered"]), []).append(e)
+            for (t, recovered), entries in groups.items():
+                try:
+                    self._flush_fn(t, [e["row"] for e in entries], recovered)
+                except Exception as exc:
+                    if len(entries) > 1 and self._is_permanent(exc):
+                        # One bad row fails the whole append: write them one at a
+                        # time so only the rows that can't be written are given up on.
+                        self._failed(entries, exc, give_up=False)
+                        exc = self._flush_singly(t, entries)
+                        if exc is None:
+                            continue
+                    else:
+                        self._failed(entries, exc)
+                    raise exc
+                self._done(entries)
+
+    def _flush_singly(self, tab: str, entries):
+        """Write entries one row per call; returns the error to raise, if any row failed."""
+        error = None
+        for e in entries:
+            try:
+                self._flush_fn(tab, [e["row"]], True)
+            except Exception as exc:
+                self._failed([e], exc)
+                if not self._is_permanent(exc):
+                    return exc  # the sheet is unavailable; the rest stay queued
+                error = exc
+                continue
+            self._done([e])
+        return error
+
+    def _failed(self, entries, exc, give_up: bool = True):
+        with self._cond:
+            for e in entries:
+                e["recovered"] = True
+                e["attempts"] += 1
+            self._stats["failures"] += 1
+            self._last_error = repr(exc)
+            if give_up:
+                dead = [e for e in entries if self._is_permanent(exc) or e["attempts"] >= self.max_attempts]
+                if dead:
+                    self._dead_letter(dead, exc)
+                else:
+                    self._rewrite_journal()  # keep the attempt counts
+
+    def _done(self, entries):
+        done = {e["id"] for e in entries}
+        with self._cond:
+            self._pending = [e for e in self._pending if e["id"] not in done]
+            self._rewrite_journal()
+            self._stats["flushed"] += len(entries)
+            self._stats["batches"] += 1
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats, pending=len(self._pending), last_error=self._last_error,
+                dead_letter_path=self.dead_letter_path,
+            )
+
+    # --- Background flusher ---
+
+    def _due(self):
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.batch_size:
+            return 0.0
+        return max(0.0, self._pending[0]["queued_at"] + self.flush_seconds - time.time())
+
+    def _run(self):
+        backoff = self.flush_seconds
+        while True:
+            with self._cond:
+                wait = self._due()
+                while wait is None or wait > 0:
+                    self._cond.wait(timeout=wait)
+                    wait = self._due()
+            try:
+                self.flush()
+                backoff = self.flush_seconds
+            except Exception:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)